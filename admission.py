@@ -0,0 +1,118 @@
+import os
+import json
+import numpy as np
+
+# 5. 성적 분석 엔진 및 유틸리티
+# 표준점수 -> 누적 백분위(%) 변환표 경로 (학년도별 파일, 환경변수 SCORE_TABLE_PATH로 교체 가능)
+DEFAULT_SCORE_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "score_tables", "2026.json")
+
+# 변환표 파일이 없을 때 사용하는 내장 샘플 (2026학년도 추정치)
+SCORE_TO_PERCENTILE = {
+    "국어": {145: 0.1, 140: 0.5, 135: 1.5, 130: 4.0, 125: 10.0, 120: 20.0, 115: 35.0, 110: 50.0},
+    "수학": {148: 0.1, 140: 0.8, 135: 2.0, 130: 5.0, 125: 12.0, 120: 22.0, 115: 38.0, 110: 55.0},
+    "탐구": {75: 0.1, 70: 1.0, 65: 4.0, 60: 12.0, 55: 25.0, 50: 45.0} # 과목별 평균값 기준
+}
+
+# 합격 판정 구간 (사용자 누백 - 합격선 누백 기준)
+STATUS_BANDS = ["안정", "적정", "소신", "불가"]
+STATUS_THRESHOLDS = [-1.5, 0.0, 1.5]
+# 부족 점수 추정 (약 0.3%p 누백 ≈ 수능 표점 1점 가정)
+PERCENTILE_PER_POINT = 0.3
+# 대학별 비중 정보가 없을 때 사용하는 기본 비중
+DEFAULT_WEIGHTS = {"국어": 0.3, "수학": 0.4, "탐구": 0.3}
+INQUIRY_CATEGORIES = ["사탐", "과탐"]
+
+
+class ScoreConverter:
+    """
+    표준점수 -> 누백 변환기
+    과목별 변환표를 시작 시 한 번 점수 오름차순 배열로 컴파일해 두고 np.interp로 변환합니다.
+    (변환표 범위 밖 점수는 양 끝 값으로 고정, 표에 없는 과목은 fallback 과목 표 사용)
+    """
+
+    def __init__(self, subjects, fallback_subject="탐구", year=None):
+        self.year = year
+        self.fallback_subject = fallback_subject
+        self._curves = {}
+        for subject, table in subjects.items():
+            points = sorted((float(s), float(p)) for s, p in table.items())
+            self._curves[subject] = (np.array([s for s, _ in points]), np.array([p for _, p in points]))
+        if fallback_subject not in self._curves:
+            raise ValueError(f"변환표에 기본 과목 '{fallback_subject}'이 없습니다.")
+
+    @classmethod
+    def load(cls, path=None):
+        """변환표(JSON) 로드. 파일이 없으면 내장 샘플 사용"""
+        path = path or os.environ.get("SCORE_TABLE_PATH", DEFAULT_SCORE_TABLE_PATH)
+        if not os.path.exists(path):
+            print(f"⚠️ 점수 변환표({path})가 없어 내장 샘플 변환표를 사용합니다.")
+            return cls(SCORE_TO_PERCENTILE)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["subjects"], fallback_subject=data.get("fallback_subject", "탐구"), year=data.get("year"))
+
+    def convert(self, subject, scores):
+        """표준점수(스칼라 또는 배열) -> 누백 (입력과 같은 모양)"""
+        xs, ys = self._curves.get(subject, self._curves[self.fallback_subject])
+        return np.interp(np.asarray(scores, dtype=np.float64), xs, ys)
+
+
+score_converter = ScoreConverter.load()
+
+def get_percentile(subject, score):
+    """표준점수를 백분위로 변환 (선형 보간 적용)"""
+    return float(score_converter.convert(subject, score))
+
+def calculate_admission_status(user_percentile, target_percentile):
+    """합격 가능성 및 부족 점수 계산 (Gap Analysis)"""
+    diff = user_percentile - target_percentile
+    if diff <= STATUS_THRESHOLDS[0]: status = "안정"
+    elif diff <= STATUS_THRESHOLDS[1]: status = "적정"
+    elif diff <= STATUS_THRESHOLDS[2]: status = "소신"
+    else: status = "불가"
+
+    gap_score = max(0, round(diff / PERCENTILE_PER_POINT)) if status in ["소신", "불가"] else 0
+    return status, gap_score
+
+def classify_admission(user_percentile, target_percentile):
+    """
+    calculate_admission_status의 벡터화 버전
+    반환: (구간 번호 배열 - STATUS_BANDS의 인덱스, 부족 점수 배열)
+    """
+    diff = np.asarray(user_percentile, dtype=np.float64) - np.asarray(target_percentile, dtype=np.float64)
+    band = np.searchsorted(np.asarray(STATUS_THRESHOLDS), diff, side="left")
+    # np.round는 파이썬 round와 같이 0.5를 짝수 쪽으로 반올림
+    gap = np.where(band >= 2, np.maximum(0, np.round(diff / PERCENTILE_PER_POINT)), 0).astype(np.int64)
+    return band, gap
+
+def batch_subject_percentiles(students):
+    """
+    학생별 성적 목록 여러 개 -> (국어, 수학, 탐구 평균) 누백 배열 (각각 학생 수 길이)
+    과목별로 모든 학생의 점수를 모아 한 번에 변환하고, 사탐/과탐 평균은 학생 번호로 묶어 계산합니다.
+    """
+    n = len(students)
+    kor = np.zeros(n)
+    mat = np.zeros(n)
+    inq_scores, inq_owner = [], []
+    for i, user_scores in enumerate(students):
+        scores = {s.subjectName: s.score for s in user_scores}
+        kor[i] = scores.get("국어", 0)
+        mat[i] = scores.get("수학", 0)
+        for s in user_scores:
+            if s.category in INQUIRY_CATEGORIES:
+                inq_scores.append(s.score)
+                inq_owner.append(i)
+
+    p_kor = score_converter.convert("국어", kor)
+    p_mat = score_converter.convert("수학", mat)
+    # 사탐/과탐 평균 (탐구 성적이 없으면 50.0)
+    owner = np.asarray(inq_owner, dtype=np.int64)
+    counts = np.bincount(owner, minlength=n)
+    sums = np.bincount(owner, weights=score_converter.convert("탐구", inq_scores), minlength=n)
+    p_inq = np.divide(sums, counts, out=np.full(n, 50.0), where=counts > 0)
+    return p_kor, p_mat, p_inq
+
+def subject_percentiles(user_scores):
+    """사용자 성적 목록 -> (국어, 수학, 탐구 평균) 누백"""
+    p_kor, p_mat, p_inq = batch_subject_percentiles([user_scores])
+    return float(p_kor[0]), float(p_mat[0]), float(p_inq[0])
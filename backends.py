@@ -0,0 +1,75 @@
+import os
+
+# 모델 백엔드 선택: "gemini"(기본) 또는 "fake"(오프라인 벤치마크/개발용)
+EMBEDDING_MODEL = "text-embedding-004"
+CHAT_MODEL = "gemini-flash-latest"
+
+
+def backend_name():
+    return os.environ.get("LLM_BACKEND", "gemini").strip().lower()
+
+
+def use_fake_backend():
+    return backend_name() == "fake"
+
+
+def require_api_key():
+    """Gemini 백엔드일 때만 GOOGLE_API_KEY가 필요"""
+    return not use_fake_backend()
+
+
+def make_embeddings(model=EMBEDDING_MODEL):
+    if use_fake_backend():
+        from fake_backends import fake_embeddings_from_env
+        return fake_embeddings_from_env()
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model=model)
+
+
+def make_chat_model(model=CHAT_MODEL, temperature=0):
+    if use_fake_backend():
+        from fake_backends import fake_chat_model_from_env
+        return fake_chat_model_from_env()
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature)
+
+
+def chroma_server():
+    """CHROMA_HOST가 있으면 (host, port), 없으면 None (로컬 persist_directory 사용)"""
+    host = os.environ.get("CHROMA_HOST", "").strip()
+    return (host, int(os.environ.get("CHROMA_PORT", 8000))) if host else None
+
+
+def make_vectorstore(db_path, embedding_function):
+    """
+    벡터 DB 연결
+    CHROMA_HOST를 지정하면 Chroma 서버에 접속해 여러 서버 워커와 ingest.py가 인덱스 하나를 공유하고,
+    없으면 db_path의 로컬 파일을 프로세스마다 엽니다.
+    """
+    from langchain_chroma import Chroma
+    server = chroma_server()
+    if server:
+        return Chroma(host=server[0], port=server[1], embedding_function=embedding_function)
+    return Chroma(persist_directory=db_path, embedding_function=embedding_function)
+
+
+def detach_local_vectorstore(db_path):
+    """
+    로컬 Chroma의 경로별 공유 System(메모리의 HNSW 색인 포함)을 캐시에서 떼어 반환 (Chroma 서버 모드면 빈 목록)
+    같은 프로세스의 로컬 클라이언트는 이 System을 공유하므로, 떼어 낸 뒤에 make_vectorstore를 호출해야
+    다른 프로세스(ingest.py)가 쓴 내용을 디스크에서 새로 읽습니다. 이미 연 클라이언트는 떼어 낸 System으로 계속 동작하며,
+    다 쓰고 나면 반환된 System의 stop()으로 메모리를 해제합니다.
+    chromadb 내부 캐시(SharedSystemClient._identifier_to_system)를 사용하므로 requirements.txt에서 버전을 고정하고
+    tests/test_backends.py로 구조를 확인합니다.
+    """
+    if chroma_server():
+        return []
+    from chromadb.api.shared_system_client import SharedSystemClient
+    cached = SharedSystemClient._identifier_to_system
+    return [cached.pop(identifier) for identifier in list(cached)
+            if os.path.abspath(identifier) == os.path.abspath(db_path)]
+
+
+def embedding_namespace(model=EMBEDDING_MODEL):
+    """임베딩 캐시 키 네임스페이스 (백엔드가 다르면 벡터도 다름)"""
+    return "fake-ngram" if use_fake_backend() else model
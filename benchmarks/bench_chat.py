@@ -0,0 +1,153 @@
+"""
+/chat 엔드투엔드 지연 시간 벤치마크 (오프라인 대체 백엔드로 server.py를 별도 프로세스로 실행)
+
+    python -m benchmarks.bench_chat --clients 16 --requests 200
+    python -m benchmarks.bench_chat --db-path /tmp/bench/db   # bench_ingest --keep 으로 만든 DB 재사용
+
+단계별 지연: /chat/stream의 meta 이벤트(검색 완료), 첫 token 이벤트, done 이벤트 도착 시각과
+/chat 전체 응답 시간을 p50/p95/p99로 보고합니다.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import httpx
+from benchmarks.common import ROOT_DIR, use_fake_backend, print_latency_report
+from benchmarks.synthetic_workbook import generate_workbook, MAJORS
+
+QUESTION_TEMPLATES = [
+    "{univ} {major} 합격선 알려줘",
+    "{short}대 {major} 적정점수",
+    "{univ} 입결 어때?",
+    "{major} 갈 수 있는 대학 추천해줘",
+]
+
+
+def build_db(workdir, univs, majors):
+    import ingest
+    excel_path = os.path.join(workdir, "bench_data.xlsx")
+    db_path = os.path.join(workdir, "db")
+    generate_workbook(excel_path, univs, majors)
+    ingest.ingest_data(full=True, excel_file_path=excel_path, db_path=db_path, concurrency=4, rate=1000)
+    return db_path
+
+
+def make_question(rng, univs):
+    u = rng.randrange(univs)
+    major = rng.choice(MAJORS["문과"] + MAJORS["이과"])
+    template = rng.choice(QUESTION_TEMPLATES)
+    return template.format(univ=f"합성{u:03d}대학교", short=f"합성{u:03d}", major=major)
+
+
+async def wait_until_ready(client, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            r = await client.get("/health")
+            if r.status_code == 200 and r.json().get("status") == "ok":
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("서버가 제시간에 준비되지 않았습니다.")
+
+
+async def stream_once(client, payload, samples):
+    start = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", "/chat/stream", json=payload) as r:
+        event = None
+        async for line in r.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                now = time.perf_counter() - start
+                if event == "meta":
+                    samples["stream: retrieval"].append(now)
+                elif event == "token" and first_token is None:
+                    first_token = now
+                    samples["stream: first token"].append(now)
+                elif event == "error":
+                    samples["errors"].append(now)
+                    return
+                elif event == "done":
+                    samples["stream: total"].append(now)
+
+
+async def chat_once(client, payload, samples):
+    start = time.perf_counter()
+    r = await client.post("/chat", json=payload)
+    elapsed = time.perf_counter() - start
+    if r.status_code == 200:
+        samples["chat: total"].append(elapsed)
+    else:
+        samples["errors"].append(elapsed)
+
+
+async def drive(base_url, clients, requests, univs, seed):
+    samples = {"stream: retrieval": [], "stream: first token": [], "stream: total": [],
+               "chat: total": [], "errors": []}
+    rng = random.Random(seed)
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait((i, {"query": make_question(rng, univs), "history": []}))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        await wait_until_ready(client)
+
+        async def worker():
+            while not queue.empty():
+                i, payload = queue.get_nowait()
+                if i % 2:
+                    await chat_once(client, payload, samples)
+                else:
+                    await stream_once(client, payload, samples)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(clients)])
+        wall = time.perf_counter() - start
+
+    print_latency_report(f"/chat 벤치마크: 요청 {requests}건, 동시 클라이언트 {clients}", samples)
+    print(f"\n⏱️ 전체 {wall:.2f}초, 처리량 {requests / wall:.1f} req/s, 오류 {len(samples['errors'])}건")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/chat 엔드투엔드 지연 시간 벤치마크")
+    parser.add_argument("--db-path", help="기존 벤치마크 DB (없으면 합성 데이터로 새로 생성)")
+    parser.add_argument("--univs", type=int, default=50)
+    parser.add_argument("--majors", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--response-cache", action="store_true", help="응답 캐시를 켠 상태로 측정")
+    args = parser.parse_args()
+
+    use_fake_backend()
+    workdir = None
+    db_path = args.db_path
+    if not db_path:
+        workdir = tempfile.mkdtemp(prefix="bench_chat_")
+        db_path = build_db(workdir, args.univs, args.majors)
+
+    env = dict(os.environ, LLM_BACKEND="fake", DB_PATH=db_path, PORT=str(args.port))
+    if not args.response_cache:
+        env["RESPONSE_CACHE_SIZE"] = "0"
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, "server.py")], cwd=ROOT_DIR, env=env,
+                              stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(drive(f"http://127.0.0.1:{args.port}", args.clients, args.requests, args.univs, args.seed))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
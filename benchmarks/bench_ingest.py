@@ -0,0 +1,65 @@
+"""
+인제스트 처리량 벤치마크 (오프라인 대체 백엔드 사용)
+
+    python -m benchmarks.bench_ingest --univs 200 --majors 10 --concurrency 8
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from benchmarks.common import use_fake_backend
+from benchmarks.synthetic_workbook import generate_workbook
+
+
+def run(univs, majors, concurrency, batch_size, workdir):
+    use_fake_backend()
+    import ingest
+
+    excel_path = os.path.join(workdir, "bench_data.xlsx")
+    db_path = os.path.join(workdir, "db")
+    rows = generate_workbook(excel_path, univs, majors)
+    results = {}
+
+    # 1. 엑셀 -> 문서 변환 (캐시 없음 / Parquet 캐시 사용)
+    t0 = time.perf_counter()
+    docs = sum(1 for _ in ingest.iter_documents(excel_path))
+    results["parse (cold)"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    sum(1 for _ in ingest.iter_documents(excel_path))
+    results["parse (warm)"] = time.perf_counter() - t0
+
+    # 2. 전체 재생성 (임베딩 + Chroma 쓰기)
+    t0 = time.perf_counter()
+    ingest.ingest_data(full=True, excel_file_path=excel_path, db_path=db_path,
+                       concurrency=concurrency, rate=1000, batch_size=batch_size)
+    results["full ingest"] = time.perf_counter() - t0
+
+    # 3. 변경 없는 증분 재실행
+    t0 = time.perf_counter()
+    ingest.ingest_data(excel_file_path=excel_path, db_path=db_path,
+                       concurrency=concurrency, rate=1000, batch_size=batch_size)
+    results["incremental no-op"] = time.perf_counter() - t0
+
+    print(f"\n📊 인제스트 벤치마크: {rows}행 / 문서 {docs}건 / 동시 요청 {concurrency}")
+    for stage, seconds in results.items():
+        print(f"{stage:<20}{seconds * 1000:>12.1f} ms{docs / seconds:>14.0f} docs/s")
+    return db_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="인제스트 처리량 벤치마크")
+    parser.add_argument("--univs", type=int, default=100)
+    parser.add_argument("--majors", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--keep", help="결과 DB/엑셀을 남길 폴더 (기본: 임시 폴더 후 삭제)")
+    args = parser.parse_args()
+
+    workdir = args.keep or tempfile.mkdtemp(prefix="bench_ingest_")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        run(args.univs, args.majors, args.concurrency, args.batch_size, workdir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
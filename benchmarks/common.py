@@ -0,0 +1,34 @@
+import os
+import sys
+
+# 벤치마크는 저장소 루트의 모듈(ingest, server 등)을 그대로 사용
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def use_fake_backend():
+    """벤치마크는 항상 오프라인 대체 백엔드(LLM_BACKEND=fake)로 실행"""
+    os.environ["LLM_BACKEND"] = "fake"
+
+
+def percentile(values, p):
+    """선형 보간 백분위수 (values는 비어 있지 않아야 함)"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * p / 100
+    lo = int(rank)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+def print_latency_report(title, samples):
+    """단계별 지연 시간(초) 목록을 p50/p95/p99(ms) 표로 출력"""
+    print(f"\n📊 {title}")
+    print(f"{'stage':<20}{'n':>6}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+    for stage, values in samples.items():
+        if not values:
+            continue
+        row = [percentile(values, p) * 1000 for p in (50, 95, 99)] + [max(values) * 1000]
+        print(f"{stage:<20}{len(values):>6}" + "".join(f"{v:>12.1f}" for v in row))
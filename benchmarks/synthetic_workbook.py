@@ -0,0 +1,52 @@
+import argparse
+import random
+import pandas as pd
+
+COLUMNS = [
+    '대학교', '전공', '계열', '시도', '시군', '모집군', '정원', '적정점수', '예상점수',
+    '누백', '국어구성비', '수학구성비', '영어구성비', '탐구구성비',
+]
+REGIONS = [("서울", "강남구"), ("서울", "성북구"), ("경기", "성남시"), ("부산", "금정구"), ("대전", "유성구")]
+MAJORS = {
+    "문과": ["경영학과", "경제학과", "국어국문학과", "영어영문학과", "행정학과", "심리학과", "미디어학과", "사회학과"],
+    "이과": ["컴퓨터공학과", "전자공학과", "기계공학과", "화학공학과", "의예과", "약학과", "간호학과", "수학과"],
+}
+# 실제 엑셀처럼 헤더 위에 4줄의 제목/설명 행을 둠 (ingest는 header=4로 읽음)
+HEADER_ROW = 4
+
+
+def generate_workbook(path, n_univs=50, majors_per_univ=8, seed=42):
+    """시트(문과/이과) x 대학 x 학과 구성의 합성 입시 엑셀 생성. 생성한 행 수를 반환"""
+    rng = random.Random(seed)
+    total = 0
+    with pd.ExcelWriter(path) as writer:
+        for sheet, majors in MAJORS.items():
+            rows = []
+            for u in range(n_univs):
+                sido, sigun = REGIONS[u % len(REGIONS)]
+                for m in range(majors_per_univ):
+                    base = majors[m % len(majors)]
+                    major = base if m < len(majors) else f"{base[:-1]}{m // len(majors) + 1}과"
+                    cutoff = round(rng.uniform(0.5, 40.0), 2)
+                    w_kor, w_mat = rng.choice([(0.3, 0.4), (0.35, 0.35), (0.25, 0.45)])
+                    rows.append([
+                        f"합성{u:03d}대학교", major, "인문" if sheet == "문과" else "자연", sido, sigun,
+                        rng.choice(["가", "나", "다"]), rng.randint(10, 120),
+                        round(600 - cutoff * 5, 1), round(598 - cutoff * 5, 1), cutoff,
+                        w_kor, w_mat, 0.0, round(1 - w_kor - w_mat, 2),
+                    ])
+            title = pd.DataFrame([[f"{sheet} 합성 입시 데이터"]] * HEADER_ROW)
+            title.to_excel(writer, sheet_name=sheet, index=False, header=False)
+            pd.DataFrame(rows, columns=COLUMNS).to_excel(writer, sheet_name=sheet, index=False, startrow=HEADER_ROW)
+            total += len(rows)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="벤치마크용 합성 입시 엑셀 생성")
+    parser.add_argument("path")
+    parser.add_argument("--univs", type=int, default=50)
+    parser.add_argument("--majors", type=int, default=8)
+    args = parser.parse_args()
+    rows = generate_workbook(args.path, args.univs, args.majors)
+    print(f"✅ '{args.path}'에 {rows}행을 생성했습니다.")
@@ -0,0 +1,149 @@
+import os
+import math
+from program_table import major_match_score, char_bigrams
+
+# LLM 컨텍스트(검색된 모집단위 표)의 최대 토큰 수 (추정치 기준)
+DEFAULT_TOKEN_BUDGET = 4000
+# 토큰 수 추정: 한글이 섞인 문장은 대략 2글자 ≈ 1토큰
+CHARS_PER_TOKEN = 2.0
+
+# 표 열: (제목, 메타데이터 키 목록) - 같은 그룹에서 값이 모두 같으면 그룹 머리말로 빼냄
+COLUMNS = [
+    ("학과", ["major"]),
+    ("계열", ["category"]),
+    ("지역", ["region"]),
+    ("모집군", ["모집군"]),
+    ("정원", ["정원"]),
+    ("적정점수", ["적정점수"]),
+    ("예상점수", ["예상점수"]),
+    ("반영비율(국/수/영/탐)", ["국어비중", "수학비중", "영어비중", "탐구비중"]),
+]
+# 모집단위가 하나뿐인 대학들을 시트별로 모아 만드는 표의 열
+MIXED_COLUMNS = [("대학", ["univ"])] + COLUMNS
+# 항상 행에 남기는 열 (모집단위를 구분하는 값)
+ROW_ONLY_COLUMNS = {"대학", "학과"}
+# 표 읽는 법 (표가 하나 이상일 때 맨 앞에 한 번만 붙임)
+TABLE_NOTE = "※ 대학별 모집단위 표입니다. 대학 이름 옆 괄호 안의 값은 그 아래 모든 학과에 공통으로 적용됩니다."
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _cell(metadata, keys):
+    values = [str(metadata.get(k, "")).strip() or "-" for k in keys]
+    return "/".join(values)
+
+
+def _row_key(metadata):
+    """중복 판정 키 (같은 시트/대학의 같은 모집단위 정보)"""
+    return (metadata.get("sheet", ""), metadata.get("univ", "")) + tuple(
+        _cell(metadata, keys) for _, keys in COLUMNS
+    )
+
+
+def _render_group(sheet, univ, rows, columns=COLUMNS):
+    """대학(시트) 하나의 모집단위 표. 모든 행에서 값이 같은 열은 머리말로 빼냄"""
+    cells = [[_cell(m, keys) for _, keys in columns] for m in rows]
+    shared, kept = [], []
+    for i, (title, _) in enumerate(columns):
+        values = {row[i] for row in cells}
+        if title not in ROW_ONLY_COLUMNS and len(values) == 1 and len(rows) > 1:
+            shared.append(f"{title}: {values.pop()}")
+        else:
+            kept.append(i)
+    header = f"■ [{sheet}] {univ}" if sheet else f"■ {univ}"
+    if shared:
+        header += " (" + ", ".join(shared) + ")"
+    lines = [header, " | ".join(columns[i][0] for i in kept)]
+    lines += [" | ".join(row[i] for i in kept) for row in cells]
+    return "\n".join(lines)
+
+
+class ContextBuilder:
+    """
+    검색 문서 -> LLM 컨텍스트 변환
+    중복 모집단위를 제거하고, 질문과 학과 이름이 잘 맞는 순(같으면 검색 순위)으로 정렬한 뒤
+    토큰 예산 안에서 대학별 압축 표(공통 값은 머리말로)로 만듭니다.
+    """
+
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+
+    @classmethod
+    def from_env(cls):
+        return cls(token_budget=int(os.environ.get("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)))
+
+    def rank(self, docs, query="", majors=()):
+        """학과 이름 일치 점수 내림차순 (같은 점수는 원래 검색 순위 유지)"""
+        if not query and not majors:
+            return list(docs)
+        query_bigrams = char_bigrams(query)
+        scores = [
+            major_match_score(str(d.metadata.get("major", "")), query, majors, query_bigrams) for d in docs
+        ]
+        order = sorted(range(len(docs)), key=lambda i: -scores[i])
+        return [docs[i] for i in order]
+
+    def build(self, docs, query="", majors=()):
+        """(컨텍스트 문자열, 통계 dict) 반환"""
+        raw_tokens = estimate_tokens("\n\n".join(d.page_content for d in docs))
+        seen = set()
+        groups = {}     # (시트, 대학) -> 메타데이터 목록 (처음 등장한 순서 유지)
+        extra = []      # 대학/학과 메타데이터가 없는 문서는 원문 그대로
+        used = estimate_tokens(TABLE_NOTE)
+        duplicates = 0
+        ranked = self.rank(docs, query, majors)
+        dropped = 0
+        for i, doc in enumerate(ranked):
+            meta = doc.metadata or {}
+            if not meta.get("univ") or not meta.get("major"):
+                cost, key, group_key = estimate_tokens(doc.page_content), None, None
+            else:
+                key = _row_key(meta)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                group_key = (meta.get("sheet", ""), meta["univ"])
+                # 열을 하나도 빼지 않은 행 길이로 계산 (실제 표는 이보다 짧음)
+                cost = estimate_tokens(" | ".join(_cell(meta, keys) for _, keys in COLUMNS))
+                if group_key not in groups:
+                    cost += estimate_tokens(_render_group(*group_key, []))
+            # 토큰 예산을 넘으면 나머지(순위가 낮은 문서)는 버림
+            if used + cost > self.token_budget:
+                dropped = len(ranked) - i
+                break
+            used += cost
+            if key is None:
+                extra.append(doc.page_content)
+            else:
+                seen.add(key)
+                groups.setdefault(group_key, []).append(meta)
+
+        # 모집단위가 하나뿐인 대학은 시트별로 한 표에 모음 (대학마다 머리말을 반복하지 않도록)
+        parts, singles = [], {}
+        for (sheet, univ), rows in groups.items():
+            if len(rows) == 1:
+                singles.setdefault(sheet, []).extend(rows)
+            else:
+                parts.append(_render_group(sheet, univ, rows))
+        for sheet, rows in singles.items():
+            if len(rows) == 1:
+                parts.append(_render_group(sheet, rows[0]["univ"], rows))
+            else:
+                parts.append(_render_group(sheet, "그 밖의 대학", rows, columns=MIXED_COLUMNS))
+        parts += extra
+        if groups:
+            parts.insert(0, TABLE_NOTE)
+        text = "\n\n".join(parts)
+        tokens = estimate_tokens(text)
+        stats = {
+            "docs": len(docs),
+            "rows": sum(len(rows) for rows in groups.values()) + len(extra),
+            "duplicates": duplicates,
+            "dropped": dropped,
+            "tokens": tokens,
+            "raw_tokens": raw_tokens,
+            "saved_tokens": raw_tokens - tokens,
+        }
+        return text, stats
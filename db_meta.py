@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+
+# 인제스트가 끝날 때마다 갱신되는 DB 버전 파일 (캐시 무효화 기준)
+VERSION_FILE = "db_version.txt"
+
+
+def new_db_version():
+    return f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def write_db_version(db_path, version=None):
+    """새 DB 버전을 기록 (임시 파일에 쓴 뒤 교체하여 읽는 쪽이 깨진 값을 보지 않도록 함)"""
+    version = version or new_db_version()
+    os.makedirs(db_path, exist_ok=True)
+    path = os.path.join(db_path, VERSION_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_db_version(db_path):
+    """현재 DB 버전 (기록된 적이 없으면 None)"""
+    path = os.path.join(db_path, VERSION_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class DbVersionWatcher:
+    """DB 버전 파일의 변경 여부를 저렴하게(mtime 비교) 확인"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._version = None
+
+    def current(self):
+        path = os.path.join(self.db_path, VERSION_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            if mtime != self._mtime:
+                self._mtime = mtime
+                self._version = read_db_version(self.db_path)
+            return self._version
+
+
+# 인제스트 시 함께 기록하는 요약 정보 (서버가 벡터 DB를 열지 않고 바로 시작할 수 있도록 함)
+MANIFEST_FILE = "manifest.json"
+
+
+def write_manifest(db_path, program_table, version, aliases, index=None):
+    """
+    대학 목록, 별칭, 시트별 모집단위 수, DB 버전을 manifest.json으로 저장 (임시 파일에 쓴 뒤 교체)
+    index: publish_index가 돌려준 읽기 전용 산출물 폴더 (db_path 기준 상대 경로)
+    """
+    manifest = {
+        "version": version,
+        "index": index,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "program_count": len(program_table),
+        "sheets": {sheet: len(rows) for sheet, rows in sorted(program_table.by_sheet.items())},
+        "universities": sorted(program_table.by_univ),
+        "aliases": aliases,
+    }
+    path = os.path.join(db_path, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def manifest_mtime(db_path):
+    """manifest.json 수정 시각 (없으면 None) - 서버 워커가 산출물 교체 여부를 저렴하게 확인"""
+    try:
+        return os.stat(os.path.join(db_path, MANIFEST_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(db_path):
+    """manifest.json 로드 (없으면 None)"""
+    try:
+        with open(os.path.join(db_path, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# 버전별 읽기 전용 산출물(모집단위 테이블, 어휘 색인) 폴더: db/index/<버전>/
+INDEX_DIR = "index"
+# 새 버전을 공개한 뒤에도 남겨 두는 이전 버전 수 (아직 교체하지 않은 워커가 읽고 있을 수 있음)
+KEEP_OLD_INDEXES = 1
+
+
+def publish_index(db_path, version, artifacts):
+    """
+    산출물(save(directory)가 있는 객체 목록)을 db/index/<version>/에 공개하고 상대 경로 반환
+    임시 폴더에 모두 쓴 뒤 폴더 이름을 바꿔 한 번에 공개하므로, 읽는 쪽은 완성된 폴더만 봅니다.
+    """
+    root = os.path.join(db_path, INDEX_DIR)
+    tmp_path = os.path.join(root, f".tmp-{version}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for artifact in artifacts:
+        artifact.save(tmp_path)
+    final_path = os.path.join(root, version)
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.rename(tmp_path, final_path)
+
+    # 오래된 버전 정리 (이미 메모리 매핑한 프로세스는 파일이 지워져도 계속 읽을 수 있음)
+    old = sorted(d for d in os.listdir(root) if d != version and not d.startswith("."))
+    for name in old[: max(0, len(old) - KEEP_OLD_INDEXES)]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return os.path.join(INDEX_DIR, version)
+
+
+def index_dir(db_path, manifest):
+    """manifest가 가리키는 산출물 폴더 (이전 형식 DB는 db_path 자체)"""
+    if manifest and manifest.get("index"):
+        return os.path.join(db_path, manifest["index"])
+    return db_path
@@ -1,8 +1,8 @@
 
-import pandas as pd
+from workbook_cache import read_sheet
 
 # Load the Excel file
-df = pd.read_excel('data/univer_data.xlsx', sheet_name='이과', header=4)
+df = read_sheet('data/univer_data.xlsx', '이과', header=4)
 
 # Create a text file with the output
 with open('data_debug_output.txt', 'w', encoding='utf-8') as f:
@@ -1,12 +1,12 @@
 
-import pandas as pd
+from workbook_cache import read_sheet
 import sys
 
 # Set recursion limit just in case, though not needed here
 sys.setrecursionlimit(2000)
 
 try:
-    df = pd.read_excel('data/univer_data.xlsx', sheet_name='이과', header=4)
+    df = read_sheet('data/univer_data.xlsx', '이과', header=4)
     
     # Define columns of interest, try to match likely names
     interested_cols = [
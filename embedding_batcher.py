@@ -0,0 +1,130 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+
+# 질문을 묶어 embed_documents로 보낼 때 지정하는 작업 유형 (Gemini embed_query의 기본값과 같아야 벡터가 동일)
+QUERY_TASK_TYPE = "RETRIEVAL_QUERY"
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """
+    동시에 들어온 임베딩 요청 묶음 처리
+    첫 요청이 들어온 뒤 max_wait초 동안(또는 텍스트가 max_batch개 찰 때까지) 다른 요청을 모아
+    embed_documents 한 번으로 계산하고, 결과 벡터를 요청별로 나눠 돌려줍니다.
+    호출 중인 묶음이 max_in_flight개이면 자리가 날 때까지 계속 모으므로 몰릴수록 묶음이 커집니다.
+    동기 호출(ingest.py 작업 스레드)과 비동기 호출(server.py)이 같은 대기열을 사용합니다.
+    """
+
+    def __init__(self, base, max_batch=100, max_wait=0.005, max_in_flight=4, query_kwargs=None):
+        self.base = base
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self.max_in_flight = max(1, max_in_flight)
+        self.query_kwargs = {"task_type": QUERY_TASK_TYPE} if query_kwargs is None else query_kwargs
+        # 종류("query"/"document")별 대기 목록: [(텍스트 목록, Future, 들어온 시각)]
+        self._pending = {"query": [], "document": []}
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._executor = None
+        self._stats = {"requests": 0, "texts": 0, "calls": 0, "largest_batch": 0}
+
+    @classmethod
+    def from_env(cls, base, **overrides):
+        """환경변수(EMBED_BATCH_MAX / EMBED_BATCH_WAIT / EMBED_BATCH_CONCURRENCY) 기반 생성, overrides가 우선"""
+        options = {
+            "max_batch": int(os.environ.get("EMBED_BATCH_MAX", 100)),
+            "max_wait": float(os.environ.get("EMBED_BATCH_WAIT", 0.005)),
+            "max_in_flight": int(os.environ.get("EMBED_BATCH_CONCURRENCY", 4)),
+        }
+        options.update(overrides)
+        return cls(base, **options)
+
+    def _submit(self, kind, texts):
+        future = Future()
+        with self._cond:
+            if self._executor is None:
+                # 첫 요청 때 시작 (모듈 로드/워커 fork 시점에는 스레드를 만들지 않음)
+                self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed-batch")
+                threading.Thread(target=self._dispatch_loop, name="embed-batcher", daemon=True).start()
+            self._pending[kind].append((texts, future, time.monotonic()))
+            self._stats["requests"] += 1
+            self._stats["texts"] += len(texts)
+            self._cond.notify()
+        return future
+
+    def _next_batch(self):
+        """가장 오래 기다린 종류의 묶음이 찰 때까지(또는 max_wait초) 기다렸다가 꺼냄 (self._cond 안에서 호출)"""
+        while True:
+            waiting = [(items[0][2], kind) for kind, items in self._pending.items() if items]
+            if not waiting:
+                self._cond.wait()
+                continue
+            oldest, kind = min(waiting)
+            items = self._pending[kind]
+            remaining = oldest + self.max_wait - time.monotonic()
+            if remaining > 0 and sum(len(texts) for texts, _, _ in items) < self.max_batch:
+                self._cond.wait(remaining)
+                continue
+            batch, size = [], 0
+            while items and (not batch or size + len(items[0][0]) <= self.max_batch):
+                texts, future, _ = items.pop(0)
+                # 기다리다 취소된 요청(클라이언트 연결 종료 등)은 제외
+                if future.set_running_or_notify_cancel():
+                    batch.append((texts, future))
+                    size += len(texts)
+            if batch:
+                return kind, batch
+
+    def _dispatch_loop(self):
+        while True:
+            # 호출 자리가 나야 묶음을 꺼내므로, 앞선 호출이 길어지면 그동안 들어온 요청이 한 묶음이 됨
+            self._slots.acquire()
+            with self._cond:
+                kind, batch = self._next_batch()
+            self._executor.submit(self._run, kind, batch)
+
+    def _run(self, kind, batch):
+        try:
+            texts = [text for texts, _ in batch for text in texts]
+            if kind == "query":
+                # 같은 질문이 동시에 들어오면 한 번만 계산
+                unique = list(dict.fromkeys(texts))
+                by_text = dict(zip(unique, self.base.embed_documents(unique, **self.query_kwargs)))
+                vectors = [by_text[text] for text in texts]
+            else:
+                vectors = self.base.embed_documents(texts)
+            with self._cond:
+                self._stats["calls"] += 1
+                self._stats["largest_batch"] = max(self._stats["largest_batch"], len(texts))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            offset = 0
+            for texts, future in batch:
+                future.set_result([list(v) for v in vectors[offset:offset + len(texts)]])
+                offset += len(texts)
+        finally:
+            self._slots.release()
+
+    def embed_query(self, text):
+        return self._submit("query", [text]).result()[0]
+
+    async def aembed_query(self, text):
+        return (await asyncio.wrap_future(self._submit("query", [text])))[0]
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        return self._submit("document", texts).result() if texts else []
+
+    async def aembed_documents(self, texts):
+        texts = list(texts)
+        return await asyncio.wrap_future(self._submit("document", texts)) if texts else []
+
+    def stats(self):
+        """요청/텍스트/실제 호출 수와 가장 큰 묶음 크기"""
+        with self._cond:
+            return dict(self._stats)
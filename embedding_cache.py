@@ -0,0 +1,237 @@
+import os
+import re
+import time
+import asyncio
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+from langchain_core.embeddings import Embeddings
+
+
+# SQLite 캐시 정리 주기 (저장 N건마다 만료 항목 삭제 + 최대 항목 수 초과분 삭제)
+DISK_PRUNE_EVERY = 256
+
+
+def normalize_query(text):
+    """캐시 키용 질문 정규화 (유니코드 정규화 + 공백 정리 + 소문자)"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    질문(query) 임베딩 캐시 래퍼
+    1차: 메모리 LRU(TTL 적용), 2차(선택): SQLite 파일 - 서버 재시작 후에도 유지
+    비동기 조회(aembed_query)는 메모리만 이벤트 루프에서 확인하고, SQLite 읽기/쓰기는 작업 스레드에서 실행합니다.
+    같은 질문이 캐시에 없는 채로 동시에 들어오면 API는 한 번만 호출하고 결과(Future)를 나눠 받습니다.
+    문서 임베딩(embed_documents)은 캐시하지 않고 원본 모델로 그대로 전달합니다.
+    """
+
+    def __init__(self, base, max_size=2048, ttl=86400, persist_path=None, namespace="default", disk_max_size=100000):
+        self.base = base
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk_max_size = disk_max_size
+        # 모델이 바뀌면 이전 벡터를 재사용하지 않도록 키에 네임스페이스(모델명) 포함
+        self.namespace = namespace
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()   # 메모리 LRU/통계
+        self._db_lock = threading.Lock()   # SQLite 연결 (디스크 I/O 동안 메모리 조회를 막지 않도록 분리)
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+        # 계산 중인 질문: 키 -> Future (동기/비동기 호출이 함께 기다림)
+        self._in_flight = {}
+        self._tasks = set()
+        self._disk_writes = 0
+
+        self._db = None
+        if persist_path:
+            os.makedirs(os.path.dirname(os.path.abspath(persist_path)), exist_ok=True)
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created ON query_embeddings (created)")
+            self._prune()
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls, base, namespace="default"):
+        """환경변수(EMBED_CACHE_SIZE / EMBED_CACHE_TTL / EMBED_CACHE_PATH / EMBED_CACHE_DISK_MAX) 기반 생성"""
+        return cls(
+            base,
+            max_size=int(os.environ.get("EMBED_CACHE_SIZE", 2048)),
+            ttl=float(os.environ.get("EMBED_CACHE_TTL", 86400)),
+            persist_path=os.environ.get("EMBED_CACHE_PATH") or None,
+            namespace=namespace,
+            disk_max_size=int(os.environ.get("EMBED_CACHE_DISK_MAX", 100000)),
+        )
+
+    def _key(self, text):
+        return f"{self.namespace}:{normalize_query(text)}"
+
+    def _memory_get(self, key):
+        """메모리 LRU 조회 (이벤트 루프에서 바로 호출해도 되는 가벼운 작업)"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                vector, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return vector
+                del self._memory[key]
+            if self._db is None:
+                self._stats["misses"] += 1
+            return None
+
+    def _disk_get(self, key):
+        """SQLite 조회 (디스크 I/O가 있으므로 비동기 경로에서는 작업 스레드에서 실행)"""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT vector, created FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        with self._lock:
+            if row and time.time() - row[1] <= self.ttl:
+                vector = array("f", row[0]).tolist()
+                self._remember(key, vector, row[1])
+                self._stats["disk_hits"] += 1
+                return vector
+            self._stats["misses"] += 1
+            return None
+
+    def _remember(self, key, vector, created):
+        self._memory[key] = (vector, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _claim(self, key):
+        """
+        (Future, 직접 계산할지 여부) - 같은 질문을 계산 중이면 그 Future를 함께 기다리고,
+        아니면 새 Future를 등록해 호출한 쪽이 계산 (그 사이 메모리에 들어왔으면 완료된 Future)
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future, False
+            future = Future()
+            entry = self._memory.get(key)
+            if entry is not None and time.time() - entry[1] <= self.ttl:
+                future.set_result(entry[0])
+                return future, False
+            self._in_flight[key] = future
+            return future, True
+
+    def _settle(self, key, future, vector=None, created=None, error=None):
+        """계산 결과를 메모리에 넣고(실패면 넣지 않음) 기다리던 요청에 전달"""
+        with self._lock:
+            if error is None:
+                self._remember(key, vector, created)
+            self._in_flight.pop(key, None)
+        if error is None:
+            future.set_result(vector)
+        else:
+            future.set_exception(error)
+
+    def _disk_put(self, key, vector, created):
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, vector, created) VALUES (?, ?, ?)",
+                    (key, array("f", vector).tobytes(), created),
+                )
+                self._disk_writes += 1
+                if self._disk_writes % DISK_PRUNE_EVERY == 0:
+                    self._prune()
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ 임베딩 캐시 파일 저장 실패: {e}")
+
+    def _prune(self):
+        """만료된 항목과 최대 항목 수(disk_max_size)를 넘는 오래된 항목 삭제 (self._db_lock 안에서 호출)"""
+        self._db.execute("DELETE FROM query_embeddings WHERE created < ?", (time.time() - self.ttl,))
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE key IN "
+            "(SELECT key FROM query_embeddings ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (max(0, self.disk_max_size),),
+        )
+
+    def embed_query(self, text):
+        key = self._key(text)
+        vector = self._memory_get(key)
+        if vector is None and self._db is not None:
+            vector = self._disk_get(key)
+        if vector is not None:
+            return vector
+        future, owner = self._claim(key)
+        if not owner:
+            return future.result()
+        try:
+            vector = list(self.base.embed_query(text))
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        created = time.time()
+        self._settle(key, future, vector, created)
+        if self._db is not None:
+            self._disk_put(key, vector, created)
+        return vector
+
+    async def aembed_query(self, text):
+        key = self._key(text)
+        vector = self._memory_get(key)
+        if vector is not None:
+            return vector
+        loop = asyncio.get_running_loop()
+        if self._db is not None:
+            vector = await loop.run_in_executor(None, self._disk_get, key)
+            if vector is not None:
+                return vector
+        future, owner = self._claim(key)
+        if owner:
+            # 계산은 별도 작업으로: 처음 요청한 쪽이 취소(연결 종료)되어도 함께 기다리는 요청은 결과를 받음
+            task = loop.create_task(self._acompute(key, text, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def _acompute(self, key, text, future):
+        try:
+            vector = list(await self.base.aembed_query(text))
+        except Exception as e:
+            # 오류는 기다리는 요청들이 받음
+            self._settle(key, future, error=e)
+            return
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        created = time.time()
+        self._settle(key, future, vector, created)
+        if self._db is not None:
+            # 파일 저장은 기다리지 않음 (응답 지연에 포함되지 않도록 작업 스레드에서 처리)
+            asyncio.get_running_loop().run_in_executor(None, self._disk_put, key, vector, created)
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.base.aembed_documents(texts)
+
+    def stats(self):
+        """캐시 적중/실패 카운터"""
+        with self._lock:
+            return dict(self._stats, size=len(self._memory))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM query_embeddings")
+                self._db.commit()
@@ -0,0 +1,137 @@
+import os
+import math
+import time
+import asyncio
+import hashlib
+from typing import Any, Iterator, AsyncIterator, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """
+    오프라인용 결정적 임베딩 (GoogleGenerativeAIEmbeddings 대체)
+    글자 1~3-gram을 해시하여 dim 차원 벡터에 누적한 뒤 L2 정규화합니다.
+    같은 글자 조각을 공유하는 문장끼리 유사도가 높게 나오므로 검색 경로를 그대로 시험할 수 있습니다.
+    """
+
+    def __init__(self, dim=256, latency=0.0, ngram_range=(1, 3)):
+        self.dim = dim
+        self.latency = latency
+        self.ngram_range = ngram_range
+
+    def _vector(self, text):
+        vec = [0.0] * self.dim
+        text = " ".join(text.split())
+        lo, hi = self.ngram_range
+        for n in range(lo, hi + 1):
+            for i in range(len(text) - n + 1):
+                digest = hashlib.blake2b(text[i : i + n].encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    오프라인용 채팅 모델 (ChatGoogleGenerativeAI 대체)
+    마지막 사용자 메시지를 넣은 고정 답변을 만들고, 첫 토큰 지연(latency)과
+    초당 토큰 수(tokens_per_second)에 맞춰 응답/스트리밍 속도를 흉내 냅니다.
+    """
+
+    latency: float = 0.3
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        question = ""
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                question = str(message.content)
+                break
+        question = " ".join(question.split())[:40]
+        words = f"'{question}' 질문에 대한 모의 답변입니다.".split()
+        filler = "입시 데이터를 바탕으로 합격 가능성과 지원 전략을 안내드립니다.".split()
+        while len(words) < self.answer_tokens:
+            words.extend(filler)
+        return [w + " " for w in words[: self.answer_tokens]]
+
+    def _usage(self, messages, tokens):
+        input_tokens = sum(len(str(m.content)) for m in messages) // 2
+        return {"input_tokens": input_tokens, "output_tokens": len(tokens),
+                "total_tokens": input_tokens + len(tokens)}
+
+    def _result(self, messages, tokens):
+        message = AIMessage(content="".join(tokens).strip(), usage_metadata=self._usage(messages, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._answer_tokens(messages)
+        time.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        return self._result(messages, tokens)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        tokens = self._answer_tokens(messages)
+        await asyncio.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        return self._result(messages, tokens)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self._answer_tokens(messages)
+        time.sleep(self.latency)
+        for token in tokens:
+            time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._answer_tokens(messages)
+        await asyncio.sleep(self.latency)
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            usage = self._usage(messages, tokens) if i == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+
+
+def fake_embeddings_from_env():
+    return HashedNgramEmbeddings(
+        dim=int(os.environ.get("FAKE_EMBED_DIM", 256)),
+        latency=float(os.environ.get("FAKE_EMBED_LATENCY", 0.05)),
+    )
+
+
+def fake_chat_model_from_env():
+    return FakeChatModel(
+        latency=float(os.environ.get("FAKE_LLM_LATENCY", 0.3)),
+        tokens_per_second=float(os.environ.get("FAKE_LLM_TOKENS_PER_SEC", 50)),
+        answer_tokens=int(os.environ.get("FAKE_LLM_ANSWER_TOKENS", 60)),
+    )
@@ -1,116 +1,339 @@
 import pandas as pd
 import os
-import shutil
+import sys
+import json
 import time
-from tqdm import tqdm
+import glob
+import shutil
+import hashlib
+import argparse
 from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from db_meta import (write_db_version, read_db_version, new_db_version, write_manifest, read_manifest,
+                     publish_index, index_dir)
+from backends import make_embeddings, make_vectorstore, chroma_server
+from embedding_batcher import MicroBatchEmbeddings
+from program_table import ProgramTable
+from lexical_index import LexicalIndex
+from univ_matcher import load_aliases
+from workbook_cache import iter_sheets
+from ingest_pipeline import EmbeddingPipeline, AdaptiveRateLimiter
+from llm_gateway import LLMGateway
+
+# 재시도를 모두 소진한 배치 기록 (python ingest.py --retry-failed 로 재처리)
+DEAD_LETTER_FILE = "ingest_dead_letter.json"
+# 전체 재생성으로 교체된 이전 DB 폴더('<db_path>.old-<버전>')를 남겨 두는 개수와 최소 보관 시간(초)
+# 서버 워커가 새 manifest를 보고(DB_RELOAD_INTERVAL) 이전 벡터 DB를 닫을 때까지(VECTORSTORE_RETIRE_DELAY) 지우지 않음
+KEEP_OLD_DBS = 1
+OLD_DB_GRACE = float(os.environ.get("OLD_DB_GRACE", 600))
 
 # 1. 환경설정 로드 (.env 파일의 GOOGLE_API_KEY 로드)
 load_dotenv()
 
-def ingest_data():
-    # 2. 기존 DB 삭제 (깨끗하게 새로 만들기 위해)
-    db_path = "./db"
+def make_doc_id(sheet_name, univ, major, seen):
+    """시트 + 대학 + 전공 기반의 안정적인 문서 ID (같은 조합이 반복되면 순번 부여)"""
+    base = f"{sheet_name}|{univ}|{major}"
+    seen[base] = seen.get(base, 0) + 1
+    if seen[base] > 1:
+        base = f"{base}#{seen[base]}"
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+def content_hash(content, metadata):
+    """본문 + 메타데이터 해시 (변경 감지용)"""
+    payload = content + "\n" + json.dumps(metadata, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def resolve_column(df, *candidates):
+    """후보 컬럼 중 시트에 처음으로 존재하는 컬럼 이름 (없으면 None)"""
+    for name in candidates:
+        if name in df.columns:
+            return name
+    return None
+
+def column_text(df, *candidates, default=""):
+    """컬럼 전체를 문자열 Series로 변환 (컬럼이 없으면 default로 채움)"""
+    name = resolve_column(df, *candidates)
+    if name is None:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[name].astype(str)
+
+def iter_sheet_documents(sheet_name, df, seen):
+    """
+    시트 하나를 (문서 ID, Document)로 변환하는 제너레이터
+    컬럼 탐색은 시트당 한 번만 하고, 본문/메타데이터 문자열은 컬럼 단위(벡터화)로 만든 뒤
+    행은 하나씩 내보내므로 시트 크기와 관계없이 문서 목록 전체를 메모리에 쌓지 않습니다.
+    """
+    # NaN 데이터를 빈 문자열로 처리
+    df = df.fillna("")
+
+    # '대학교'와 '전공' 컬럼 찾기 (유연하게 대응)
+    univ = column_text(df, '대학교', '대학').str.strip()
+    major = column_text(df, '전공', '모집단위(전공)', '모집단위').str.strip()
+    mask = (univ != "") & (major != "")
+    if not mask.any():
+        return
+    df, univ, major = df[mask], univ[mask], major[mask]
+
+    def col(*candidates, default=""):
+        return column_text(df, *candidates, default=default)
+
+    category = col('계열')
+    region = (col('시도') + " " + col('시군')).str.strip()
+    target_score = col('적정점수', default='정보없음')
+    est_score = col('예상점수', default='정보없음')
+
+    # 검색 시 사용될 텍스트 구성
+    content = (
+        f"[{sheet_name}] " + univ + " " + major + " (" + category + ") 입시 정보. "
+        + "지역: " + region + ", 모집군: " + col('모집군') + ", 정원: " + col('정원') + "명. "
+        + "적정 점수: " + target_score + "점, 예상 점수: " + est_score + "점. "
+        + "반영비율: 국어 " + col('국어구성비') + ", 수학 " + col('수학구성비') + ", "
+        + "영어 " + col('영어구성비') + ", 탐구 " + col('탐구구성비') + "."
+    )
+
+    # 메타데이터 저장 (분석 엔진에서 활용)
+    meta_columns = {
+        "source": univ + " " + major,
+        "univ": univ,
+        "major": major,
+        "category": category.str.strip(),
+        "region": region,
+        "모집군": col('모집군').str.strip(),
+        "정원": col('정원').str.strip(),
+        "누백": col('누백').str.strip(),
+        "적정점수": col('적정점수').str.strip(),
+        "예상점수": col('예상점수').str.strip(),
+        "국어비중": col('국어구성비').str.strip(),
+        "수학비중": col('수학구성비').str.strip(),
+        "영어비중": col('영어구성비').str.strip(),
+        "탐구비중": col('탐구구성비').str.strip(),
+    }
+    keys = list(meta_columns)
+    columns = [meta_columns[k].tolist() for k in keys]
+
+    for text, values in zip(content.tolist(), zip(*columns)):
+        metadata = dict(zip(keys, values))
+        metadata["sheet"] = sheet_name
+        metadata["content_hash"] = content_hash(text, metadata)
+        doc_id = make_doc_id(sheet_name, metadata["univ"], metadata["major"], seen)
+        yield doc_id, Document(page_content=text, metadata=metadata)
+
+def iter_documents(excel_file_path):
+    """엑셀의 모든 시트를 읽어 (문서 ID, Document)를 차례로 생성"""
+    seen = {}
+
+    # 모든 시트 읽기 (파싱 결과는 파일 해시 기준 Parquet 스냅샷으로 캐시)
+    # header=4는 사용자 이전 코드 기준 (데이터 시작 위치에 따라 조정 가능)
+    for sheet_name, df in iter_sheets(excel_file_path, header=4):
+        print(f"📄 '{sheet_name}' 시트 처리 중...")
+        yield from iter_sheet_documents(sheet_name, df, seen)
+
+def make_chroma_writer(vectorstore):
+    """미리 계산된 임베딩을 Chroma 컬렉션에 그대로 저장하는 함수 (같은 ID는 덮어씀)"""
+    def write(ids, vectors, docs):
+        vectorstore._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            metadatas=[doc.metadata for doc in docs],
+            documents=[doc.page_content for doc in docs],
+        )
+    return write
+
+def load_dead_letters(db_path):
+    path = os.path.join(db_path, DEAD_LETTER_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_dead_letters(db_path, dead_letters):
+    """실패한 배치 기록 저장 (없으면 파일 삭제)"""
+    path = os.path.join(db_path, DEAD_LETTER_FILE)
+    if not dead_letters:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dead_letters, f, ensure_ascii=False, indent=2)
+
+def load_existing_hashes(vectorstore):
+    """기존 DB의 문서 ID -> content_hash"""
+    existing = vectorstore.get(include=["metadatas"])
+    return {
+        doc_id: (meta or {}).get("content_hash")
+        for doc_id, meta in zip(existing.get("ids", []), existing.get("metadatas", []))
+    }
+
+def iter_changed(documents, existing_hashes, seen_ids):
+    """새로 생기거나 바뀐 문서만 내보냄 (엑셀에 남아 있는 ID는 seen_ids에 기록)"""
+    for doc_id, doc in documents:
+        seen_ids.add(doc_id)
+        if existing_hashes.get(doc_id) != doc.metadata["content_hash"]:
+            yield doc_id, doc
+
+def exit_with_dead_letters(db_path, dead_letters, version):
+    """저장하지 못한 배치를 안내하고 실패로 종료"""
+    failed_rows = sum(len(entry["ids"]) for entry in dead_letters)
+    print(f"❌ {len(dead_letters)}개 배치({failed_rows}건)를 저장하지 못했습니다. "
+          f"'{os.path.join(db_path, DEAD_LETTER_FILE)}'를 확인하고 "
+          f"'python ingest.py --retry-failed'로 다시 시도하세요. (버전: {version})")
+    sys.exit(1)
+
+def replace_db_dir(build_path, db_path, version):
+    """
+    전체 재생성으로 새로 만든 폴더를 db_path 자리로 교체하고, 남겨 둔 이전 폴더 경로 반환 (없으면 None)
+    기존 폴더는 지우지 않고 '<db_path>.old-<version>'으로 남겨 두므로, 실행 중인 서버 워커는 이전 파일로 응답을 계속하다가
+    새 manifest를 보고 새 폴더로 바꿉니다. 더 오래된 이전 폴더는 다음 교체 때 정리하며,
+    최근 KEEP_OLD_DBS개와 OLD_DB_GRACE초가 지나지 않은 폴더는 남깁니다 (publish_index의 이전 버전 정리와 같은 방식).
+    """
+    old_path = None
     if os.path.exists(db_path):
-        shutil.rmtree(db_path)
-        print(f"🧹 기존 DB 폴더('{db_path}')를 삭제했습니다.")
+        old_path = f"{db_path}.old-{version}"
+        os.rename(db_path, old_path)
+        # 교체 시각 기록 (폴더 이름 변경은 수정 시각을 바꾸지 않음)
+        os.utime(old_path)
+    os.rename(build_path, db_path)
+
+    # 오래된 이전 폴더 정리 (이전 형식의 '<db_path>.old' 포함)
+    retired = sorted(glob.glob(f"{glob.escape(db_path)}.old*"), key=os.path.getmtime, reverse=True)
+    now = time.time()
+    for path in retired[KEEP_OLD_DBS:]:
+        if now - os.path.getmtime(path) >= OLD_DB_GRACE:
+            shutil.rmtree(path, ignore_errors=True)
+    return old_path
+
+def ingest_data(full=False, excel_file_path="data/univer_data.xlsx", db_path="./db",
+                concurrency=4, rate=5.0, batch_size=100, retry_failed=False):
+    """
+    엑셀 데이터를 벡터 DB에 저장
+    - 기본(증분 모드): 행별 해시를 비교해 새로 생기거나 바뀐 행만 임베딩하고, 사라진 행은 삭제
+      (기존 DB를 지우지 않으므로 실행 중에도 서버가 DB를 계속 사용할 수 있음)
+    - full=True: 처음부터 다시 생성 (로컬 DB는 옆 폴더에 만든 뒤 마지막에 교체하므로 실행 중인 서버는 중단되지 않음)
+    - retry_failed=True: 직전 실행에서 실패한 배치(dead letters)의 행만 다시 저장
+    임베딩은 concurrency개까지 동시에 요청하며, 초당 rate회에서 시작해 429 응답에 맞춰 속도를 조절합니다.
+    """
+    # 2. 전체 재생성 모드: 로컬 DB는 '<db_path>.full-tmp'에 새로 만든 뒤 마지막에 db_path와 교체
+    # (기존 폴더를 먼저 지우면 그 폴더를 쓰고 있는 서버 워커가 벡터 DB와 산출물을 잃음)
+    db_path = db_path.rstrip("/\\") or db_path
+    build_path = db_path
+    if full and not chroma_server():
+        build_path = f"{db_path}.full-tmp"
+        shutil.rmtree(build_path, ignore_errors=True)
+        print(f"🧱 전체 재생성: '{build_path}'에 새로 만든 뒤 '{db_path}'와 교체합니다.")
 
     # 3. 엑셀 파일 설정
-    excel_file_path = "data/univer_data.xlsx"
     if not os.path.exists(excel_file_path):
         print(f"❌ '{excel_file_path}' 파일이 없습니다. 경로를 확인해주세요.")
         return
 
-    documents = []
     print(f"📂 '{excel_file_path}' 파일을 읽는 중...")
 
     try:
-        # 모든 시트 읽기
-        xls = pd.ExcelFile(excel_file_path)
-        
-        for sheet_name in xls.sheet_names:
-            print(f"📄 '{sheet_name}' 시트 처리 중...")
-            # header=4는 사용자 이전 코드 기준 (데이터 시작 위치에 따라 조정 가능)
-            df = pd.read_excel(xls, sheet_name=sheet_name, header=4)
-            
-            # NaN 데이터를 빈 문자열로 처리
-            df = df.fillna("")
-
-            for _, row in df.iterrows():
-                # '대학교'와 '전공' 컬럼 찾기 (유연하게 대응)
-                univ = str(row.get('대학교', row.get('대학', ''))).strip()
-                major = str(row.get('전공', row.get('모집단위(전공)', row.get('모집단위', '')))).strip()
-                
-                if not univ or not major:
-                    continue
-
-                category = str(row.get('계열', ''))
-                region = f"{row.get('시도','')} {row.get('시군','')}".strip()
-                target_score = str(row.get('적정점수', '정보없음'))
-                est_score = str(row.get('예상점수', '정보없음'))
-
-                # 검색 시 사용될 텍스트 구성
-                content = (
-                    f"[{sheet_name}] {univ} {major} ({category}) 입시 정보. "
-                    f"지역: {region}, 모집군: {row.get('모집군','')}, 정원: {row.get('정원','')}명. "
-                    f"적정 점수: {target_score}점, 예상 점수: {est_score}점. "
-                    f"반영비율: 국어 {row.get('국어구성비','')}, 수학 {row.get('수학구성비','')}, "
-                    f"영어 {row.get('영어구성비','')}, 탐구 {row.get('탐구구성비','')}."
-                )
-                
-                # 메타데이터 저장 (분석 엔진에서 활용)
-                metadata = {
-                    "source": f"{univ} {major}",
-                    "univ": univ,
-                    "major": major,
-                    "sheet": sheet_name,
-                    "누백": str(row.get('누백', '')).strip(),
-                    "적정점수": str(row.get('적정점수', '')).strip(),
-                    "국어비중": str(row.get('국어구성비', '')).strip(),
-                    "수학비중": str(row.get('수학구성비', '')).strip(),
-                    "탐구비중": str(row.get('탐구구성비', '')).strip()
-                }
-                documents.append(Document(page_content=content, metadata=metadata))
-
-        print(f"✅ 총 {len(documents)}개의 문서를 생성했습니다.")
+        # 문서는 제너레이터로 만들어 임베딩 파이프라인이 배치 단위로 가져감
+        documents = iter_documents(excel_file_path)
 
         # 4. 벡터 DB 저장 (Batch Processing)
-        print("💾 벡터 DB(Chroma)에 저장 중... (Rate Limit 방지를 위해 천천히 진행합니다)")
-        
-        embeddings = GoogleGenerativeAIEmbeddings(model="text-embedding-004")
-        
-        vectorstore = Chroma(
-            persist_directory=db_path,
-            embedding_function=embeddings
+        embeddings = make_embeddings()
+
+        vectorstore = make_vectorstore(build_path, embeddings)
+        if full and chroma_server():
+            # Chroma 서버 모드: 로컬 폴더 대신 서버의 컬렉션을 비움
+            vectorstore.reset_collection()
+
+        existing_hashes, seen_ids = {}, set()
+        if full:
+            to_upsert = documents
+        elif retry_failed:
+            failed_ids = {doc_id for entry in load_dead_letters(db_path) for doc_id in entry["ids"]}
+            to_upsert = ((doc_id, doc) for doc_id, doc in documents if doc_id in failed_ids)
+            print(f"🔁 실패 배치 재처리: {len(failed_ids)}건")
+        else:
+            existing_hashes = load_existing_hashes(vectorstore)
+            to_upsert = iter_changed(documents, existing_hashes, seen_ids)
+
+        print(f"💾 벡터 DB(Chroma)에 저장 중... (동시 요청 {concurrency}개, 429 응답 시 자동 감속)")
+        pipeline = EmbeddingPipeline(
+            # 작업 스레드의 배치가 batch_size보다 작으면(마지막 배치, 증분 모드) 묶어서 한 번에 호출
+            MicroBatchEmbeddings.from_env(embeddings, max_batch=max(batch_size, 1), max_in_flight=concurrency),
+            make_chroma_writer(vectorstore),
+            concurrency=concurrency,
+            batch_size=batch_size,
+            limiter=AdaptiveRateLimiter(rate=rate),
+            # 동시 요청 수는 파이프라인이 정하므로 관문은 회로 차단기 역할만 함
+            gateway=LLMGateway.from_env(max_concurrency=concurrency),
         )
+        dead_letters = pipeline.run(to_upsert)
+        if pipeline.throttled:
+            print(f"⚠️ Rate Limit 응답 {pipeline.throttled}회 (최종 속도 {pipeline.limiter.rate:.2f}회/초)")
+
+        # 증분 모드: 엑셀에서 사라진 문서는 삭제
+        to_delete = [doc_id for doc_id in existing_hashes if doc_id not in seen_ids]
+        if existing_hashes:
+            print(f"🔄 증분 모드: 추가/변경 {pipeline.succeeded}건, 실패 {pipeline.failed}건, 삭제 {len(to_delete)}건, "
+                  f"변경 없음 {len(seen_ids) - pipeline.processed}건")
+
+        # 저장에 성공한 배치가 없으면(모두 실패 포함) 벡터 DB는 그대로이므로 산출물을 다시 만들지 않음
+        if not full and not pipeline.succeeded and not to_delete:
+            save_dead_letters(db_path, dead_letters)
+            manifest = read_manifest(db_path)
+            version = read_db_version(db_path) or write_db_version(db_path)
+            directory = index_dir(db_path, manifest)
+            table = ProgramTable.load(directory)
+            index = manifest.get("index") if manifest else None
+            if not index or table is None or LexicalIndex.load(directory, table) is None:
+                # 산출물 폴더가 없거나 이전 형식(programs.npz)이면 현재 벡터 DB 기준으로 공개
+                table = ProgramTable.from_vectorstore(vectorstore)
+                index = publish_index(db_path, version, [table, LexicalIndex.build(table)])
+            # 별칭 테이블 변경도 반영되도록 manifest는 항상 다시 기록 (서버는 manifest가 바뀌면 다시 읽음)
+            write_manifest(db_path, table, version, load_aliases(), index=index)
+            if dead_letters:
+                exit_with_dead_letters(db_path, dead_letters, version)
+            print("✨ 변경된 데이터가 없습니다. DB를 그대로 유지합니다.")
+            return
+
+        if to_delete:
+            print(f"🗑️ 엑셀에서 사라진 문서 {len(to_delete)}건을 삭제합니다...")
+            for i in range(0, len(to_delete), 1000):
+                vectorstore.delete(ids=to_delete[i : i + 1000])
+
+        # 모집단위 컬럼형 테이블 (서버의 추천/진단 엔진) + 학과/대학 이름 검색용 BM25 어휘 색인 (같은 행 순서)
+        table = ProgramTable.from_vectorstore(vectorstore)
+        lexical_index = LexicalIndex.build(table)
+        # 새 버전 폴더(db/index/<버전>/)에 .npy로 공개 -> DB 버전 -> manifest 순으로 기록
+        # (서버 워커는 manifest가 바뀌면 새 폴더를 메모리 매핑해 재시작 없이 교체)
+        version = new_db_version()
+        index = publish_index(build_path, version, [table, lexical_index])
+        print(f"📋 모집단위 테이블/어휘 색인 저장 완료 ({len(table)}건, n-gram {len(lexical_index.terms)}개) -> {index}")
+        # DB 버전 갱신 (서버의 응답 캐시 무효화 신호)
+        write_db_version(build_path, version)
+        # 서버 빠른 시작용 manifest (대학 목록, 별칭, 시트별 모집단위 수, DB 버전, 산출물 폴더)
+        write_manifest(build_path, table, version, load_aliases(), index=index)
+        save_dead_letters(build_path, dead_letters)
+        if build_path != db_path:
+            old_path = replace_db_dir(build_path, db_path, version)
+            print(f"🔁 '{db_path}'를 새로 만든 DB로 교체했습니다."
+                  + (f" (이전 DB는 '{old_path}'에 보관)" if old_path else ""))
 
-        batch_size = 100  # 유료 버전이므로 배치 사이즈 확대
-        for i in tqdm(range(0, len(documents), batch_size), desc="저장 진행률"):
-            batch = documents[i : i + batch_size]
-            
-            # 유료 버전은 속도 제한이 거의 없으므로 즉시 처리
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    vectorstore.add_documents(batch)
-                    break 
-                except Exception as e:
-                    if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-                        wait_time = (attempt + 1) * 2 # 대기 시간 대폭 단축
-                        print(f"\n⚠️ Rate Limit 도달! {wait_time}초 후 재시도합니다... ({attempt+1}/{max_retries})")
-                        time.sleep(wait_time)
-                    else:
-                        raise e
-            
-            # 별도의 휴식 시간 제거
-
-        print(f"🎉 모든 데이터가 '{db_path}' 폴더에 성공적으로 저장되었습니다!")
+        if dead_letters:
+            exit_with_dead_letters(db_path, dead_letters, version)
+        print(f"🎉 모든 데이터가 '{db_path}' 폴더에 성공적으로 저장되었습니다! (버전: {version})")
 
     except Exception as e:
         print(f"❌ 오류 발생: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    ingest_data()
+    parser = argparse.ArgumentParser(description="엑셀 입시 데이터를 벡터 DB(Chroma)에 저장합니다.")
+    parser.add_argument("--full", action="store_true", help="전체를 다시 임베딩 (로컬 DB는 옆 폴더에 새로 만든 뒤 교체)")
+    parser.add_argument("--retry-failed", action="store_true", help="직전 실행에서 실패한 배치만 다시 저장")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("INGEST_CONCURRENCY", 4)),
+                        help="동시 임베딩 요청 수")
+    parser.add_argument("--rate", type=float, default=float(os.environ.get("INGEST_RATE", 5.0)),
+                        help="초기 초당 임베딩 요청 수 (429 응답에 따라 자동 조절)")
+    parser.add_argument("--batch-size", type=int, default=100, help="임베딩 요청 1회당 문서 수")
+    parser.add_argument("--excel", default="data/univer_data.xlsx", help="입시 데이터 엑셀 경로")
+    parser.add_argument("--db-path", default=os.environ.get("DB_PATH", "./db"), help="벡터 DB 폴더")
+    args = parser.parse_args()
+    ingest_data(full=args.full, excel_file_path=args.excel, db_path=args.db_path,
+                concurrency=args.concurrency, rate=args.rate,
+                batch_size=args.batch_size, retry_failed=args.retry_failed)
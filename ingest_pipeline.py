@@ -0,0 +1,170 @@
+import time
+import random
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from tqdm import tqdm
+from llm_gateway import GatewayRejected, is_rate_limit_error
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """지수 백오프 + full jitter: 0 ~ min(cap, base * 2^attempt) 사이 임의 대기"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveRateLimiter:
+    """
+    토큰 버킷 기반 요청 속도 제한기 (AIMD)
+    성공할 때마다 초당 요청 수를 조금씩 올리고(additive increase),
+    429를 받으면 절반으로 줄입니다(multiplicative decrease).
+    """
+
+    def __init__(self, rate=5.0, min_rate=0.2, max_rate=50.0, increase=0.2, decrease=0.5, burst=None):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """토큰 1개를 얻을 때까지 대기"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # 버킷에 남은 토큰도 비워 즉시 몰아서 재요청하지 않도록 함
+            self._tokens = 0
+            self._updated = time.monotonic()
+
+
+class EmbeddingPipeline:
+    """
+    임베딩 계산과 DB 쓰기를 분리한 파이프라인
+    - 임베딩: 스레드 풀에서 최대 concurrency개 배치를 동시에 요청 (속도 제한기 + 백오프 재시도)
+    - 쓰기: 호출한 스레드에서 완료된 배치부터 순서대로 write_fn 실행 (임베딩과 겹쳐서 진행)
+    재시도를 모두 소진한 배치는 버리지 않고 dead_letters에 기록합니다.
+    gateway(LLMGateway)를 주면 임베딩 호출이 회로 차단기를 거치므로, 429가 반복될 때
+    스레드마다 따로 재시도하지 않고 모두 함께 쉬었다가 시험 호출이 성공하면 재개합니다.
+    """
+
+    def __init__(self, embeddings, write_fn, concurrency=4, batch_size=100, max_retries=5, limiter=None,
+                 gateway=None):
+        self.embeddings = embeddings
+        self.write_fn = write_fn
+        self.concurrency = max(1, concurrency)
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.gateway = gateway
+        self.dead_letters = []
+        self.throttled = 0
+        # 저장에 성공한 문서 수 / 재시도를 모두 소진해 dead letters로 남긴 문서 수
+        self.succeeded = 0
+        self.failed = 0
+
+    @property
+    def processed(self):
+        """처리를 마친 문서 수 (성공 + 실패)"""
+        return self.succeeded + self.failed
+
+    def _embed_batch(self, batch):
+        texts = [doc.page_content for _, doc in batch]
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                if self.gateway is not None:
+                    vectors = self.gateway.call(self.embeddings.embed_documents, texts, lane="embed")
+                else:
+                    vectors = self.embeddings.embed_documents(texts)
+                self.limiter.on_success()
+                return vectors
+            except GatewayRejected as e:
+                # 회로 차단기가 열림: 호출하지 않고 안내받은 시간만큼 대기 (재시도 횟수에는 포함)
+                if attempt == self.max_retries:
+                    raise
+                tqdm.write(f"🚧 임베딩 호출 일시 중지, {e.retry_after}초 후 재시도합니다... ({attempt+1}/{self.max_retries})")
+                time.sleep(e.retry_after)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                if is_rate_limit_error(e):
+                    self.throttled += 1
+                    self.limiter.on_throttle()
+                wait_time = backoff_delay(attempt)
+                tqdm.write(f"⚠️ 임베딩 실패({type(e).__name__}), {wait_time:.1f}초 후 재시도합니다... "
+                           f"({attempt+1}/{self.max_retries}, 현재 속도 {self.limiter.rate:.2f}회/초)")
+                time.sleep(wait_time)
+
+    def _record_failure(self, batch, error):
+        self.dead_letters.append({"ids": [doc_id for doc_id, _ in batch], "error": str(error)})
+
+    def _iter_batches(self, documents):
+        iterator = iter(documents)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def run(self, documents, total=None):
+        """
+        (문서 ID, Document) 목록 또는 제너레이터 처리. 실패한 배치 목록(dead letters)을 반환
+        입력은 배치 단위로 필요할 때만 읽으므로 전체 문서를 미리 만들어 둘 필요가 없습니다.
+        """
+        batches = self._iter_batches(documents)
+        # 메모리 사용량을 제한하기 위해 동시에 대기 중인 배치 수를 제한
+        max_in_flight = self.concurrency * 2
+        pending = {}
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool, \
+                tqdm(total=total, desc="저장 진행률") as progress:
+            while not exhausted or pending:
+                while not exhausted and len(pending) < max_in_flight:
+                    batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    pending[pool.submit(self._embed_batch, batch)] = batch
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = pending.pop(future)
+                    try:
+                        vectors = future.result()
+                        self.write_fn(
+                            [doc_id for doc_id, _ in batch],
+                            vectors,
+                            [doc for _, doc in batch],
+                        )
+                    except Exception as e:
+                        self._record_failure(batch, e)
+                        self.failed += len(batch)
+                    else:
+                        self.succeeded += len(batch)
+                    progress.update(len(batch))
+
+        return self.dead_letters
@@ -0,0 +1,108 @@
+import os
+import numpy as np
+from program_table import save_arrays, load_arrays
+
+# 인제스트 시 모집단위 테이블과 함께 저장되는 어휘 색인 (배열별 .npy 폴더)
+LEXICAL_INDEX_DIR = "lexical"
+ARRAY_NAMES = ["ids", "terms", "indptr", "docs", "weights"]
+# 색인하는 모집단위 필드와 가중치 (학과 이름이 일치하는 것을 가장 중시)
+FIELD_WEIGHTS = {"major": 2.0, "univ": 1.0, "category": 1.0, "region": 1.0}
+# 글자 n-gram 크기 (한국어는 띄어쓰기/조사가 불규칙하므로 형태소 대신 글자 단위)
+NGRAM_SIZES = (2, 3)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def char_ngrams(text, sizes=NGRAM_SIZES):
+    """어절별 글자 n-gram 목록 (중복 포함, 어절을 넘나드는 n-gram은 만들지 않음)"""
+    grams = []
+    for word in str(text).split():
+        for n in sizes:
+            grams.extend(word[i : i + n] for i in range(len(word) - n + 1))
+    return grams
+
+
+class LexicalIndex:
+    """
+    모집단위 BM25 색인 (대학/학과/계열/지역의 글자 n-gram)
+    용어별 역색인(CSR: indptr/docs)과 게시 항목별 BM25 가중치를 ProgramTable 행 번호 기준으로 보관합니다.
+    가중치는 생성 시 미리 계산하므로 검색은 배열 덧셈만으로 끝나고, 로드는 메모리 매핑만 합니다.
+    """
+
+    def __init__(self, ids, terms, indptr, docs, weights):
+        self.ids = np.asarray(ids, dtype=str)
+        self.terms = np.asarray(terms, dtype=str)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.docs = np.asarray(docs, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.term_ids = {t: i for i, t in enumerate(self.terms.tolist())}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, program_table):
+        """ProgramTable 행마다 필드별 n-gram 빈도(가중치 적용)를 세어 색인 생성"""
+        term_ids = {}
+        post_terms, post_docs, post_tfs = [], [], []
+        doc_len = np.zeros(len(program_table), dtype=np.float32)
+        columns = {field: getattr(program_table, field) for field in FIELD_WEIGHTS}
+        for row in range(len(program_table)):
+            tf = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for gram in char_ngrams(columns[field][row]):
+                    tf[gram] = tf.get(gram, 0.0) + weight
+            for gram, count in tf.items():
+                post_terms.append(term_ids.setdefault(gram, len(term_ids)))
+                post_docs.append(row)
+                post_tfs.append(count)
+            doc_len[row] = sum(tf.values())
+
+        post_terms = np.asarray(post_terms, dtype=np.int64)
+        order = np.argsort(post_terms, kind="stable")
+        docs = np.asarray(post_docs, dtype=np.int32)[order]
+        tfs = np.asarray(post_tfs, dtype=np.float32)[order]
+        df = np.bincount(post_terms, minlength=len(term_ids))
+        indptr = np.concatenate([[0], np.cumsum(df)])
+        terms = np.array(sorted(term_ids, key=term_ids.get), dtype=str)
+
+        # 게시 항목별 BM25 가중치: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * 문서 길이 / 평균 길이))
+        n_docs = len(program_table)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if n_docs else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / max(avgdl, 1e-9))
+        weights = np.repeat(idf, df) * tfs * (BM25_K1 + 1) / (tfs + norm[docs])
+        return cls(program_table.ids, terms, indptr, docs, weights)
+
+    def save(self, directory):
+        """directory/lexical/<배열>.npy 로 저장 (원자적 교체는 db_meta.publish_index가 담당)"""
+        return save_arrays(os.path.join(directory, LEXICAL_INDEX_DIR),
+                           {name: getattr(self, name) for name in ARRAY_NAMES})
+
+    @classmethod
+    def load(cls, directory, program_table=None, mmap=True):
+        """
+        저장된 색인 로드 (없으면 None, 배열은 메모리 매핑)
+        program_table을 주면 행 순서가 같은지 확인하고, 다르면(테이블만 다시 만든 경우) None
+        """
+        arrays = load_arrays(os.path.join(directory, LEXICAL_INDEX_DIR), ARRAY_NAMES, mmap)
+        if arrays is None:
+            return None
+        index = cls(**arrays)
+        if program_table is not None and not np.array_equal(index.ids, program_table.ids):
+            return None
+        return index
+
+    def search(self, query, k=30):
+        """(행 번호 배열, BM25 점수 배열) - 점수 내림차순 최대 k개, 겹치는 n-gram이 없으면 빈 배열"""
+        term_rows = {self.term_ids[g] for g in char_ngrams(query) if g in self.term_ids}
+        if not term_rows or not len(self):
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        scores = np.zeros(len(self), dtype=np.float32)
+        for t in term_rows:
+            start, end = self.indptr[t], self.indptr[t + 1]
+            # 한 용어의 게시 목록 안에서는 행 번호가 겹치지 않으므로 바로 더해도 됨
+            scores[self.docs[start:end]] += self.weights[start:end]
+        candidates = np.flatnonzero(scores)
+        top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]].astype(np.int32)
+        return top, scores[top]
@@ -0,0 +1,371 @@
+import os
+import math
+import time
+import asyncio
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager, asynccontextmanager
+from metrics import span
+
+# 호출 종류별 우선순위 (작을수록 먼저): 답변 생성이 제목/요약 때문에 밀리지 않도록 함
+LANE_PRIORITY = {"answer": 0, "summary": 1, "title": 2, "embed": 3}
+# 대기열에서 기다리는 최대 시간(초). 넘기면 호출하지 않고 거절(load shedding)
+DEFAULT_DEADLINES = {"answer": 15.0, "summary": 60.0, "title": 5.0, "embed": 600.0}
+# 부가 작업이 동시에 차지할 수 있는 슬롯 비율 (나머지는 답변용으로 남겨 둠)
+LANE_SHARE = {"summary": 0.5, "title": 0.5}
+# 반열림 상태에서 시험 호출이 진행 중일 때 안내하는 재시도 대기(초)
+PROBE_RETRY_AFTER = 5
+
+
+def is_rate_limit_error(e):
+    """Gemini 할당량 초과(429 / RESOURCE_EXHAUSTED) 여부"""
+    err_msg = str(e)
+    return "429" in err_msg or "RESOURCE_EXHAUSTED" in err_msg.upper()
+
+
+class GatewayRejected(Exception):
+    """LLM을 호출하지 않고 거절한 요청 (retry_after초 뒤 재시도 권장)"""
+    status_code = 503
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class CircuitOpenError(GatewayRejected):
+    """할당량 초과가 반복되어 회로 차단기가 열린 상태"""
+    status_code = 429
+
+
+class LoadShedError(GatewayRejected):
+    """대기열이 가득 찼거나 마감 시간 안에 차례가 오지 않는 요청"""
+    status_code = 503
+
+
+class CircuitBreaker:
+    """
+    할당량 초과(429) 회로 차단기
+    - closed: 정상 호출. 429가 failure_threshold번 연속되면 open
+    - open: reset_timeout초 동안 호출하지 않고 바로 CircuitOpenError
+    - half_open: 시험 호출 1건만 보내 성공하면 closed, 다시 429면 대기 시간을 두 배로 늘려 open
+    429가 아닌 오류(네트워크, 취소 등)는 실패로 세지 않습니다.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, max_reset_timeout=300.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _retry_after(self, now):
+        return self._opened_at + self._timeout - now
+
+    def check(self):
+        """호출 가능 여부만 확인 (열림 상태면 CircuitOpenError, 상태는 바꾸지 않음)"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            if self.state == "open" and self._retry_after(now) > 0:
+                raise CircuitOpenError("API 호출 한도 초과로 잠시 호출을 멈춘 상태입니다.", self._retry_after(now))
+            if self._probing:
+                raise CircuitOpenError("API 호출 한도 회복 여부를 확인하는 중입니다.", PROBE_RETRY_AFTER)
+
+    def before_call(self):
+        """호출 직전 확인. 반환: 이 호출이 반열림 상태의 시험 호출인지 여부"""
+        self.check()
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if self._probing:
+                raise CircuitOpenError("API 호출 한도 회복 여부를 확인하는 중입니다.", PROBE_RETRY_AFTER)
+            self.state = "half_open"
+            self._probing = True
+            return True
+
+    def on_success(self, probe=False):
+        with self._lock:
+            if probe:
+                self._probing = False
+                self.state = "closed"
+                self._timeout = self.reset_timeout
+                print("✅ LLM 호출 한도 회복: 회로 차단기를 닫습니다.")
+            if self.state == "closed":
+                self.failures = 0
+
+    def on_failure(self, error, probe=False):
+        with self._lock:
+            if probe:
+                self._probing = False
+            if not is_rate_limit_error(error):
+                return
+            self.failures += 1
+            if probe:
+                self._timeout = min(self.max_reset_timeout, self._timeout * 2)
+                self._open()
+            elif self.state == "closed" and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self.trips += 1
+        print(f"🚧 LLM 호출 한도 초과가 반복되어 {self._timeout:.0f}초 동안 호출을 멈춥니다.")
+
+    def retry_after(self):
+        with self._lock:
+            if self.state == "closed":
+                return 0
+            return max(PROBE_RETRY_AFTER if self._probing else 0, self._retry_after(time.monotonic()))
+
+
+class _Waiter:
+    """대기열 항목: 슬롯을 받으면 granted, 밀려나면 error를 채운 뒤 wake() 호출"""
+    __slots__ = ("lane", "priority", "seq", "deadline", "wake", "granted", "error")
+
+    def __init__(self, lane, seq, deadline, wake):
+        self.lane = lane
+        self.priority = LANE_PRIORITY.get(lane, len(LANE_PRIORITY))
+        self.seq = seq
+        self.deadline = deadline
+        self.wake = wake
+        self.granted = False
+        self.error = None
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMGateway:
+    """
+    LLM/임베딩 API 호출 관문 (server.py, main.py, ingest.py 공용)
+    - 동시 호출 수 제한 (max_concurrency), 초과분은 우선순위 대기열(answer > summary > title > embed)
+    - 대기열이 가득 차거나 마감 시간(lane별) 안에 차례가 오지 않을 요청은 바로 거절 (LoadShedError)
+    - 429가 반복되면 회로 차단기를 열어 API를 호출하지 않고 바로 거절 (CircuitOpenError)
+    비동기(aslot/ainvoke)와 스레드(slot/invoke/call) 호출이 같은 슬롯을 나눠 씁니다.
+    """
+
+    def __init__(self, max_concurrency=8, max_queue=32, breaker=None, deadlines=None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.breaker = breaker or CircuitBreaker()
+        self.deadlines = {**DEFAULT_DEADLINES, **(deadlines or {})}
+        self.lane_limits = {
+            lane: max(1, int(self.max_concurrency * share)) for lane, share in LANE_SHARE.items()
+        }
+        self.events = Counter()     # (lane, 사건) -> 횟수
+        self._active = Counter()    # lane -> 실행 중인 호출 수
+        self._in_flight = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._avg_seconds = 2.0     # 호출 1건 소요 시간 이동 평균 (대기 시간 추정용)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """
+        환경변수 기반 생성
+        LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT(답변 대기 마감), LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET
+        """
+        options = {
+            "max_concurrency": int(os.environ.get("LLM_MAX_CONCURRENCY", 8)),
+            "max_queue": int(os.environ.get("LLM_MAX_QUEUE", 32)),
+            "breaker": CircuitBreaker(
+                failure_threshold=int(os.environ.get("LLM_BREAKER_THRESHOLD", 3)),
+                reset_timeout=float(os.environ.get("LLM_BREAKER_RESET", 30)),
+            ),
+            "deadlines": {"answer": float(os.environ.get("LLM_QUEUE_TIMEOUT", DEFAULT_DEADLINES["answer"]))},
+        }
+        options.update(overrides)
+        return cls(**options)
+
+    # --- 슬롯 관리 (_can_run/_take/_dispatch는 self._lock 안에서 호출) ---
+
+    def _can_run(self, lane):
+        return (self._in_flight < self.max_concurrency
+                and self._active[lane] < self.lane_limits.get(lane, self.max_concurrency))
+
+    def _take(self, lane):
+        self._in_flight += 1
+        self._active[lane] += 1
+
+    def _dispatch(self):
+        """빈 슬롯을 우선순위가 가장 높은(같으면 먼저 온) 대기 요청에 넘김. 깨울 대기자 목록 반환"""
+        woken = []
+        while self._queue:
+            runnable = [w for w in self._queue if self._can_run(w.lane)]
+            if not runnable:
+                break
+            waiter = min(runnable, key=lambda w: (w.priority, w.seq))
+            self._queue.remove(waiter)
+            self._take(waiter.lane)
+            waiter.granted = True
+            woken.append(waiter)
+        return woken
+
+    def _enter(self, lane, wake):
+        """바로 실행 가능하면 None, 아니면 대기열에 넣은 _Waiter 반환 (거절 시 LoadShedError)"""
+        now = time.monotonic()
+        waiter = _Waiter(lane, next(self._seq), now + self.deadlines.get(lane, DEFAULT_DEADLINES["answer"]), wake)
+        evicted = None
+        with self._lock:
+            if self._can_run(lane):
+                self._take(lane)
+                self.events[(lane, "admitted")] += 1
+                return None
+            # 앞에 있는 요청 수로 대기 시간을 추정해 마감 안에 차례가 오지 않으면 바로 거절
+            ahead = sum(1 for w in self._queue if w.priority <= waiter.priority)
+            estimate = (ahead // self.max_concurrency + 1) * self._avg_seconds
+            if estimate > waiter.deadline - now:
+                self.events[(lane, "shed_estimate")] += 1
+                raise LoadShedError("요청이 많아 처리가 지연되고 있습니다. 잠시 후 다시 시도해주세요.", estimate)
+            if len(self._queue) >= self.max_queue:
+                # 대기열이 가득 차면 우선순위가 가장 낮은(같으면 가장 늦게 온) 요청을 밀어냄
+                worst = max(self._queue, key=lambda w: (w.priority, w.seq))
+                if (worst.priority, worst.seq) < (waiter.priority, waiter.seq):
+                    self.events[(lane, "shed_full")] += 1
+                    raise LoadShedError("대기 중인 요청이 너무 많습니다. 잠시 후 다시 시도해주세요.", self._avg_seconds)
+                self._queue.remove(worst)
+                self.events[(worst.lane, "shed_full")] += 1
+                worst.error = LoadShedError("더 급한 요청에 자리를 양보했습니다. 잠시 후 다시 시도해주세요.",
+                                            self._avg_seconds)
+                evicted = worst
+            self._queue.append(waiter)
+            self.events[(lane, "queued")] += 1
+        if evicted:
+            evicted.wake()
+        return waiter
+
+    def _abandon(self, waiter):
+        """기다리던 요청이 마감/취소로 떠날 때 정리. 그 사이 슬롯을 받았다면 True"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+            return False
+
+    def _admitted(self, waiter):
+        """대기가 끝난 요청의 결과 확인 (밀려났으면 예외)"""
+        if waiter.error is not None:
+            raise waiter.error
+        if not waiter.granted and not self._abandon(waiter):
+            self.events[(waiter.lane, "shed_deadline")] += 1
+            raise LoadShedError("요청이 많아 처리가 지연되고 있습니다. 잠시 후 다시 시도해주세요.",
+                                self._avg_seconds)
+        self.events[(waiter.lane, "admitted")] += 1
+
+    def _release(self, lane, elapsed=None):
+        with self._lock:
+            self._in_flight -= 1
+            self._active[lane] -= 1
+            if elapsed is not None:
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            woken = self._dispatch()
+        for waiter in woken:
+            waiter.wake()
+
+    @contextmanager
+    def _guarded(self, lane):
+        """슬롯을 얻은 뒤 회로 차단기를 거쳐 호출 (성공/실패를 차단기에 기록하고 슬롯 반환)"""
+        started = time.monotonic()
+        probe = None
+        try:
+            try:
+                probe = self.breaker.before_call()
+            except CircuitOpenError:
+                self.events[(lane, "rejected_open")] += 1
+                raise
+            try:
+                yield
+            except BaseException as e:
+                self.breaker.on_failure(e, probe)
+                raise
+            self.breaker.on_success(probe)
+        finally:
+            self._release(lane, time.monotonic() - started if probe is not None else None)
+
+    def _check_breaker(self, lane):
+        try:
+            self.breaker.check()
+        except CircuitOpenError:
+            self.events[(lane, "rejected_open")] += 1
+            raise
+
+    # --- 비동기 호출 (server.py) ---
+
+    async def _acquire_async(self, lane):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._enter(lane, lambda: loop.call_soon_threadsafe(_resolve, future))
+        if waiter is None:
+            return
+        with span(f"{lane}_queue"):
+            try:
+                await asyncio.wait_for(future, timeout=max(0.0, waiter.deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # 클라이언트 연결 종료 등으로 취소: 받은 슬롯이 있으면 돌려줌
+                if self._abandon(waiter):
+                    self._release(lane)
+                raise
+        self._admitted(waiter)
+
+    @asynccontextmanager
+    async def aslot(self, lane="answer"):
+        """async with gateway.aslot("answer"): ... (스트리밍처럼 호출이 길게 이어질 때)"""
+        self._check_breaker(lane)
+        await self._acquire_async(lane)
+        with self._guarded(lane):
+            yield
+
+    async def ainvoke(self, model, model_input, lane="answer", **kwargs):
+        async with self.aslot(lane):
+            return await model.ainvoke(model_input, **kwargs)
+
+    # --- 동기 호출 (main.py, ingest.py 작업 스레드) ---
+
+    def _acquire_sync(self, lane):
+        event = threading.Event()
+        waiter = self._enter(lane, event.set)
+        if waiter is None:
+            return
+        with span(f"{lane}_queue"):
+            event.wait(timeout=max(0.0, waiter.deadline - time.monotonic()))
+        self._admitted(waiter)
+
+    @contextmanager
+    def slot(self, lane="answer"):
+        self._check_breaker(lane)
+        self._acquire_sync(lane)
+        with self._guarded(lane):
+            yield
+
+    def call(self, fn, *args, lane="answer", **kwargs):
+        with self.slot(lane):
+            return fn(*args, **kwargs)
+
+    def invoke(self, model, model_input, lane="answer", **kwargs):
+        return self.call(model.invoke, model_input, lane=lane, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "circuit": self.breaker.state,
+                "circuit_trips": self.breaker.trips,
+                "retry_after": round(self.breaker.retry_after(), 1),
+                "in_flight": self._in_flight,
+                "queued": len(self._queue),
+                "max_concurrency": self.max_concurrency,
+                "avg_call_seconds": round(self._avg_seconds, 3),
+            }
@@ -1,23 +1,28 @@
 import os
 import sys
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_classic.chains import create_retrieval_chain
-from langchain_classic.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
+from backends import make_embeddings, make_chat_model, make_vectorstore, require_api_key, embedding_namespace
+from univ_matcher import UnivMatcher
+from program_table import ProgramTable
+from retrieval import DirectRetriever
+from lexical_index import LexicalIndex
+from context_builder import ContextBuilder
+from embedding_cache import CachedEmbeddings
+from db_meta import read_manifest, index_dir
+from llm_gateway import LLMGateway, GatewayRejected, is_rate_limit_error
 
 # 1. 환경설정 로드(env에서)
 load_dotenv()
 
 def start_chatbot():
-    # API 키 확인
-    if not os.getenv("GOOGLE_API_KEY"):
+    # API 키 확인 (LLM_BACKEND=fake 인 오프라인 모드에서는 생략)
+    if require_api_key() and not os.getenv("GOOGLE_API_KEY"):
         print("❌ .env 파일에 GOOGLE_API_KEY가 없습니다.")
         sys.exit()
 
     # 2. DB 및 대학교 목록 불러오기
-    db_path = "./db"
+    db_path = os.environ.get("DB_PATH", "./db")
     if not os.path.exists(db_path):
         print(f"❌ '{db_path}' 폴더가 없습니다. 'python ingest.py'를 먼저 실행하여 데이터를 인덱싱해주세요!")
         sys.exit()
@@ -25,31 +30,39 @@ def start_chatbot():
     print("🔍 시스템 초기화 중...")
     try:
         # 임베딩 모델 설정
-        embeddings = GoogleGenerativeAIEmbeddings(model="text-embedding-004")
+        # 반복 질문은 임베딩 API를 호출하지 않도록 캐시 래퍼 적용
+        embeddings = CachedEmbeddings.from_env(make_embeddings(), namespace=embedding_namespace())
         
         # 벡터 DB 로드
-        vectorstore = Chroma(
-            persist_directory=db_path,
-            embedding_function=embeddings
-        )
+        vectorstore = make_vectorstore(db_path, embeddings)
 
         # 전체 대학 목록 추출 (메타데이터에서 고유값 가져오기)
         # 검색 정확도를 높이기 위해 미리 대학 목록을 알고 있으면 좋습니다.
         print("🎓 대학교 목록 로딩 중...")
-        all_metas = vectorstore.get().get('metadatas', [])
-        univ_list = sorted(list(set([m.get('univ') for m in all_metas if m.get('univ')])))
+        # ingest.py가 만든 manifest/모집단위 테이블이 있으면 벡터 DB 전체를 읽지 않음
+        manifest = read_manifest(db_path)
+        program_table = ProgramTable.load(index_dir(db_path, manifest))
+        if manifest and program_table is not None:
+            univ_list = manifest["universities"]
+            univ_matcher = UnivMatcher(univ_list, aliases=manifest.get("aliases"))
+        else:
+            program_table = ProgramTable.from_vectorstore(vectorstore)
+            univ_list = sorted(program_table.by_univ)
+            univ_matcher = UnivMatcher(univ_list)
+        # 대학이 특정된 질문은 대학 -> 문서 ID 인덱스로 바로 조회 (임베딩/벡터 검색 생략)
+        # 학과 이름 위주의 질문은 BM25 어휘 색인으로 먼저 찾음 (인제스트 시 저장, 없으면 바로 생성)
+        lexical_index = LexicalIndex.load(index_dir(db_path, manifest), program_table) or LexicalIndex.build(program_table)
+        direct_retriever = DirectRetriever(vectorstore, program_table, lexical_index=lexical_index)
+        context_builder = ContextBuilder.from_env()
         print(f"✅ {len(univ_list)}개의 대학교 정보를 확인했습니다.")
 
-        # 3. 챗봇 설정 (Retriever & LLM)
-        # 검색 품질을 높이기 위해 MMR(Maximal Marginal Relevance) 검색방식 사용
-        # 100개를 먼저 뽑은 뒤, 그 중 가장 의미가 겹치지 않는 30개를 최종 선정
-        retriever = vectorstore.as_retriever(
-            search_type="mmr",
-            search_kwargs={'k': 30, 'fetch_k': 100}
-        )
-        llm = ChatGoogleGenerativeAI(model="gemini-flash-latest", temperature=0)
+        # 3. 챗봇 설정 (LLM)
+        # 문서 검색은 대화 루프에서 direct_retriever(대학 인덱스 / 어휘 색인 / 벡터 검색)로 직접 수행
+        llm = make_chat_model()
+        # 429가 반복되면 회로 차단기를 열어 한동안 API를 호출하지 않음 (server.py와 같은 관문)
+        llm_gateway = LLMGateway.from_env()
 
-        # 4. 시스템 프롬프트 및 체인 설정
+        # 4. 시스템 프롬프트 설정
         system_prompt = (
             "당신은 대한민국 대입 입시 상담 전문 AI입니다. 아래 제공된 [검색된 데이터]를 바탕으로 성심껏 답변하세요.\n\n"
             "[답변 규칙]\n"
@@ -66,10 +79,6 @@ def start_chatbot():
             ("human", "{input}"),
         ])
 
-        # 검색-생성(RAG) 체인 생성
-        combine_docs_chain = create_stuff_documents_chain(llm, prompt)
-        rag_chain = create_retrieval_chain(retriever, combine_docs_chain)
-
         # 5. 대화 루프
         print("\n" + "="*50)
         print("🎓 AI 대학 입시 컨설턴트 챗봇이 활성화되었습니다!")
@@ -87,29 +96,38 @@ def start_chatbot():
                 continue
 
             try:
-                # [지능형 검색] 사용자의 질문에 포함된 대학교 이름 찾기
-                # 단순히 포함 여부만 보는 게 아니라, 질문에서 가장 길게 매칭되는 대학 이름을 선택
-                matches = []
-                for u in univ_list:
-                    u_short = u.replace("대학교", "")
-                    if u in user_input:
-                        matches.append((u, len(u)))
-                    elif len(u_short) >= 2 and u_short in user_input:
-                        matches.append((u, len(u_short)))
-                
-                # 가장 길게 매칭된 대학을 선택 (예: '성결대학교 국제학과' -> '국제'보다 '성결대학교' 우선)
+                # [지능형 검색] 사용자의 질문에 포함된 대학교/학과 이름 찾기
+                # Aho-Corasick 매칭기로 질문을 한 번만 훑어 겹치지 않는 최장 매칭을 모두 찾음
+                # (예: '성결대학교 국제학과' -> '국제'가 아닌 '성결대학교', '가천대 의대' -> 가천대학교 + 의예과)
+                matches = univ_matcher.match(user_input)
+                target_univs = list(dict.fromkeys(m.name for m in matches if m.kind == "univ"))
+                target_majors = list(dict.fromkeys(m.name for m in matches if m.kind == "major"))
+
                 search_kwargs = {"k": 30}
-                if matches:
-                    matches.sort(key=lambda x: x[1], reverse=True)
-                    target_univ = matches[0][0]
-                    search_kwargs["filter"] = {"univ": target_univ}
+                if len(target_univs) == 1:
+                    search_kwargs["filter"] = {"univ": target_univs[0]}
                     search_kwargs["k"] = 100
-                    print(f"🎯 '{target_univ}' 필터링 검색을 수행합니다 (최대 100개)...")
+                    print(f"🎯 '{target_univs[0]}' 모집단위를 조회합니다 (최대 100개)...")
+                elif target_univs:
+                    search_kwargs["filter"] = {"univ": {"$in": target_univs}}
+                    search_kwargs["k"] = 100 * len(target_univs)
+                    print(f"🎯 {target_univs} 모집단위를 조회합니다 (최대 {search_kwargs['k']}개)...")
                 else:
                     print("🔍 일반 검색을 수행합니다...")
 
-                # 1. 문서 검색
-                relevant_docs = vectorstore.similarity_search(user_input, **search_kwargs)
+                # 별칭으로 인식된 학과는 정식 명칭을 검색어에 덧붙임
+                search_query = " ".join([user_input] + [m for m in target_majors if m not in user_input])
+
+                # 1. 문서 검색 (대학이 특정되면 인덱스 조회, 학과 이름이 확실하면 어휘 색인, 아니면 벡터 + 어휘 검색)
+                relevant_docs = direct_retriever.retrieve(target_univs, search_query, target_majors)
+                lexical_ids, confident = [], False
+                if not target_univs:
+                    lexical_ids, confident = direct_retriever.lexical_search(search_query, target_majors, k=search_kwargs["k"])
+                    if confident:
+                        relevant_docs = direct_retriever.get_documents(lexical_ids)
+                if relevant_docs is None:
+                    relevant_docs = vectorstore.similarity_search(search_query, **search_kwargs)
+                    relevant_docs = direct_retriever.fuse(relevant_docs, lexical_ids, search_kwargs["k"])
                 
                 # 2. 검색 결과 로그 (어떤 전공들이 검색되었는지 출력)
                 found_majors = sorted(list(set([d.metadata.get('major') for d in relevant_docs])))
@@ -117,13 +135,13 @@ def start_chatbot():
                 print(f"✅ 검색된 대학: {found_univs}")
                 print(f"✅ 검색된 전공(일부): {found_majors[:10]}... (총 {len(found_majors)}개 학과)")
 
-                # 3. 컨텍스트 구성
-                doc_contents = [d.page_content for d in relevant_docs]
-                context_text = "\n\n".join(doc_contents)
+                # 3. 컨텍스트 구성 (중복 제거 + 관련도 순 + 토큰 예산 안의 압축 표)
+                context_text, context_stats = context_builder.build(relevant_docs, search_query, target_majors)
+                print(f"🧾 컨텍스트: 약 {context_stats['tokens']} 토큰 (원문 대비 {context_stats['saved_tokens']} 토큰 절감)")
                 
                 # 4. 프롬프트 생성 및 실행
                 messages = prompt.format_messages(context=context_text, input=user_input)
-                response = llm.invoke(messages)
+                response = llm_gateway.invoke(llm, messages, lane="answer")
                 
                 # 5. 답변 출력 (리스트 형식의 응답도 텍스트만 추출하도록 개선)
                 if isinstance(response.content, list):
@@ -136,7 +154,10 @@ def start_chatbot():
                 
             except Exception as e:
                 err_msg = str(e)
-                if "429" in err_msg or "RESOURCE_EXHAUSTED" in err_msg.upper():
+                if isinstance(e, GatewayRejected):
+                    print(f"\n⚠️ {err_msg} 약 {e.retry_after}초 뒤에 다시 시도해주세요.")
+                    continue
+                if is_rate_limit_error(e):
                     print("\n⚠️ API 호출 한도 초과 (429 Error):")
                     print("현재 사용 중인 Gemini API의 무료 티어 할당량을 모두 소진했습니다.")
                     print("약 1분~1시간 뒤에 다시 시도하거나, 다른 API 키를 사용해야 합니다.")
@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import threading
+import contextvars
+from collections import Counter as _Counts
+from contextlib import contextmanager
+
+# 단계별 지연 시간 히스토그램 구간(초)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}   # 라벨 -> [구간별 누적 개수..., 합계, 개수]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            entry = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    lines.append(f"{self.name}_bucket{_label_text(names, key + (_format_value(bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_format_value(entry[-2])}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+
+class GaugeCallback:
+    """수집 시점에 fn()을 호출해 값을 읽는 게이지 (캐시 통계 등 다른 객체가 가진 값)"""
+
+    def __init__(self, name, help_text, fn, labelnames=(), kind="gauge"):
+        self.name, self.help, self.fn, self.labelnames, self.kind = name, help_text, fn, tuple(labelnames), kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            if value is None:
+                continue
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Prometheus 텍스트 형식(/metrics)으로 내보내는 지표 모음"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, name, help_text, fn, labelnames=(), kind="gauge"):
+        metric = GaugeCallback(name, help_text, fn, labelnames, kind)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("chat_stage_seconds", "요청 처리 단계별 소요 시간(초)", ["stage"])
+
+# 요청 1건의 단계별 소요 시간 (비동기 작업마다 따로 유지)
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace():
+    """요청 1건의 trace 시작: {"spans": {단계: ms}, 그 밖의 annotate() 값}"""
+    trace = {"spans": {}}
+    _trace.set(trace)
+    return trace
+
+
+def annotate(**values):
+    """현재 요청의 trace에 값 기록 (검색 경로, 컨텍스트 크기 등)"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.update(values)
+
+
+@contextmanager
+def span(stage):
+    """단계 소요 시간 측정: 히스토그램에 기록하고 현재 요청의 trace에도 남김"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _trace.get()
+        if trace is not None:
+            spans = trace["spans"]
+            spans[stage] = round(spans.get(stage, 0.0) + elapsed * 1000, 2)
+
+
+class SamplingProfiler:
+    """
+    표본 추출 프로파일러 (외부 패키지 없음)
+    별도 스레드가 interval초마다 모든 스레드의 호출 스택을 찍어 세고, 결과를 flamegraph용
+    collapsed 형식('함수;함수;함수 개수')으로 반환합니다. 같은 시간에 처리 중인 다른 요청도 함께 잡힙니다.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._counts = _Counts()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self._counts.most_common())
@@ -0,0 +1,226 @@
+import os
+import numpy as np
+from admission import STATUS_BANDS, DEFAULT_WEIGHTS, classify_admission
+
+# 인제스트 시 저장되는 모집단위 테이블 (컬럼별 .npy 폴더, 서버는 메모리 매핑으로 읽음)
+PROGRAM_TABLE_DIR = "programs"
+# 이전 형식 (벡터 DB 폴더의 단일 .npz 파일, 읽기만 지원)
+PROGRAM_TABLE_FILE = "programs.npz"
+
+STRING_FIELDS = ["ids", "univ", "major", "sheet", "region", "category"]
+FLOAT_FIELDS = ["cutoff", "w_kor", "w_mat", "w_inq"]
+# 메타데이터 키 -> 숫자 컬럼
+METADATA_FLOATS = {"cutoff": "누백", "w_kor": "국어비중", "w_mat": "수학비중", "w_inq": "탐구비중"}
+# 학과 이름 비교 시 떼어내는 접미사 ('컴퓨터공학과' -> '컴퓨터공학')
+MAJOR_SUFFIXES = ("학과", "학부", "전공", "과", "부")
+
+
+def _to_float(value):
+    try:
+        return float(value) if value not in (None, "") else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def major_stem(name):
+    """학과 이름의 핵심 부분 (괄호 안 설명과 학과/학부 등 접미사 제거)"""
+    stem = name.split("(", 1)[0].strip()
+    for suffix in MAJOR_SUFFIXES:
+        if stem.endswith(suffix) and len(stem) > len(suffix) + 1:
+            return stem[: -len(suffix)]
+    return stem
+
+
+def char_bigrams(text):
+    text = "".join(text.split())
+    return {text[i : i + 2] for i in range(len(text) - 1)}
+
+
+def major_match_score(major, query, majors=(), query_bigrams=None):
+    """
+    질문과 학과 이름의 일치 정도
+    3: 별칭으로 인식된 학과이거나 이름 전체가 질문에 등장, 2: 핵심 부분이 질문에 등장,
+    0~1: 핵심 부분의 글자 2-gram 중 질문과 겹치는 비율
+    """
+    if major in majors or major in query:
+        return 3.0
+    stem = major_stem(major)
+    if len(stem) >= 2 and stem in query:
+        return 2.0
+    grams = char_bigrams(stem)
+    if not grams:
+        return 0.0
+    query_bigrams = query_bigrams if query_bigrams is not None else char_bigrams(query)
+    return len(grams & query_bigrams) / len(grams)
+
+
+def save_arrays(path, arrays):
+    """배열 dict -> path/<이름>.npy (메모리 매핑으로 읽을 수 있도록 압축하지 않음)"""
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.asarray(array))
+    return path
+
+
+def load_arrays(path, names, mmap=True):
+    """path/<이름>.npy 로드 (하나라도 없으면 None). mmap이면 읽기 전용 메모리 매핑으로 열어
+    같은 파일을 여는 여러 워커 프로세스가 페이지 캐시를 공유합니다."""
+    files = {name: os.path.join(path, f"{name}.npy") for name in names}
+    if not all(os.path.exists(f) for f in files.values()):
+        return None
+    return {name: np.load(f, mmap_mode="r" if mmap else None, allow_pickle=False) for name, f in files.items()}
+
+
+def _group_index(values):
+    """값 -> 해당 행 번호 배열"""
+    if len(values) == 0:
+        return {}
+    keys, inverse = np.unique(values, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+    return {str(k): idx for k, idx in zip(keys, np.split(order.astype(np.int32), bounds))}
+
+
+class ProgramTable:
+    """
+    모집단위(대학 x 학과) 컬럼형 테이블
+    합격선 누백과 과목별 비중은 float 배열(없으면 NaN)로, 시트/대학/지역별 행 번호는 인덱스 배열로 보관하여
+    '내 성적으로 어디 갈 수 있어?' 같은 질문을 전체 모집단위에 대해 한 번의 벡터 연산으로 계산합니다.
+    """
+
+    def __init__(self, columns):
+        for name in STRING_FIELDS:
+            setattr(self, name, np.asarray(columns[name], dtype=str))
+        for name in FLOAT_FIELDS:
+            setattr(self, name, np.asarray(columns[name], dtype=np.float64))
+        # 지역 인덱스는 시/도 단위 ('서울 강남구' -> '서울')
+        sido = np.array([r.split(" ", 1)[0] for r in self.region], dtype=str)
+        self.by_sheet = _group_index(self.sheet)
+        self.by_univ = _group_index(self.univ)
+        self.by_region = _group_index(sido)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_metadatas(cls, ids, metadatas):
+        """Chroma 문서 ID/메타데이터 목록으로 테이블 생성"""
+        columns = {name: [] for name in STRING_FIELDS + FLOAT_FIELDS}
+        for doc_id, meta in zip(ids, metadatas):
+            meta = meta or {}
+            if not meta.get("univ"):
+                continue
+            columns["ids"].append(doc_id)
+            for name in ["univ", "major", "sheet", "region", "category"]:
+                columns[name].append(str(meta.get(name, "")))
+            for name, key in METADATA_FLOATS.items():
+                columns[name].append(_to_float(meta.get(key)))
+        return cls(columns)
+
+    @classmethod
+    def empty(cls):
+        return cls({name: [] for name in STRING_FIELDS + FLOAT_FIELDS})
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        data = vectorstore.get(include=["metadatas"])
+        return cls.from_metadatas(data.get("ids", []), data.get("metadatas", []))
+
+    def save(self, directory):
+        """directory/programs/<컬럼>.npy 로 저장 (원자적 교체는 db_meta.publish_index가 담당)"""
+        return save_arrays(os.path.join(directory, PROGRAM_TABLE_DIR),
+                           {name: getattr(self, name) for name in STRING_FIELDS + FLOAT_FIELDS})
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """저장된 테이블 로드 (없으면 None). 컬럼은 메모리 매핑으로 읽어 복사하지 않음"""
+        columns = load_arrays(os.path.join(directory, PROGRAM_TABLE_DIR), STRING_FIELDS + FLOAT_FIELDS, mmap)
+        if columns is not None:
+            return cls(columns)
+        path = os.path.join(directory, PROGRAM_TABLE_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in STRING_FIELDS + FLOAT_FIELDS})
+
+    def select(self, sheet=None, univ=None, region=None):
+        """조건에 맞는 행 번호 배열 (조건이 없으면 전체)"""
+        idx = None
+        for index, key in [(self.by_sheet, sheet), (self.by_univ, univ), (self.by_region, region)]:
+            if not key:
+                continue
+            rows = index.get(key, np.empty(0, dtype=np.int32))
+            idx = rows if idx is None else np.intersect1d(idx, rows, assume_unique=True)
+        return np.arange(len(self), dtype=np.int32) if idx is None else idx
+
+    def find(self, univ, major=None, sheet=None):
+        """대학(+학과, 시트)으로 모집단위 행 번호 찾기 (학과를 생략하면 해당 대학 전체)"""
+        rows = self.select(sheet=sheet, univ=univ)
+        if major:
+            rows = rows[self.major[rows] == major]
+        return rows
+
+    def rank_by_major(self, univ, query, majors=(), k=100):
+        """해당 대학의 모집단위 행 번호를 질문과 학과 이름이 잘 맞는 순으로 최대 k개 (같은 점수는 원래 순서 유지)"""
+        rows = self.by_univ.get(univ, np.empty(0, dtype=np.int32))
+        if not len(rows):
+            return rows
+        query_bigrams = char_bigrams(query)
+        scores = np.array([major_match_score(str(m), query, majors, query_bigrams) for m in self.major[rows]])
+        return rows[np.argsort(-scores, kind="stable")[:k]]
+
+    def weighted_percentiles(self, rows, p_kor, p_mat, p_inq):
+        """
+        행별 비중을 적용한 사용자 누백 (비중이 없으면 기본 비중 사용)
+        p_*가 (학생 수, 1) 모양 배열이면 (학생 수, 행 수) 행렬을 반환합니다.
+        """
+        w_kor = np.where(np.isnan(self.w_kor[rows]), DEFAULT_WEIGHTS["국어"], self.w_kor[rows])
+        w_mat = np.where(np.isnan(self.w_mat[rows]), DEFAULT_WEIGHTS["수학"], self.w_mat[rows])
+        w_inq = np.where(np.isnan(self.w_inq[rows]), DEFAULT_WEIGHTS["탐구"], self.w_inq[rows])
+        return p_kor * w_kor + p_mat * w_mat + p_inq * w_inq
+
+    def recommend(self, p_kor, p_mat, p_inq, top_n=10, sheet=None, univ=None, region=None):
+        """
+        조건에 맞는 모든 모집단위에 대해 합격 판정을 한 번에 계산하고 구간별 상위 후보를 반환
+        - 안정/적정/소신: 합격선이 높은(누백이 작은) 순
+        - 불가: 부족한 차이가 작은 순
+        합격선(누백) 정보가 없는 모집단위는 제외합니다.
+        """
+        rows = self.select(sheet=sheet, univ=univ, region=region)
+        rows = rows[~np.isnan(self.cutoff[rows])]
+        user_pct = self.weighted_percentiles(rows, p_kor, p_mat, p_inq)
+        cutoff = self.cutoff[rows]
+        band, gap = classify_admission(user_pct, cutoff)
+        diff = user_pct - cutoff
+
+        result = {}
+        for b, name in enumerate(STATUS_BANDS):
+            mask = band == b
+            key = diff[mask] if name == "불가" else cutoff[mask]
+            order = np.argsort(key, kind="stable")[:top_n]
+            picked = np.flatnonzero(mask)[order]
+            result[name] = [
+                {
+                    "univ": str(self.univ[rows[i]]),
+                    "major": str(self.major[rows[i]]),
+                    "sheet": str(self.sheet[rows[i]]),
+                    "region": str(self.region[rows[i]]),
+                    "cutoff": float(cutoff[i]),
+                    "user_percentile": round(float(user_pct[i]), 2),
+                    "gap": int(gap[i]),
+                }
+                for i in picked
+            ]
+        counts = {name: int(np.count_nonzero(band == b)) for b, name in enumerate(STATUS_BANDS)}
+        return result, counts
+
+    def diagnose(self, rows, p_kor, p_mat, p_inq):
+        """
+        학생 여러 명 x 모집단위 여러 개 합격 판정을 한 번에 계산
+        p_*: 학생별 과목 누백 배열, 반환: (사용자 누백, 구간 번호, 부족 점수) - 모두 (학생 수, 행 수) 행렬
+        """
+        user_pct = self.weighted_percentiles(
+            rows, np.asarray(p_kor)[:, None], np.asarray(p_mat)[:, None], np.asarray(p_inq)[:, None]
+        )
+        band, gap = classify_admission(user_pct, self.cutoff[rows][None, :])
+        return user_pct, band, gap
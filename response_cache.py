@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from embedding_cache import normalize_query
+
+
+def docs_fingerprint(docs):
+    """검색된 문서 ID 집합의 해시 (ID가 없으면 본문 해시로 대체)"""
+    ids = sorted(d.id or hashlib.sha1(d.page_content.encode("utf-8")).hexdigest() for d in docs)
+    return hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()
+
+
+def scores_fingerprint(user_scores, bucket=1):
+    """성적 지문: 과목별 점수를 bucket 단위로 묶어 정렬한 문자열"""
+    if not user_scores:
+        return ""
+    bucket = max(1, int(bucket))
+    items = sorted((s.subjectName, s.category, s.score // bucket) for s in user_scores)
+    return hashlib.sha1(json.dumps(items, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def history_digest(history):
+    """대화 기록 다이제스트"""
+    if not history:
+        return ""
+    return hashlib.sha1(json.dumps(history, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    /chat 응답 캐시
+    키 = (정규화된 질문, 문맥 키[대학, 검색 문서 해시, 성적 지문, 대화 다이제스트])
+    정확히 일치하는 질문이 없으면 같은 문맥 키 안에서 질문 임베딩 코사인 유사도가
+    임계값 이상인 항목을 찾습니다. DB 버전이 바뀌면 전체를 비웁니다.
+    """
+
+    def __init__(self, max_size=1024, ttl=3600, similarity_threshold=0.0, version_fn=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.version_fn = version_fn
+        self._version = version_fn() if version_fn else None
+        self._entries = OrderedDict()  # (context_key, query) -> (value, vector, created)
+        self._by_context = {}          # context_key -> set((context_key, query))
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+
+    @classmethod
+    def from_env(cls, version_fn=None):
+        """환경변수(RESPONSE_CACHE_SIZE / RESPONSE_CACHE_TTL / RESPONSE_CACHE_SIMILARITY) 기반 생성"""
+        return cls(
+            max_size=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+            ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 3600)),
+            similarity_threshold=float(os.environ.get("RESPONSE_CACHE_SIMILARITY", 0) or 0),
+            version_fn=version_fn,
+        )
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    @staticmethod
+    def context_key(univs, docs_fp, scores_fp, history_fp):
+        return "|".join([",".join(univs or []), docs_fp, scores_fp, history_fp])
+
+    def _check_version(self):
+        if not self.version_fn:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self._by_context.clear()
+            self._stats["invalidations"] += 1
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_context.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_context[key[0]]
+
+    def get(self, query, context_key, query_vector=None):
+        """캐시된 응답(dict) 또는 None"""
+        if not self.enabled:
+            return None
+        key = (context_key, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[2] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                self._drop(key)
+
+            if self.similarity_threshold > 0 and query_vector is not None:
+                best_key, best_score = None, self.similarity_threshold
+                q = np.asarray(query_vector, dtype=np.float32)
+                q_norm = np.linalg.norm(q) or 1.0
+                for candidate in list(self._by_context.get(context_key, ())):
+                    value, vector, created = self._entries[candidate]
+                    if now - created > self.ttl:
+                        self._drop(candidate)
+                        continue
+                    if vector is None:
+                        continue
+                    score = float(np.dot(q, vector) / (q_norm * (np.linalg.norm(vector) or 1.0)))
+                    if score >= best_score:
+                        best_key, best_score = candidate, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self._stats["semantic_hits"] += 1
+                    return self._entries[best_key][0]
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, query, context_key, value, query_vector=None):
+        if not self.enabled:
+            return
+        key = (context_key, normalize_query(query))
+        vector = np.asarray(query_vector, dtype=np.float32) if query_vector is not None else None
+        with self._lock:
+            self._check_version()
+            self._entries[key] = (value, vector, time.time())
+            self._entries.move_to_end(key)
+            self._by_context.setdefault(context_key, set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
@@ -0,0 +1,84 @@
+import numpy as np
+from program_table import major_match_score, char_bigrams
+
+# Reciprocal Rank Fusion 상수 (순위 r의 점수 = 1 / (RRF_K + r))
+RRF_K = 60
+# 어휘 검색에서 학과 이름 재정렬 전에 읽는 후보 배수
+LEXICAL_CANDIDATE_FACTOR = 3
+# 어휘 검색 1위가 이 점수 이상 학과 이름과 맞으면(major_match_score: 2 핵심 일치, 3 전체 일치) 벡터 검색 생략
+LEXICAL_CONFIDENT_SCORE = 2.0
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """여러 순위 목록(문서 ID)을 RRF 점수 합으로 합친 ID 목록 (같은 점수는 먼저 나온 순)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
+
+
+class DirectRetriever:
+    """
+    대학이 특정된 질문용 검색 우회 경로
+    모집단위 테이블(인제스트 시 저장된 대학 -> 문서 ID 인덱스)에서 해당 대학 문서를 학과 이름 일치 순으로 골라
+    벡터 DB에서 ID로 바로 읽습니다. 질문 임베딩과 벡터 검색을 하지 않습니다.
+    대학이 없는 질문은 어휘 색인(lexical_index, BM25)으로 먼저 찾아, 학과 이름이 확실히 맞으면
+    그 결과만 사용하고 아니면 벡터 검색 결과와 RRF로 합칩니다.
+    """
+
+    def __init__(self, vectorstore, program_table, k_per_univ=100, lexical_index=None):
+        self.vectorstore = vectorstore
+        self.program_table = program_table
+        self.k_per_univ = k_per_univ
+        self.lexical_index = lexical_index
+
+    def program_ids(self, target_univs, query, majors=()):
+        """대학별 문서 ID 목록 (인덱스에 없는 대학이 하나라도 있으면 None -> 벡터 검색으로 대체)"""
+        if not target_univs:
+            return None
+        ids = []
+        for univ in target_univs:
+            rows = self.program_table.rank_by_major(univ, query, majors, k=self.k_per_univ)
+            if not len(rows):
+                return None
+            ids.extend(self.program_table.ids[rows].tolist())
+        return ids
+
+    def get_documents(self, ids):
+        """ID 순서대로 문서 읽기 (Chroma get은 순서를 보장하지 않으므로 다시 정렬)"""
+        docs = {d.id: d for d in self.vectorstore.get_by_ids(ids)}
+        return [docs[i] for i in ids if i in docs]
+
+    def retrieve(self, target_univs, query, majors=()):
+        """우회 검색 결과 문서 목록 (적용할 수 없으면 None)"""
+        ids = self.program_ids(target_univs, query, majors)
+        return self.get_documents(ids) if ids else None
+
+    def lexical_search(self, query, majors=(), k=30):
+        """
+        어휘 색인 검색: (문서 ID 목록, 확신 여부)
+        BM25 후보를 학과 이름 일치 점수 -> BM25 순으로 다시 정렬하고, 1위가 학과 이름과 확실히 맞으면 확신
+        """
+        if self.lexical_index is None:
+            return [], False
+        rows, scores = self.lexical_index.search(query, k=k * LEXICAL_CANDIDATE_FACTOR)
+        if not len(rows):
+            return [], False
+        query_bigrams = char_bigrams(query)
+        match = np.array([
+            major_match_score(str(m), query, majors, query_bigrams) for m in self.program_table.major[rows]
+        ])
+        order = np.lexsort((-scores, -match))[:k]
+        return self.program_table.ids[rows[order]].tolist(), bool(match[order[0]] >= LEXICAL_CONFIDENT_SCORE)
+
+    def fuse(self, vector_docs, lexical_ids, k=30):
+        """벡터 검색 문서와 어휘 검색 ID를 RRF로 합친 상위 k개 문서 (어휘 검색에만 있는 문서는 ID로 읽음)"""
+        if not lexical_ids or any(d.id is None for d in vector_docs):
+            return vector_docs
+        fused = reciprocal_rank_fusion([[d.id for d in vector_docs], lexical_ids])[:k]
+        docs = {d.id: d for d in vector_docs}
+        missing = [doc_id for doc_id in fused if doc_id not in docs]
+        if missing:
+            docs.update({d.id: d for d in self.vectorstore.get_by_ids(missing)})
+        return [docs[doc_id] for doc_id in fused if doc_id in docs]
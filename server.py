@@ -1,35 +1,297 @@
 import os
 import sys
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+import json
+import time
+import asyncio
+import contextvars
+import numpy as np
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Request, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage
+from backends import make_embeddings, make_chat_model, make_vectorstore, detach_local_vectorstore, require_api_key, embedding_namespace
+from univ_matcher import UnivMatcher
+from admission import STATUS_BANDS, calculate_admission_status, subject_percentiles, batch_subject_percentiles
+from program_table import ProgramTable
+from retrieval import DirectRetriever
+from lexical_index import LexicalIndex
+from context_builder import ContextBuilder
+from session_store import SessionStore
+from title_generator import TitleBatcher, heuristic_title
+from llm_gateway import LLMGateway, GatewayRejected, is_rate_limit_error
+from metrics import REGISTRY, STAGE_SECONDS, SamplingProfiler, start_trace, annotate, span
+from embedding_cache import CachedEmbeddings
+from embedding_batcher import MicroBatchEmbeddings
+from response_cache import ResponseCache, docs_fingerprint, scores_fingerprint, history_digest
+from db_meta import DbVersionWatcher, read_manifest, manifest_mtime, index_dir
 
 # 1. 환경설정 로드
 load_dotenv()
 
 app = FastAPI(title="University Admission AI Consultant API")
 
-# API 키 확인
-if not os.getenv("GOOGLE_API_KEY"):
+# API 키 확인 (LLM_BACKEND=fake 인 오프라인 모드에서는 생략)
+if require_api_key() and not os.getenv("GOOGLE_API_KEY"):
     print("❌ .env 파일에 GOOGLE_API_KEY가 없습니다.")
     sys.exit()
 
 # 2. 글로벌 리소스 초기화 (서버 시작 시 1회 실행)
-db_path = "./db"
-embeddings = GoogleGenerativeAIEmbeddings(model="text-embedding-004")
-vectorstore = Chroma(persist_directory=db_path, embedding_function=embeddings)
+db_path = os.environ.get("DB_PATH", "./db")
 
-# 대학교 목록 미리 로드
-all_metas = vectorstore.get().get('metadatas', [])
-univ_list = sorted(list(set([m.get('univ') for m in all_metas if m.get('univ')])))
+# /chat 응답 캐시 (ingest.py가 DB를 다시 만들면 db_version.txt 변경으로 자동 무효화)
+response_cache = ResponseCache.from_env(version_fn=DbVersionWatcher(db_path).current)
+RESPONSE_CACHE_SCORE_BUCKET = int(os.environ.get("RESPONSE_CACHE_SCORE_BUCKET", 1))
+
+# 블로킹 작업(Chroma 검색, 동기 임베딩 호출)을 처리할 전용 스레드 풀
+# 이벤트 루프의 기본 executor로 등록하여 LangChain의 비동기 래퍼도 같은 풀을 사용하도록 함
+CHAT_WORKER_THREADS = int(os.environ.get("CHAT_WORKER_THREADS", 16))
+blocking_executor = ThreadPoolExecutor(max_workers=CHAT_WORKER_THREADS, thread_name_prefix="chat-io")
+
+# 빠른 시작: 인제스트가 만든 manifest.json과 산출물 폴더(db/index/<버전>/)만 읽음 (벡터 DB는 열지 않음)
+manifest_loaded_at = manifest_mtime(db_path)
+manifest = read_manifest(db_path)
+# 모집단위 컬럼형 테이블 (추천/진단 엔진, 대학 -> 문서 ID 인덱스)
+# .npy를 메모리 매핑으로 읽으므로 여러 워커 프로세스가 같은 페이지 캐시를 공유
+program_table = ProgramTable.load(index_dir(db_path, manifest)) or ProgramTable.empty()
+# 대학교 목록 및 별칭 매칭기 (Aho-Corasick, 1회 구축)
+univ_list = manifest["universities"] if manifest else sorted(program_table.by_univ)
+univ_matcher = UnivMatcher(univ_list, aliases=manifest.get("aliases") if manifest else None)
+
+# 무거운 클라이언트(임베딩, Chroma, LLM)는 서버가 요청을 받기 시작한 뒤 백그라운드에서 초기화
+embeddings = None
+vectorstore = None
+direct_retriever = None
+llm = None
+readiness = {"status": "starting", "error": None, "seconds": None}
+init_future = None
+# 초기화 실패 시 다음 요청에서 다시 시도하기까지의 대기 시간(초, 실패할 때마다 2배, 최대 INIT_RETRY_MAX)
+INIT_RETRY_BASE = 5
+INIT_RETRY_MAX = 300
+init_failures = 0
+init_retry_at = 0.0
+# 초기화가 끝나지 않았을 때 /chat 요청이 기다리는 최대 시간(초), 초과 시 503
+STARTUP_WAIT_TIMEOUT = float(os.environ.get("STARTUP_WAIT_TIMEOUT", 30))
+# 인제스트로 manifest.json이 바뀌었는지 확인하는 주기(초), 0이면 교체하지 않음
+DB_RELOAD_INTERVAL = float(os.environ.get("DB_RELOAD_INTERVAL", 10))
+# 교체된 이전 로컬 벡터 DB 연결을 닫기까지 기다리는 시간(초, 처리 중인 요청이 끝나도록)
+VECTORSTORE_RETIRE_DELAY = 60
+
+def init_clients():
+    """임베딩/Chroma/LLM 클라이언트 생성 (작업 스레드에서 실행)"""
+    global embeddings, vectorstore, direct_retriever, llm, program_table, univ_list, univ_matcher
+    global init_failures, init_retry_at
+    started = time.perf_counter()
+    try:
+        # 반복 질문은 임베딩 API를 호출하지 않도록 캐시 래퍼 적용
+        # 캐시에 없는 질문은 동시에 들어온 다른 요청과 묶어 한 번에 임베딩 (EMBED_BATCH_*)
+        cached_embeddings = CachedEmbeddings.from_env(MicroBatchEmbeddings.from_env(make_embeddings()),
+                                                      namespace=embedding_namespace())
+        # CHROMA_HOST가 있으면 Chroma 서버 하나를 모든 워커가 공유
+        store = make_vectorstore(db_path, cached_embeddings)
+        if not len(program_table):
+            # manifest/모집단위 테이블이 없는 이전 버전 DB: 메타데이터 전체를 읽어 테이블과 대학 목록 구성
+            print("⚠️ 모집단위 테이블이 없어 벡터 DB 메타데이터로 모집단위 테이블을 만듭니다. (ingest.py 재실행 권장)")
+            program_table = ProgramTable.from_vectorstore(store)
+            univ_list = sorted(program_table.by_univ)
+            univ_matcher = UnivMatcher(univ_list)
+        # 학과 이름 위주의 질문용 BM25 어휘 색인 (인제스트 시 저장, 없으면 테이블로 바로 생성)
+        lexical_index = LexicalIndex.load(index_dir(db_path, manifest), program_table)
+        if lexical_index is None:
+            print("⚠️ 어휘 색인이 없거나 모집단위 테이블과 맞지 않아 어휘 색인을 새로 만듭니다. (ingest.py 재실행 권장)")
+            lexical_index = LexicalIndex.build(program_table)
+        # 대학이 특정된 질문은 임베딩/벡터 검색 없이 대학 -> 문서 ID 인덱스로 바로 조회
+        direct_retriever = DirectRetriever(store, program_table, lexical_index=lexical_index)
+        llm = make_chat_model()
+        embeddings, vectorstore = cached_embeddings, store
+        init_failures = 0
+        readiness.update(status="ok", error=None, seconds=round(time.perf_counter() - started, 2))
+        print(f"✅ 모델/벡터 DB 준비 완료 ({readiness['seconds']}초, 대학 {len(univ_list)}개)")
+    except Exception as e:
+        delay = min(INIT_RETRY_MAX, INIT_RETRY_BASE * 2 ** init_failures)
+        init_failures += 1
+        init_retry_at = time.monotonic() + delay
+        readiness.update(status="error", error=str(e))
+        print(f"❌ 모델/벡터 DB 초기화 실패 ({delay}초 뒤 다음 요청에서 다시 시도): {e}")
+
+def start_init():
+    """초기화 시작 (진행 중이면 그 작업 반환, 실패했으면 대기 시간이 지난 뒤 다시 시도)"""
+    global init_future
+    if init_future is not None and readiness["status"] == "error" and time.monotonic() >= init_retry_at:
+        init_future = None
+    if init_future is None:
+        readiness.update(status="starting")
+        init_future = asyncio.get_running_loop().run_in_executor(None, init_clients)
+    return init_future
+
+def reload_index():
+    """
+    manifest가 가리키는 새 산출물(모집단위 테이블, 어휘 색인, 대학 매칭기)과 벡터 DB 연결로 교체 (작업 스레드에서 실행)
+    새 객체를 모두 만든 뒤 전역 변수를 바꾸므로 처리 중인 요청은 이전 객체를 그대로 사용합니다.
+    다 쓴 이전 로컬 벡터 DB System 목록을 반환합니다 (Chroma 서버 모드이거나 교체하지 않았으면 빈 목록).
+    """
+    global manifest, manifest_loaded_at, program_table, univ_list, univ_matcher, direct_retriever, vectorstore
+    loaded_at = manifest_mtime(db_path)
+    new_manifest = read_manifest(db_path)
+    directory = index_dir(db_path, new_manifest)
+    table = ProgramTable.load(directory)
+    if not new_manifest or table is None:
+        return []
+    lexical_index = LexicalIndex.load(directory, table) or LexicalIndex.build(table)
+    matcher = UnivMatcher(new_manifest["universities"], aliases=new_manifest.get("aliases"))
+    # 로컬 Chroma는 열어 둔 클라이언트가 다른 프로세스(ingest.py)의 쓰기를 보지 못하므로 디스크에서 새로 엶
+    retired = detach_local_vectorstore(db_path)
+    store = make_vectorstore(db_path, embeddings) if retired else vectorstore
+    retriever = DirectRetriever(store, table, lexical_index=lexical_index)
+    manifest, manifest_loaded_at = new_manifest, loaded_at
+    program_table, univ_list, univ_matcher = table, new_manifest["universities"], matcher
+    vectorstore, direct_retriever = store, retriever
+    print(f"🔄 새 DB 산출물로 교체했습니다 (버전 {new_manifest.get('version')}, 모집단위 {len(table)}개)")
+    return retired
+
+async def watch_manifest():
+    """DB_RELOAD_INTERVAL초마다 manifest.json이 바뀌었는지 확인해 재시작 없이 산출물 교체"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(DB_RELOAD_INTERVAL)
+        if readiness["status"] != "ok" or manifest_mtime(db_path) == manifest_loaded_at:
+            continue
+        try:
+            retired = await loop.run_in_executor(None, reload_index)
+        except Exception as e:
+            print(f"⚠️ 새 DB 산출물 로드 실패 (이전 버전 유지): {e}")
+            continue
+        for system in retired:
+            loop.call_later(VECTORSTORE_RETIRE_DELAY, loop.run_in_executor, None, system.stop)
+
+async def ensure_ready():
+    """무거운 클라이언트 초기화 완료 대기 (시간 초과/실패 시 503)"""
+    if readiness["status"] == "ok":
+        return
+    try:
+        with span("startup_wait"):
+            await asyncio.wait_for(asyncio.shield(start_init()), timeout=STARTUP_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="서버를 준비하는 중입니다. 잠시 후 다시 시도해주세요.",
+                            headers={"Retry-After": "5"})
+    if readiness["status"] != "ok":
+        retry_after = max(1, int(init_retry_at - time.monotonic()))
+        raise HTTPException(status_code=503, detail=f"서버 초기화 실패: {readiness['error']}",
+                            headers={"Retry-After": str(retry_after)})
+
+@app.on_event("startup")
+async def configure_executor():
+    asyncio.get_running_loop().set_default_executor(blocking_executor)
+    start_init()
+    if DB_RELOAD_INTERVAL > 0:
+        run_in_background(watch_manifest())
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    blocking_executor.shutdown(wait=False)
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """요청별 응답 시간/상태 지표, 단계별 trace 로그, (선택) 표본 추출 프로파일링"""
+    trace = start_trace()
+    profiler = SamplingProfiler().start() if PROFILE_REQUESTS and request.headers.get("x-profile") else None
+    profile_path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{id(trace):x}.collapsed")
+    started = time.perf_counter()
+
+    def finish(status_code):
+        # 처리 중 예외가 나도 프로파일러를 멈추고 지표를 남기도록 모든 경로에서 호출
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        path = route.path if route else "unmatched"
+        HTTP_SECONDS.observe(elapsed, method=request.method, path=path)
+        HTTP_REQUESTS.inc(method=request.method, path=path, status=status_code)
+        if trace["spans"]:
+            trace["total_ms"] = round(elapsed * 1000, 2)
+            print(f"⏱️ {request.method} {path} {json.dumps(trace, ensure_ascii=False)}")
+        if profiler:
+            # 파일 쓰기는 작업 스레드에서 (이벤트 루프를 막지 않도록)
+            asyncio.get_running_loop().run_in_executor(None, write_profile, profile_path, profiler.stop())
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finish(500)
+        raise
+    if profiler:
+        response.headers["X-Profile-File"] = profile_path
+
+    # 스트리밍 응답은 본문 전송이 끝난 뒤에 기록
+    body = response.body_iterator
+
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(response.status_code)
+
+    response.body_iterator = observed_body()
+    return response
+
+def write_profile(path, collapsed):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(collapsed)
+
+# LLM 호출 관문: 동시 호출 수 제한, 우선순위 대기열(답변 > 요약 > 제목), 429 반복 시 회로 차단
+llm_gateway = LLMGateway.from_env()
+
+# 서버 측 대화 기록 (서버가 발급한 세션 토큰 기준, SESSION_STORE=memory|sqlite|none)
+session_store = SessionStore.from_env()
+SESSION_SUMMARY_MAX_CHARS = int(os.environ.get("SESSION_SUMMARY_MAX_CHARS", 800))
+# 실행 중인 백그라운드 작업 (참조를 유지해 도중에 GC되지 않도록 함)
+background_tasks = set()
+summarizing_sessions = set()
+
+# 관측 지표 (/metrics, Prometheus 텍스트 형식)
+HTTP_SECONDS = REGISTRY.histogram("http_request_seconds", "엔드포인트별 응답 시간(초, 스트리밍은 전송 완료까지)", ["method", "path"])
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "엔드포인트별 요청 수", ["method", "path", "status"])
+RETRIEVED_DOCS = REGISTRY.histogram("chat_retrieved_docs", "검색된 문서 수(k)", ["path"],
+                                    buckets=(0, 10, 30, 50, 100, 200, 400, 800))
+CONTEXT_TOKENS = REGISTRY.histogram("chat_context_tokens", "LLM 컨텍스트(모집단위 표) 추정 토큰 수",
+                                    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000))
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "LLM 입력/출력 토큰 수", ["call", "direction"])
+LLM_RATE_LIMITED = REGISTRY.counter("llm_rate_limited_total", "LLM 429(RESOURCE_EXHAUSTED) 응답 수", ["call"])
+# X-Profile 헤더가 붙은 요청을 표본 추출 프로파일링 (PROFILE_REQUESTS=1일 때만)
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "0") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "./profiles")
+
+def cache_events():
+    """캐시별 적중/실패 누적 수 (수집 시점에 각 캐시의 stats()에서 읽음)"""
+    sources = {"response": response_cache.stats(), "embedding": embeddings.stats() if embeddings else {},
+               "session": session_store.stats() if session_store else {}}
+    return {(cache, result): value for cache, stats in sources.items() for result, value in stats.items()
+            if result in ("hits", "semantic_hits", "disk_hits", "misses")}
+
+REGISTRY.gauge_callback("cache_events_total", "캐시 적중/실패 수", cache_events, ["cache", "result"], kind="counter")
+REGISTRY.gauge_callback("embedding_batch_total", "질문 임베딩 묶음 처리 누적 수 (requests: 요청, calls: 실제 API 호출)",
+                        lambda: {k: v for k, v in embeddings.base.stats().items() if k != "largest_batch"} if embeddings else {},
+                        ["event"], kind="counter")
+REGISTRY.gauge_callback("server_ready", "모델/벡터 DB 초기화 완료 여부", lambda: int(readiness["status"] == "ok"))
+REGISTRY.gauge_callback("program_count", "모집단위 테이블 행 수", lambda: len(program_table))
+REGISTRY.gauge_callback("llm_gateway_events_total", "LLM 관문 처리 결과 수 (admitted/queued/shed_*/rejected_open)",
+                        lambda: dict(llm_gateway.events), ["lane", "event"], kind="counter")
+REGISTRY.gauge_callback("llm_gateway_in_flight", "실행 중인 LLM 호출 수", lambda: llm_gateway.stats()["in_flight"])
+REGISTRY.gauge_callback("llm_gateway_queued", "대기 중인 LLM 호출 수", lambda: llm_gateway.stats()["queued"])
+REGISTRY.gauge_callback("llm_circuit_open", "회로 차단기 상태 (0: closed, 1: half_open, 2: open)",
+                        lambda: {"closed": 0, "half_open": 1, "open": 2}[llm_gateway.breaker.state])
+
+# 스트리밍 답변이 끝난 뒤 LLM 제목을 기다리는 최대 시간(초)
+TITLE_STREAM_WAIT = float(os.environ.get("TITLE_STREAM_WAIT", 1.0))
+
+# 검색 문서 -> 토큰 예산 안의 압축 표 (CONTEXT_TOKEN_BUDGET)
+context_builder = ContextBuilder.from_env()
 
 # 모델 및 프롬프트 설정
-llm = ChatGoogleGenerativeAI(model="gemini-flash-latest", temperature=0)
 system_prompt = (
     "당신은 대한민국 최고의 대입 입시 전문 AI 컨설턴트입니다. **현재 날짜는 2026년 1월 8일이며, 당신이 상담하는 모든 데이터는 2026학년도 대입(2025년 11월 수능) 기준입니다.**\n\n"
     "[상담 가이드라인]\n"
@@ -58,198 +320,648 @@ class ChatRequest(BaseModel):
     history: List[dict] = []
     userScores: Optional[List[UserScore]] = None
     sessionId: Optional[int] = None # 추가
+    sessionToken: Optional[str] = None  # 서버가 발급한 세션 토큰 (이전 응답의 sessionToken을 그대로 전달)
 
 class ChatResponse(BaseModel):
     answer: str
     detected_univ: Optional[str] = None
+    detected_univs: List[str] = [] # 질문에 등장한 모든 대학 (등장 순)
     found_majors: List[str] = []
     analysis_result: Optional[str] = None
-    title: Optional[str] = None # 추가 (새로운 대화 제목)
-
-# 5. 성적 분석 엔진 및 유틸리티
-# 표준점수 -> 누적 백분위(%) 매핑 (2026학년도 추정치 기반 샘플 데이터)
-SCORE_TO_PERCENTILE = {
-    "국어": {145: 0.1, 140: 0.5, 135: 1.5, 130: 4.0, 125: 10.0, 120: 20.0, 115: 35.0, 110: 50.0},
-    "수학": {148: 0.1, 140: 0.8, 135: 2.0, 130: 5.0, 125: 12.0, 120: 22.0, 115: 38.0, 110: 55.0},
-    "탐구": {75: 0.1, 70: 1.0, 65: 4.0, 60: 12.0, 55: 25.0, 50: 45.0} # 과목별 평균값 기준
-}
-
-def get_percentile(subject, score):
-    """표준점수를 백분위로 변환 (선형 보간 적용)"""
-    table = SCORE_TO_PERCENTILE.get(subject, SCORE_TO_PERCENTILE["탐구"])
-    scores = sorted(table.keys(), reverse=True)
-    
-    if score >= scores[0]: return table[scores[0]]
-    if score <= scores[-1]: return table[scores[-1]]
-    
-    for i in range(len(scores) - 1):
-        s1, s2 = scores[i], scores[i+1]
-        if s1 >= score > s2:
-            p1, p2 = table[s1], table[s2]
-            # 선형 보간: p = p1 + (score - s1) * (p2 - p1) / (s2 - s1)
-            return p1 + (score - s1) * (p2 - p1) / (s2 - s1)
-    return 100.0
-
-def calculate_admission_status(user_percentile, target_percentile):
-    """합격 가능성 및 부족 점수 계산 (Gap Analysis)"""
-    diff = user_percentile - target_percentile
-    if diff <= -1.5: status = "안정"
-    elif diff <= 0: status = "적정"
-    elif diff <= 1.5: status = "소신"
-    else: status = "불가"
-    
-    # 부족 점수 추정 (약 0.3%p 누백 ≈ 수능 표점 1점 가정)
-    gap_score = max(0, round(diff / 0.3)) if status in ["소신", "불가"] else 0
-    return status, gap_score
-
-# 6. API 엔드포인트 구현
+    title: Optional[str] = None # 추가 (새로운 대화 제목, 첫 대화는 임시 제목 -> /sessions/{sessionId}/title)
+    sessionToken: Optional[str] = None  # 서버 측 대화 기록의 세션 토큰 (다음 요청에 함께 보내야 기록이 이어짐)
+
+class RecommendRequest(BaseModel):
+    userScores: List[UserScore]
+    sheet: Optional[str] = None   # 시트(예: '문과', '이과')로 제한
+    region: Optional[str] = None  # 시/도(예: '서울')로 제한
+    univ: Optional[str] = None    # 특정 대학으로 제한
+    top_n: int = 10               # 구간별 후보 수
+
+class ProgramCandidate(BaseModel):
+    univ: str
+    major: str
+    sheet: str
+    region: str
+    cutoff: float           # 합격선 누백 (상위 %)
+    user_percentile: float  # 해당 모집단위 비중 적용 사용자 누백
+    gap: int                # 부족 점수 추정 (소신/불가만)
+
+class RecommendResponse(BaseModel):
+    evaluated: int                              # 판정한 모집단위 수
+    counts: Dict[str, int]                      # 구간별 모집단위 수
+    bands: Dict[str, List[ProgramCandidate]]    # 구간별 상위 후보
+
+class StudentScores(BaseModel):
+    studentId: Optional[str] = None
+    userScores: List[UserScore]
+
+class ProgramRef(BaseModel):
+    univ: str
+    major: Optional[str] = None   # 생략하면 해당 대학의 모든 모집단위
+    sheet: Optional[str] = None
+
+class DiagnosedProgram(BaseModel):
+    univ: str
+    major: str
+    sheet: str
+    cutoff: float
+
+class StudentDiagnosis(BaseModel):
+    studentId: Optional[str] = None
+    percentiles: Dict[str, float]   # 과목별 누백 (국어, 수학, 탐구)
+    # 아래 목록은 응답의 programs 순서와 같음
+    status: List[str]
+    gap: List[int]
+    user_percentile: List[float]
+
+class DiagnoseBatchRequest(BaseModel):
+    students: List[StudentScores]
+    programs: List[ProgramRef]
+
+class DiagnoseBatchResponse(BaseModel):
+    programs: List[DiagnosedProgram]
+    counts: List[Dict[str, int]]        # 모집단위별 구간 인원 수 (programs 순서)
+    students: List[StudentDiagnosis]
+    unmatched: List[ProgramRef] = []    # 찾지 못했거나 합격선 정보가 없는 모집단위
+
+class SessionTitleResponse(BaseModel):
+    sessionId: int
+    title: str
+    status: str     # pending(임시 제목, LLM 제목 생성 중) | ready
+
+# 한 번의 일괄 진단에서 허용하는 최대 (학생 수 x 모집단위 수)
+DIAGNOSE_BATCH_MAX_CELLS = int(os.environ.get("DIAGNOSE_BATCH_MAX_CELLS", 1_000_000))
+
+# 6. 요청 처리 단계별 헬퍼
+def find_targets(user_input):
+    """질문에 등장한 대학교(등장 순)와 별칭으로 인식된 학과 목록"""
+    matches = univ_matcher.match(user_input)
+    target_univs = list(dict.fromkeys(m.name for m in matches if m.kind == "univ"))
+    target_majors = list(dict.fromkeys(m.name for m in matches if m.kind == "major"))
+    return target_univs, target_majors
+
+def build_univ_diagnosis(target_univ, relevant_docs, p_kor, p_mat, p_inq):
+    """특정 대학 기준 합격 진단 보고서 생성"""
+    # 검색된 메타데이터에서 누백(target) 및 비중(weights) 추출 시도
+    target_per = 2.0  # 기본값
+    weights = {"국어": 0.3, "수학": 0.4, "탐구": 0.3} # 기본 비중
+
+    for d in relevant_docs:
+        if d.metadata.get('univ') == target_univ:
+            try:
+                t_raw = d.metadata.get('누백')
+                if t_raw and t_raw != "": target_per = float(t_raw)
+
+                w_kor = d.metadata.get('국어비중')
+                w_mat = d.metadata.get('수학비중')
+                w_inq = d.metadata.get('탐구비중')
+                if w_kor: weights["국어"] = float(w_kor)
+                if w_mat: weights["수학"] = float(w_mat)
+                if w_inq: weights["탐구"] = float(w_inq)
+                break
+            except: continue
+
+    # 가중치 적용 누백 재계산
+    user_total_percentile = (p_kor * weights["국어"] + p_mat * weights["수학"] + p_inq * weights["탐구"])
+    report = f"\n### [시스템 내부 성적 진단 보고서 - {target_univ} 기준]\n"
+    report += f"- **{target_univ} 맞춤형 누백**: 상위 {user_total_percentile:.2f}%\n"
+
+    status, gap = calculate_admission_status(user_total_percentile, target_per)
+    report += f"- **최종 합격 진단**: [{status}] (적정 합격선: 상위 {target_per}%)\n"
+    if gap > 0:
+        report += f"- **성적 향상 목표 (Gap Analysis)**: 수능 표준점수 총점 기준 약 {gap}점 추가 확보 필요\n"
+    else:
+        report += f"- **전문가 조언**: 현재 성적을 유지하신다면 {target_univ} 합격 가능성이 매우 높습니다.\n"
+    return report
+
+def build_recommendation_summary(p_kor, p_mat, p_inq, top_n=3):
+    """전체 모집단위 대상 구간별 추천 후보 요약 (컨텍스트용)"""
+    if not len(program_table):
+        return ""
+    bands, counts = program_table.recommend(p_kor, p_mat, p_inq, top_n=top_n)
+    lines = []
+    for status in ["안정", "적정", "소신"]:
+        picks = ", ".join(f"{c['univ']} {c['major']}(합격선 {c['cutoff']}%)" for c in bands[status])
+        lines.append(f"- **{status} 후보** ({counts[status]}개 중 상위 {len(bands[status])}개): {picks or '없음'}\n")
+    return "".join(lines)
+
+def build_analysis_context(user_scores, target_univs, relevant_docs):
+    """사용자 성적 기반 진단 보고서(컨텍스트) 생성"""
+    if not user_scores:
+        return ""
+
+    # 과목별 누백 계산 (사탐/과탐은 평균)
+    p_kor, p_mat, p_inq = subject_percentiles(user_scores)
+
+    if target_univs:
+        # 대학 탐지 시 대학별 합격 진단 (여러 대학을 함께 물으면 모두 진단)
+        analysis_context = "".join(
+            build_univ_diagnosis(u, relevant_docs, p_kor, p_mat, p_inq) for u in target_univs
+        )
+    else:
+        # 사용자 일반 누백 (가중치 미적용 평균)
+        user_total_percentile = (p_kor * 0.3 + p_mat * 0.4 + p_inq * 0.3)
+        analysis_context = f"\n### [시스템 내부 성적 진단 보고서]\n"
+        analysis_context += f"- **사용자 추정 누적 백분위**: 상위 {user_total_percentile:.2f}%\n"
+        # 특정 대학이 없으면 전체 모집단위 대상 지원 가능 후보를 함께 제공
+        analysis_context += build_recommendation_summary(p_kor, p_mat, p_inq)
+
+    analysis_context += "--------------------------------------------------\n"
+    return analysis_context
+
+def build_history_messages(history):
+    """클라이언트가 보낸 대화 기록을 LangChain 메시지로 변환"""
+    history_messages = []
+    for msg in history:
+        if msg.get("role") == "user":
+            history_messages.append(HumanMessage(content=msg.get("content", "")))
+        elif msg.get("role") == "assistant":
+            history_messages.append(AIMessage(content=msg.get("content", "")))
+    return history_messages
+
+def extract_text(content):
+    """답변 파싱 (리스트 형태 대응)"""
+    if isinstance(content, list):
+        return "".join([part.get("text", "") if isinstance(part, dict) else str(part) for part in content])
+    return str(content)
+
+def record_llm_usage(call, message):
+    """LLM 응답의 토큰 사용량(usage_metadata)을 지표에 반영"""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), call=call, direction="in")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), call=call, direction="out")
+
+async def generate_answer(messages):
+    with span("answer_llm"):
+        response = await llm_gateway.ainvoke(llm, messages, lane="answer")
+    record_llm_usage("answer", response)
+    return extract_text(response.content)
+
+async def complete_title(prompt):
+    """제목 생성 LLM 호출 (TitleBatcher가 1건 또는 여러 건을 묶은 프롬프트로 호출)"""
+    with span("title_llm"):
+        response = await llm_gateway.ainvoke(llm, prompt, lane="title")
+    record_llm_usage("title", response)
+    return extract_text(response.content)
+
+# 대화 제목 생성 (요청이 몰리면 여러 세션의 제목을 한 번의 LLM 호출로 묶음)
+title_batcher = TitleBatcher(complete_title, max_batch=int(os.environ.get("TITLE_BATCH_MAX", 16)))
+
+async def finish_title(session_token, user_input, placeholder):
+    """LLM 제목 생성 후 세션에 저장 (백그라운드 실행, 실패 시 임시 제목을 최종 제목으로 사용)"""
+    try:
+        title = await title_batcher.generate(user_input) or placeholder
+    except Exception as e:
+        if is_rate_limit_error(e):
+            LLM_RATE_LIMITED.inc(call="title")
+        print(f"⚠️ 제목 생성 실패 (임시 제목 유지): {e}")
+        title = placeholder
+    if session_token is not None:
+        await asyncio.get_running_loop().run_in_executor(None, session_store.set_title, session_token, title)
+    return title
+
+async def start_title(request, user_input, prepared):
+    """
+    첫 대화 제목: 질문에서 찾은 대학/학과로 만든 임시 제목을 바로 반환하고,
+    LLM 제목은 답변 생성과 동시에 백그라운드에서 생성 (세션이 있으면 저장 -> GET /sessions/{sessionId}/title)
+    반환: (임시 제목, 제목 생성 작업 - 결과는 최종 제목이며 실패 시 임시 제목)
+    """
+    placeholder = heuristic_title(user_input, prepared.target_univs, prepared.target_majors,
+                                  has_scores=bool(request.userScores))
+    session_token = prepared.session_token
+    if session_token is not None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, session_store.set_title, session_token, placeholder, False
+        )
+    return placeholder, run_in_background(finish_title(session_token, user_input, placeholder))
+
+def build_summary_prompt(summary, messages):
+    transcript = "\n".join(
+        f"{'학생' if m['role'] == 'user' else '상담사'}: {m['content']}" for m in messages
+    )
+    return (
+        "당신은 입시 상담 기록 정리 담당자입니다. 아래 [이전 요약]과 [추가 대화]를 합쳐 하나의 요약으로 갱신하세요.\n"
+        f"학생의 성적/희망 대학·학과, 이미 안내한 진단 결과와 조언 위주로 {SESSION_SUMMARY_MAX_CHARS}자 이내의 문장으로 작성하세요.\n\n"
+        f"[이전 요약]\n{summary or '없음'}\n\n"
+        f"[추가 대화]\n{transcript}\n\n"
+        "요약:"
+    )
+
+async def summarize_session(session_token):
+    """요약 대기 중인 대화를 세션 요약에 합침 (백그라운드 실행)"""
+    loop = asyncio.get_running_loop()
+    try:
+        summary, pending = await loop.run_in_executor(None, session_store.pending, session_token)
+        if not pending:
+            return
+        with span("summary_llm"):
+            response = await llm_gateway.ainvoke(llm, build_summary_prompt(summary, pending), lane="summary")
+        record_llm_usage("summary", response)
+        new_summary = extract_text(response.content).strip()[:SESSION_SUMMARY_MAX_CHARS]
+        await loop.run_in_executor(None, session_store.apply_summary, session_token, new_summary, pending)
+    except Exception as e:
+        if is_rate_limit_error(e):
+            LLM_RATE_LIMITED.inc(call="summary")
+        print(f"⚠️ 세션 대화 요약 실패 (다음 턴에 다시 시도): {e}")
+    finally:
+        summarizing_sessions.discard(session_token)
+
+def run_in_background(coro):
+    """
+    응답과 별개로 실행하는 작업 (제목/요약 생성, manifest 감시)
+    요청의 contextvars(trace)를 물려받지 않도록 빈 컨텍스트에서 시작하므로, 이미 기록된 요청 trace에
+    배경 작업의 단계 시간이 덧붙지 않습니다 (배경 작업 시간은 /metrics 히스토그램에만 남음).
+    """
+    task = asyncio.create_task(coro, context=contextvars.Context())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def load_history(request):
+    """
+    대화 기록 결정: 서버 세션(요약 + 최근 메시지)이 있으면 그것을, 없으면 클라이언트가 보낸 history를 사용
+    서버 세션은 sessionId와 함께 보낸 sessionToken이 서버가 그 sessionId에 발급한 토큰일 때만 이어지고,
+    아니면 새 토큰을 발급합니다. 클라이언트 history가 저장된 기록과 어긋나면 클라이언트 기록으로 다시 맞춥니다.
+    반환: (요약 문자열, 메시지 목록, 세션 토큰 또는 None)
+    """
+    if session_store is None or request.sessionId is None:
+        return "", request.history, None
+    loop = asyncio.get_running_loop()
+    token = await loop.run_in_executor(None, session_store.open, request.sessionToken, request.sessionId)
+    loaded = await loop.run_in_executor(None, session_store.load, token, request.history)
+    if loaded:
+        return (*loaded, token)
+    return "", request.history, token
+
+async def remember_turn(request, session_token, user_input, answer):
+    """세션에 이번 턴을 기록하고, 창 밖으로 밀려난 대화가 있으면 백그라운드 요약 예약"""
+    if session_token is None:
+        return
+    needs_summary = await asyncio.get_running_loop().run_in_executor(
+        None, session_store.record, session_token, user_input, answer.strip(), request.history
+    )
+    if needs_summary and session_token not in summarizing_sessions:
+        summarizing_sessions.add(session_token)
+        run_in_background(summarize_session(session_token))
+
+def raise_llm_error(e):
+    """LLM/검색 단계 예외를 HTTP 오류로 변환"""
+    err_msg = str(e)
+    if isinstance(e, GatewayRejected):
+        # 관문에서 바로 거절 (회로 차단 429 / 과부하 503): LLM을 호출하지 않았으므로 빠르게 응답
+        raise HTTPException(status_code=e.status_code, detail=err_msg,
+                            headers={"Retry-After": str(e.retry_after)})
+    if is_rate_limit_error(e):
+        LLM_RATE_LIMITED.inc(call="answer")
+        raise HTTPException(status_code=429, detail="API 호출 한도가 초과되었습니다. 잠시 후 다시 시도해주세요.",
+                            headers={"Retry-After": str(int(llm_gateway.breaker.retry_after()) or 5)})
+    raise HTTPException(status_code=500, detail=f"서버 오류 발생: {err_msg}")
+
+@dataclass
+class PreparedChat:
+    """검색/프롬프트 구성이 끝난 요청 상태"""
+    target_univs: List[str]
+    target_majors: List[str]      # 질문에서 찾은 학과 (별칭은 정식 명칭으로)
+    found_majors: List[str]
+    messages: list
+    cache_key: str
+    query_vector: Optional[list]  # 인덱스로 바로 조회한 경우 None
+    is_first_turn: bool           # 이전 대화(서버 세션 또는 클라이언트 history)가 없는 첫 질문
+    session_token: Optional[str] = None  # 서버 측 대화 기록을 쓰는 경우 세션 토큰
+
+async def prepare_chat(request, user_input):
+    """검색 및 프롬프트 구성 단계 (일반/스트리밍 엔드포인트 공용)"""
+    # [지능형 검색] 대학교/학과 이름 찾기 (Aho-Corasick 1회 스캔)
+    with span("match"):
+        target_univs, target_majors = find_targets(user_input)
+    search_kwargs = {"k": 30}
+    if len(target_univs) == 1:
+        search_kwargs["filter"] = {"univ": target_univs[0]}
+        search_kwargs["k"] = 100
+    elif target_univs:
+        search_kwargs["filter"] = {"univ": {"$in": target_univs}}
+        search_kwargs["k"] = 100 * len(target_univs)
+
+    # 별칭으로 인식된 학과는 정식 명칭을 검색어에 덧붙임 (예: '의대' -> '의예과')
+    search_query = " ".join([user_input] + [m for m in target_majors if m not in user_input])
+
+    # 대학이 특정되면 인덱스에서 해당 대학 문서를 학과 이름 일치 순으로 바로 읽음 (임베딩 호출 없음)
+    loop = asyncio.get_running_loop()
+    query_vector = None
+    relevant_docs = None
+    lexical_ids = []
+    retrieval_path = "vector"
+    if target_univs:
+        with span("direct_lookup"):
+            relevant_docs = await loop.run_in_executor(
+                None, direct_retriever.retrieve, target_univs, search_query, target_majors
+            )
+        retrieval_path = "direct" if relevant_docs is not None else "vector"
+    else:
+        # 대학이 없는 질문: BM25 어휘 색인에서 먼저 찾고, 학과 이름이 확실히 맞으면 벡터 검색 생략
+        with span("lexical"):
+            lexical_ids, confident = direct_retriever.lexical_search(search_query, target_majors, k=search_kwargs["k"])
+        if confident:
+            with span("lexical_fetch"):
+                relevant_docs = await loop.run_in_executor(None, direct_retriever.get_documents, lexical_ids)
+            retrieval_path = "lexical"
+    if relevant_docs is None:
+        # 열린 질문: 질문 임베딩(캐시)을 한 번 구해 검색과 응답 캐시 조회에 함께 사용
+        with span("embed"):
+            query_vector = await embeddings.aembed_query(search_query)
+        with span("vector_search"):
+            relevant_docs = await vectorstore.asimilarity_search_by_vector(query_vector, **search_kwargs)
+        if lexical_ids:
+            # 벡터 검색과 어휘 검색 순위를 RRF로 합침 (정확한 학과 이름 일치가 밀리지 않도록)
+            with span("fusion"):
+                relevant_docs = await loop.run_in_executor(
+                    None, direct_retriever.fuse, relevant_docs, lexical_ids, search_kwargs["k"]
+                )
+            retrieval_path = "hybrid"
+    found_majors = sorted(list(set([d.metadata.get('major') for d in relevant_docs])))
+    RETRIEVED_DOCS.observe(len(relevant_docs), path=retrieval_path)
+
+    # [추가] 성적 분석 컨텍스트 생성
+    with span("analysis"):
+        analysis_context = build_analysis_context(request.userScores, target_univs, relevant_docs)
+
+    # 컨텍스트 구성 (중복 제거 + 관련도 순 + 토큰 예산 안의 압축 표)
+    with span("context"):
+        docs_context, context_stats = context_builder.build(relevant_docs, search_query, target_majors)
+    CONTEXT_TOKENS.observe(context_stats["tokens"])
+    annotate(retrieval=retrieval_path, docs=len(relevant_docs), context_rows=context_stats["rows"],
+             context_tokens=context_stats["tokens"], context_tokens_saved=context_stats["saved_tokens"])
+    context_text = analysis_context + "\n\n" + docs_context
+
+    # 대화 기록: 서버 세션이면 최근 메시지만 보내고 그 이전 대화는 요약으로 대신함
+    with span("history"):
+        summary, history, session_token = await load_history(request)
+    if summary:
+        context_text = f"### [이전 대화 요약]\n{summary}\n\n" + context_text
+
+    messages = prompt_template.format_messages(
+        context=context_text,
+        input=user_input,
+        history=build_history_messages(history)
+    )
+    cache_key = ResponseCache.context_key(
+        target_univs,
+        docs_fingerprint(relevant_docs),
+        scores_fingerprint(request.userScores, RESPONSE_CACHE_SCORE_BUCKET),
+        history_digest(history + ([{"role": "summary", "content": summary}] if summary else [])),
+    )
+    return PreparedChat(target_univs, target_majors, found_majors[:15], messages, cache_key, query_vector,
+                        is_first_turn=not history and not summary, session_token=session_token)
+
+def sse_event(event, data):
+    """Server-Sent Events 형식의 메시지 한 건 생성"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# 7. API 엔드포인트 구현
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     user_input = request.query.strip()
     if not user_input:
         raise HTTPException(status_code=400, detail="질문 내용을 입력해주세요.")
 
+    await ensure_ready()
     try:
-        # [지능형 검색] 대학교 이름 찾기
-        matches = []
-        for u in univ_list:
-            u_short = u.replace("대학교", "")
-            if u in user_input: matches.append((u, len(u)))
-            elif len(u_short) >= 2 and u_short in user_input: matches.append((u, len(u_short)))
-        
-        search_kwargs = {"k": 30}
-        target_univ = None
-        if matches:
-            matches.sort(key=lambda x: x[1], reverse=True)
-            target_univ = matches[0][0]
-            search_kwargs["filter"] = {"univ": target_univ}
-            search_kwargs["k"] = 100
-
-        # 검색 실행
-        relevant_docs = vectorstore.similarity_search(user_input, **search_kwargs)
-        found_majors = sorted(list(set([d.metadata.get('major') for d in relevant_docs])))
-        
-        # [추가] 성적 분석 컨텍스트 생성
-        analysis_context = ""
-        user_total_percentile = None
-        
-        # 디버깅: 받은 성적 데이터 확인
-        print(f"DEBUG: Received userScores count: {len(request.userScores) if request.userScores else 0}")
-        
-        if request.userScores:
-            # 과목별 누백 계산
-            scores = {s.subjectName: s.score for s in request.userScores}
-            p_kor = get_percentile("국어", scores.get("국어", 0))
-            p_mat = get_percentile("수학", scores.get("수학", 0))
-            # 사탐/과탐 평균 계산
-            inquiry_scores = [s.score for s in request.userScores if s.category in ["사탐", "과탐"]]
-            p_inq = sum([get_percentile("탐구", s) for s in inquiry_scores]) / len(inquiry_scores) if inquiry_scores else 50.0
-            
-            # 대학교 가중치 적용 (데이터 기반 시뮬레이션)
-            # 검색된 문서들(relevant_docs) 중 첫 번째 문서의 가중치를 샘플로 사용하거나 고정값 적용
-            # 여기서는 분석 로직을 보여주기 위해 context에 분석 결과를 추가함
-            
-            # 사용자 일반 누백 (가중치 미적용 평균)
-            user_total_percentile = (p_kor * 0.3 + p_mat * 0.4 + p_inq * 0.3)
-            analysis_context = f"\n### [시스템 내부 성적 진단 보고서]\n"
-            analysis_context += f"- **사용자 추정 누적 백분위**: 상위 {user_total_percentile:.2f}%\n"
-            
-            # 대학 탐지 시 합격 진단 추가
-            if target_univ:
-                # 검색된 메타데이터에서 누백(target) 및 비중(weights) 추출 시도
-                target_per = 2.0  # 기본값
-                weights = {"국어": 0.3, "수학": 0.4, "탐구": 0.3} # 기본 비중
-                
-                for d in relevant_docs:
-                    if d.metadata.get('univ') == target_univ:
-                        try:
-                            t_raw = d.metadata.get('누백')
-                            if t_raw and t_raw != "": target_per = float(t_raw)
-                            
-                            w_kor = d.metadata.get('국어비중')
-                            w_mat = d.metadata.get('수학비중')
-                            w_inq = d.metadata.get('탐구비중')
-                            if w_kor: weights["국어"] = float(w_kor)
-                            if w_mat: weights["수학"] = float(w_mat)
-                            if w_inq: weights["탐구"] = float(w_inq)
-                            break
-                        except: continue
-                
-                # 가중치 적용 누백 재계산
-                user_total_percentile = (p_kor * weights["국어"] + p_mat * weights["수학"] + p_inq * weights["탐구"])
-                analysis_context = f"\n### [시스템 내부 성적 진단 보고서 - {target_univ} 기준]\n"
-                analysis_context += f"- **{target_univ} 맞춤형 누백**: 상위 {user_total_percentile:.2f}%\n"
-                
-                status, gap = calculate_admission_status(user_total_percentile, target_per)
-                analysis_context += f"- **최종 합격 진단**: [{status}] (적정 합격선: 상위 {target_per}%)\n"
-                if gap > 0:
-                    analysis_context += f"- **성적 향상 목표 (Gap Analysis)**: 수능 표준점수 총점 기준 약 {gap}점 추가 확보 필요\n"
-                else:
-                    analysis_context += f"- **전문가 조언**: 현재 성적을 유지하신다면 {target_univ} 합격 가능성이 매우 높습니다.\n"
-            
-            analysis_context += "--------------------------------------------------\n"
-
-        # 컨텍스트 구성
-        context_text = analysis_context + "\n\n" + "\n\n".join([d.page_content for d in relevant_docs])
-        
-        # 히스토리 구성
-        history_messages = []
-        for msg in request.history:
-            if msg.get("role") == "user":
-                history_messages.append(HumanMessage(content=msg.get("content", "")))
-            elif msg.get("role") == "assistant":
-                history_messages.append(AIMessage(content=msg.get("content", "")))
-        
-        # AI 답변 생성
-        messages = prompt_template.format_messages(
-            context=context_text, 
-            input=user_input,
-            history=history_messages
-        )
-        response = llm.invoke(messages)
-        
-        # 답변 파싱 (리스트 형태 대응)
-        if isinstance(response.content, list):
-            final_answer = "".join([part.get("text", "") if isinstance(part, dict) else str(part) for part in response.content])
-        else:
-            final_answer = str(response.content)
+        prepared = await prepare_chat(request, user_input)
+        is_first_turn = prepared.is_first_turn
 
-        # [추가] 제목 자동 생성 로직 (첫 대화일 경우에만)
-        new_title = None
-        if not request.history and not any(msg for msg in history_messages):
-            try:
-                title_prompt = (
-                    "당신은 대화 제목 요약 전문가입니다. 아래 사용자의 질문을 분석하여 15자 내외의 명사형 제목으로 요약하세요.\n"
-                    "예: '서울대 경영학과 합격선 알려줘' -> '서울대 경영학과 입시 문의'\n"
-                    "예: '내 성적으로 어디 갈 수 있어?' -> '사용자 맞춤 성적 진단'\n\n"
-                    f"질문: {user_input}\n"
-                    "제목:"
-                )
-                title_response = llm.invoke(title_prompt)
-                new_title = str(title_response.content).strip().replace('"', '').replace("'", "")
-            except Exception as e:
-                print(f"DEBUG: Title generation failed: {e}")
-                new_title = user_input[:15] + "..." if len(user_input) > 15 else user_input
+        # 첫 대화 제목은 답변과 동시에 생성. 세션이 있으면 임시 제목을 바로 돌려주고(LLM 제목은 세션 조회로),
+        # 저장할 세션이 없으면 답변이 끝난 뒤 LLM 제목을 기다려 함께 반환
+        new_title, title_task = await start_title(request, user_input, prepared) if is_first_turn else (None, None)
 
+        # 응답 캐시 확인 (적중 시 Gemini 호출 생략)
+        cached = response_cache.get(user_input, prepared.cache_key, prepared.query_vector)
+        if cached:
+            final_answer = cached["answer"]
+        else:
+            final_answer = await generate_answer(prepared.messages)
+            response_cache.put(user_input, prepared.cache_key, {"answer": final_answer}, prepared.query_vector)
+
+        await remember_turn(request, prepared.session_token, user_input, final_answer)
+        if title_task is not None and prepared.session_token is None:
+            new_title = await title_task
         return ChatResponse(
             answer=final_answer.strip(),
-            detected_univ=target_univ,
-            found_majors=found_majors[:15],
-            title=new_title # 제목 반환
+            detected_univ=prepared.target_univs[0] if prepared.target_univs else None,
+            detected_univs=prepared.target_univs,
+            found_majors=prepared.found_majors,
+            title=new_title, # 제목 반환
+            sessionToken=prepared.session_token,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        err_msg = str(e)
-        if "429" in err_msg or "RESOURCE_EXHAUSTED" in err_msg.upper():
-            raise HTTPException(status_code=429, detail="API 호출 한도가 초과되었습니다. 잠시 후 다시 시도해주세요.")
-        raise HTTPException(status_code=500, detail=f"서버 오류 발생: {err_msg}")
+        raise_llm_error(e)
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    스트리밍 버전의 /chat (Server-Sent Events)
+    이벤트 순서: meta(검색 결과) -> title(첫 대화만, 임시 제목) -> token(답변 조각, 반복)
+               -> title(LLM 제목, 답변이 끝날 때까지 생성되었으면) -> done
+    title 이벤트의 final이 False면 임시 제목입니다. 최종 제목은 /sessions/{sessionId}/title로도 조회할 수 있습니다.
+    (meta 이벤트의 sessionToken을 X-Session-Token 헤더로 보내야 함)
+    오류 발생 시 error 이벤트({"status", "detail"})를 보내고 스트림을 종료합니다.
+    """
+    user_input = request.query.strip()
+    if not user_input:
+        raise HTTPException(status_code=400, detail="질문 내용을 입력해주세요.")
+
+    await ensure_ready()
+
+    async def event_stream():
+        title_task = None
+        try:
+            prepared = await prepare_chat(request, user_input)
+            is_first_turn = prepared.is_first_turn
+            yield sse_event("meta", {
+                "detected_univ": prepared.target_univs[0] if prepared.target_univs else None,
+                "detected_univs": prepared.target_univs,
+                "found_majors": prepared.found_majors,
+                "sessionToken": prepared.session_token,
+            })
+
+            # 첫 대화는 임시 제목을 먼저 보내고, LLM 제목은 답변 스트리밍과 동시에 백그라운드에서 생성
+            if is_first_turn:
+                placeholder, title_task = await start_title(request, user_input, prepared)
+                yield sse_event("title", {"title": placeholder, "final": False})
+
+            # 응답 캐시 적중 시 저장된 답변을 한 번에 전송
+            cached = response_cache.get(user_input, prepared.cache_key, prepared.query_vector)
+            if cached:
+                yield sse_event("token", {"text": cached["answer"]})
+                await remember_turn(request, prepared.session_token, user_input, cached["answer"])
+                yield sse_event("done", {"cached": True})
+                return
+
+            answer_parts = []
+            usage_chunk = None
+            with span("answer_llm"):
+                started = time.perf_counter()
+                # 스트리밍이 끝날 때까지 관문 슬롯을 점유
+                async with llm_gateway.aslot("answer"):
+                    async for chunk in llm.astream(prepared.messages):
+                        if chunk.usage_metadata:
+                            usage_chunk = chunk
+                        text = extract_text(chunk.content)
+                        if text:
+                            if not answer_parts:
+                                STAGE_SECONDS.observe(time.perf_counter() - started, stage="first_token")
+                                annotate(first_token_ms=round((time.perf_counter() - started) * 1000, 2))
+                            answer_parts.append(text)
+                            yield sse_event("token", {"text": text})
+            record_llm_usage("answer", usage_chunk)
+
+            entry = {"answer": "".join(answer_parts)}
+            if title_task:
+                # 답변이 끝난 뒤 잠시만 기다림 (그래도 안 끝나면 세션 조회로 받도록 함)
+                await asyncio.wait([title_task], timeout=TITLE_STREAM_WAIT)
+                if title_task.done() and not title_task.cancelled():
+                    yield sse_event("title", {"title": title_task.result(), "final": True})
+            response_cache.put(user_input, prepared.cache_key, entry, prepared.query_vector)
+            await remember_turn(request, prepared.session_token, user_input, entry["answer"])
+            yield sse_event("done", {})
+
+        except Exception as e:
+            try:
+                raise_llm_error(e)
+            except HTTPException as http_err:
+                error = {"status": http_err.status_code, "detail": http_err.detail}
+                if http_err.headers and "Retry-After" in http_err.headers:
+                    error["retry_after"] = int(http_err.headers["Retry-After"])
+                yield sse_event("error", error)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/recommend", response_model=RecommendResponse)
+async def recommend_endpoint(request: RecommendRequest):
+    """내 성적으로 갈 수 있는 모집단위: 전체 모집단위를 한 번에 판정해 안정/적정/소신/불가 구간별 후보 반환"""
+    if not request.userScores:
+        raise HTTPException(status_code=400, detail="성적 정보(userScores)를 입력해주세요.")
+    if not len(program_table):
+        await ensure_ready()  # programs.npz가 없는 DB는 초기화 시 테이블을 만듦
+    p_kor, p_mat, p_inq = subject_percentiles(request.userScores)
+    bands, counts = program_table.recommend(
+        p_kor, p_mat, p_inq, top_n=max(1, request.top_n),
+        sheet=request.sheet, univ=request.univ, region=request.region,
+    )
+    return RecommendResponse(evaluated=sum(counts.values()), counts=counts, bands=bands)
+
+@app.post("/diagnose/batch", response_model=DiagnoseBatchResponse)
+async def diagnose_batch_endpoint(request: DiagnoseBatchRequest):
+    """학급 단위 일괄 진단: 학생 여러 명 x 모집단위 여러 개를 한 번의 벡터 연산으로 판정"""
+    if not request.students or not request.programs:
+        raise HTTPException(status_code=400, detail="학생(students)과 모집단위(programs)를 1개 이상 입력해주세요.")
+
+    if not len(program_table):
+        await ensure_ready()
+
+    # 요청한 모집단위 -> 테이블 행 번호 (합격선 정보가 없는 행은 제외)
+    rows, unmatched = [], []
+    for ref in request.programs:
+        found = program_table.find(ref.univ, major=ref.major, sheet=ref.sheet)
+        found = found[~np.isnan(program_table.cutoff[found])]
+        if len(found):
+            rows.append(found)
+        else:
+            unmatched.append(ref)
+    rows = np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int32)
+
+    if len(request.students) * len(rows) > DIAGNOSE_BATCH_MAX_CELLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"한 번에 진단할 수 있는 (학생 수 x 모집단위 수)는 최대 {DIAGNOSE_BATCH_MAX_CELLS}개입니다.",
+        )
+
+    p_kor, p_mat, p_inq = batch_subject_percentiles([s.userScores for s in request.students])
+    user_pct, band, gap = program_table.diagnose(rows, p_kor, p_mat, p_inq)
+
+    band_names = np.asarray(STATUS_BANDS)[band]
+    user_pct = np.round(user_pct, 2)
+    students = [
+        StudentDiagnosis(
+            studentId=student.studentId,
+            percentiles={"국어": round(float(p_kor[i]), 2), "수학": round(float(p_mat[i]), 2),
+                         "탐구": round(float(p_inq[i]), 2)},
+            status=band_names[i].tolist(),
+            gap=gap[i].tolist(),
+            user_percentile=user_pct[i].tolist(),
+        )
+        for i, student in enumerate(request.students)
+    ]
+    programs = [
+        DiagnosedProgram(univ=str(program_table.univ[r]), major=str(program_table.major[r]),
+                         sheet=str(program_table.sheet[r]), cutoff=float(program_table.cutoff[r]))
+        for r in rows
+    ]
+    # 모집단위별 구간 인원 수
+    per_band = np.stack([np.count_nonzero(band == b, axis=0) for b in range(len(STATUS_BANDS))], axis=1)
+    counts = [dict(zip(STATUS_BANDS, map(int, c))) for c in per_band]
+    return DiagnoseBatchResponse(programs=programs, counts=counts, students=students, unmatched=unmatched)
+
+@app.get("/sessions/{sessionId}/title", response_model=SessionTitleResponse)
+async def session_title_endpoint(sessionId: int, x_session_token: Optional[str] = Header(None)):
+    """대화 제목 조회 (첫 대화 직후에는 임시 제목이 pending으로, LLM 제목이 생성되면 ready로 반환)"""
+    if session_store is None:
+        raise HTTPException(status_code=404, detail="서버 측 세션 저장소가 꺼져 있습니다. (SESSION_STORE=none)")
+    # 토큰 없이 sessionId만으로는 조회할 수 없음 (토큰이 없거나 다른 sessionId의 토큰이어도 같은 404로 응답)
+    found = None
+    if x_session_token:
+        found = await asyncio.get_running_loop().run_in_executor(
+            None, session_store.title, x_session_token, sessionId
+        )
+    if found is None:
+        raise HTTPException(status_code=404, detail="해당 세션의 대화 제목이 없습니다.")
+    title, final = found
+    return SessionTitleResponse(sessionId=sessionId, title=title, status="ready" if final else "pending")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "university_count": len(univ_list)}
+    """상태 확인 (status: starting -> ok, 초기화 실패 시 error와 503 - 플랫폼이 컨테이너를 재시작하도록)"""
+    body = {
+        "status": readiness["status"],
+        "ready": readiness["status"] == "ok",
+        "startup_seconds": readiness["seconds"],
+        "error": readiness["error"],
+        "db_version": manifest.get("version") if manifest else None,
+        "index": manifest.get("index") if manifest else None,
+        "pid": os.getpid(),
+        "university_count": len(univ_list),
+        "program_count": len(program_table),
+        "embedding_cache": embeddings.stats() if embeddings else None,
+        "embedding_batch": embeddings.base.stats() if embeddings else None,
+        "response_cache": response_cache.stats(),
+        "sessions": session_store.stats() if session_store else None,
+        "llm_gateway": llm_gateway.stats(),
+        "titles": title_batcher.stats,
+    }
+    return JSONResponse(body, status_code=503 if readiness["status"] == "error" else 200)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus 형식 지표 (단계별 지연 시간, 검색 문서 수, 컨텍스트 크기, LLM 토큰, 429, 캐시 적중)"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
     # Hugging Face는 기본적으로 7860 포트를 사용합니다.
     port = int(os.environ.get("PORT", 7860))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # 워커 수 (WEB_CONCURRENCY): 2 이상이면 프로세스마다 앱을 불러오며, 읽기 전용 산출물은 메모리 매핑으로 공유
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        if session_store is not None and os.environ.get("SESSION_STORE", "memory") == "memory":
+            print("⚠️ 여러 워커에서는 대화 기록이 워커마다 따로 저장됩니다. SESSION_STORE=sqlite를 권장합니다.")
+        uvicorn.run("server:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
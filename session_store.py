@@ -0,0 +1,276 @@
+import os
+import json
+import random
+import secrets
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# 서버가 발급하는 세션 토큰 길이(바이트) - 세션 저장소의 키이므로 추측할 수 없어야 함
+SESSION_TOKEN_BYTES = 24
+
+
+def new_session():
+    """
+    세션 상태
+    - turns: 최근 대화 (role/content, 최대 window개)
+    - pending: window에서 밀려나 아직 요약에 반영되지 않은 대화
+    - summary: 그보다 오래된 대화의 요약
+    - title: 대화 제목 (title_final이 False면 LLM 제목을 생성하는 동안 쓰는 임시 제목)
+    - owner: 토큰을 발급받은 클라이언트의 sessionId
+    """
+    return {"turns": [], "pending": [], "summary": "", "title": "", "title_final": False,
+            "turn_count": 0, "owner": None, "updated": time.time()}
+
+
+def _chat_messages(messages):
+    return [(m.get("role"), str(m.get("content", "")).strip())
+            for m in messages if m.get("role") in ("user", "assistant")]
+
+
+def history_matches(turns, client_history):
+    """저장된 최근 메시지와 클라이언트가 보낸 history의 끝부분이 같은지 (길이가 짧은 쪽만큼 비교)"""
+    stored, sent = _chat_messages(turns), _chat_messages(client_history)
+    k = min(len(stored), len(sent))
+    return k == 0 or stored[-k:] == sent[-k:]
+
+
+class MemorySessionBackend:
+    """프로세스 내 LRU 세션 저장소 (TTL 적용, 워커 1개일 때)"""
+
+    def __init__(self, max_sessions=10000, ttl=86400):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return None
+            if time.time() - state["updated"] > self.ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return json.loads(json.dumps(state))
+
+    def update(self, session_id, fn):
+        """상태를 읽어 fn(state)로 고친 뒤 저장 (읽기-수정-쓰기를 한 번에)"""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None or time.time() - state["updated"] > self.ttl:
+                state = new_session()
+            fn(state)
+            state["updated"] = time.time()
+            self._sessions[session_id] = state
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return json.loads(json.dumps(state))
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SqliteSessionBackend:
+    """SQLite 세션 저장소 (여러 워커 프로세스가 같은 파일을 공유)"""
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # 연결은 스레드마다 하나씩 (sqlite3 연결은 스레드 간 공유하지 않음)
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.db = db
+        return db
+
+    def get(self, session_id):
+        row = self._connect().execute(
+            "SELECT state, updated FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def update(self, session_id, fn):
+        """상태를 읽어 fn(state)로 고친 뒤 저장 (BEGIN IMMEDIATE로 다른 워커와 충돌 방지)"""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT state, updated FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            state = json.loads(row[0]) if row and time.time() - row[1] <= self.ttl else new_session()
+            fn(state)
+            state["updated"] = time.time()
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, updated) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state, ensure_ascii=False), state["updated"]),
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        # 가끔(약 1%) 만료된 세션 정리
+        if random.random() < 0.01:
+            db.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl,))
+        return state
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionStore:
+    """
+    서버 측 대화 기록 (서버가 발급한 세션 토큰 기준)
+    최근 window개 메시지만 그대로 보관하고, 밀려난 메시지는 pending에 모았다가
+    백그라운드 요약(summarize)에서 summary에 합칩니다. 대화가 길어져도 요청마다 보내는 기록 크기는 일정합니다.
+    클라이언트의 sessionId는 추측할 수 있으므로 키로 쓰지 않고, 토큰을 발급받은 sessionId(owner)로만 기록합니다.
+    """
+
+    def __init__(self, backend, window=8, max_pending=16):
+        self.backend = backend
+        self.window = window
+        self.max_pending = max_pending
+        self._stats = {"hits": 0, "misses": 0, "resyncs": 0, "summaries": 0}
+        # 저장소 호출은 실행기 스레드에서 동시에 일어나므로 통계 갱신은 잠금 안에서
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        환경변수 기반 생성
+        SESSION_STORE: memory(기본) | sqlite | none, SESSION_DB_PATH, SESSION_TTL, SESSION_MAX, SESSION_WINDOW
+        """
+        kind = os.environ.get("SESSION_STORE", "memory").strip().lower()
+        ttl = float(os.environ.get("SESSION_TTL", 86400))
+        if kind == "none":
+            return None
+        if kind == "sqlite":
+            backend = SqliteSessionBackend(os.environ.get("SESSION_DB_PATH", "./sessions.sqlite3"), ttl=ttl)
+        else:
+            backend = MemorySessionBackend(max_sessions=int(os.environ.get("SESSION_MAX", 10000)), ttl=ttl)
+        return cls(backend, window=int(os.environ.get("SESSION_WINDOW", 8)))
+
+    def open(self, token, owner):
+        """
+        요청의 세션 토큰 확인: 서버가 발급했고 같은 sessionId(owner)의 세션이면 그 토큰을,
+        아니면(없음/만료/다른 sessionId) 새 토큰을 발급해 반환
+        """
+        if token:
+            state = self.backend.get(str(token))
+            if state is not None and state.get("owner") == str(owner):
+                return token
+        token = secrets.token_urlsafe(SESSION_TOKEN_BYTES)
+        self.backend.update(token, lambda state: state.update(owner=str(owner)))
+        return token
+
+    def load(self, token, client_history=None):
+        """
+        (요약, 최근 메시지 목록) - 세션이 없으면 None
+        클라이언트가 보낸 history의 끝부분이 저장된 최근 메시지와 다르면(다른 기기, 답변 재생성 등)
+        저장된 대화를 비우고 None을 반환해 클라이언트 기록으로 다시 시작합니다.
+        """
+        state = self.backend.get(str(token))
+        if state is None or not (state["turns"] or state["summary"]):
+            self._count("misses")
+            return None
+        if client_history and not history_matches(state["turns"], client_history):
+            self.reset(token)
+            self._count("resyncs")
+            return None
+        self._count("hits")
+        return state["summary"], state["turns"]
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def reset(self, token):
+        """대화 기록만 비움 (제목/owner는 유지)"""
+        def apply(state):
+            state.update(turns=[], pending=[], summary="", turn_count=0)
+
+        self.backend.update(str(token), apply)
+
+    def _trim(self, state):
+        overflow = len(state["turns"]) - self.window
+        if overflow > 0:
+            state["pending"].extend(state["turns"][:overflow])
+            state["turns"] = state["turns"][overflow:]
+        # 요약이 계속 실패해도 크기가 커지지 않도록 가장 오래된 것부터 버림
+        if len(state["pending"]) > self.max_pending:
+            state["pending"] = state["pending"][-self.max_pending:]
+
+    def record(self, token, query, answer, seed_history=None):
+        """
+        한 턴(질문/답변) 기록. 서버에 세션이 없으면 클라이언트가 보낸 기록(seed_history)으로 시작합니다.
+        반환: 요약할 메시지가 쌓였으면 True
+        """
+        def apply(state):
+            if not state["turns"] and not state["summary"] and seed_history:
+                state["turns"] = [
+                    {"role": m.get("role"), "content": m.get("content", "")}
+                    for m in seed_history if m.get("role") in ("user", "assistant")
+                ]
+            state["turns"].append({"role": "user", "content": query})
+            state["turns"].append({"role": "assistant", "content": answer})
+            state["turn_count"] += 1
+            self._trim(state)
+
+        state = self.backend.update(str(token), apply)
+        return bool(state["pending"])
+
+    def pending(self, token):
+        """(현재 요약, 요약 대기 메시지 목록)"""
+        state = self.backend.get(str(token))
+        if state is None:
+            return "", []
+        return state["summary"], state["pending"]
+
+    def apply_summary(self, token, summary, summarized):
+        """요약 결과 반영: 요약에 사용한 메시지(summarized)를 pending에서 제거"""
+        def apply(state):
+            state["summary"] = summary
+            # 요약하는 동안 pending 앞부분이 잘려 나갔다면 남은 것은 다음 요약에서 다시 반영
+            if state["pending"][: len(summarized)] == summarized:
+                state["pending"] = state["pending"][len(summarized):]
+
+        self.backend.update(str(token), apply)
+        self._count("summaries")
+
+    def set_title(self, token, title, final=True):
+        """대화 제목 저장 (임시 제목은 이미 생성된 제목을 덮어쓰지 않음)"""
+        def apply(state):
+            if final or not state.get("title_final"):
+                state["title"] = title
+                state["title_final"] = final
+
+        self.backend.update(str(token), apply)
+
+    def title(self, token, owner=None):
+        """(제목, 최종 여부) - 제목이 없거나 owner(sessionId)가 토큰을 발급받은 sessionId와 다르면 None"""
+        state = self.backend.get(str(token))
+        if state is None or not state.get("title"):
+            return None
+        if owner is not None and state.get("owner") != str(owner):
+            return None
+        return state["title"], state.get("title_final", False)
+
+    def stats(self):
+        with self._stats_lock:
+            counts = dict(self._stats)
+        return {"backend": type(self.backend).__name__, "sessions": len(self.backend), **counts}
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 저장소 루트 모듈(server.py, backends.py ...)을 그대로 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 테스트는 항상 오프라인 가짜 백엔드 사용
+os.environ.setdefault("LLM_BACKEND", "fake")
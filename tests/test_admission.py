@@ -0,0 +1,53 @@
+import numpy as np
+from types import SimpleNamespace
+from admission import (STATUS_BANDS, STATUS_THRESHOLDS, PERCENTILE_PER_POINT, ScoreConverter, SCORE_TO_PERCENTILE,
+                       calculate_admission_status, classify_admission, batch_subject_percentiles,
+                       subject_percentiles)
+
+
+def test_classify_admission_matches_scalar_version():
+    rng = np.random.default_rng(0)
+    target = rng.uniform(0, 60, 2000)
+    diffs = rng.uniform(-10, 10, 2000)
+    # 구간 경계와 반올림 경계(x.5점)도 포함
+    edges = np.array(STATUS_THRESHOLDS + [t + d for t in STATUS_THRESHOLDS for d in (-1e-9, 1e-9)]
+                     + [PERCENTILE_PER_POINT * (n + 0.5) for n in range(10)])
+    target = np.concatenate([target, np.full(len(edges), 10.0)])
+    user = np.concatenate([target[:2000] + diffs, 10.0 + edges])
+
+    band, gap = classify_admission(user, target)
+    expected = [calculate_admission_status(float(u), float(t)) for u, t in zip(user, target)]
+    assert [STATUS_BANDS[b] for b in band] == [status for status, _ in expected]
+    assert gap.tolist() == [g for _, g in expected]
+
+
+def test_classify_admission_broadcasts_students_by_programs():
+    user = np.array([[1.0], [30.0]])
+    cutoff = np.array([[5.0, 20.0, 29.0]])
+    band, gap = classify_admission(user, cutoff)
+    assert band.shape == gap.shape == (2, 3)
+    assert [STATUS_BANDS[b] for b in band[0]] == ["안정", "안정", "안정"]
+    assert [STATUS_BANDS[b] for b in band[1]] == ["불가", "불가", "소신"]
+    assert gap[1].tolist() == [83, 33, 3]
+
+
+def test_score_converter_interpolates_and_clamps():
+    converter = ScoreConverter(SCORE_TO_PERCENTILE)
+    assert converter.convert("국어", 137.5) == 1.0
+    assert converter.convert("국어", 200) == 0.1 and converter.convert("국어", 0) == 50.0
+    # 표에 없는 과목은 탐구 표 사용
+    assert converter.convert("물리학Ⅰ", 65) == 4.0
+
+
+def test_batch_percentiles_match_single_student():
+    def score(name, value, category=""):
+        return SimpleNamespace(subjectName=name, score=value, category=category)
+
+    students = [
+        [score("국어", 131), score("수학", 128), score("물리학Ⅰ", 66, "과탐"), score("화학Ⅰ", 61, "과탐")],
+        [score("국어", 120), score("수학", 140)],
+    ]
+    p_kor, p_mat, p_inq = batch_subject_percentiles(students)
+    for i, user_scores in enumerate(students):
+        assert subject_percentiles(user_scores) == (p_kor[i], p_mat[i], p_inq[i])
+    assert p_inq[1] == 50.0
@@ -0,0 +1,29 @@
+from backends import make_vectorstore, detach_local_vectorstore
+from fake_backends import HashedNgramEmbeddings
+
+
+def test_shared_system_cache_layout():
+    # detach_local_vectorstore가 기대는 chromadb 내부 구조 (requirements.txt의 chromadb 버전을 올릴 때 확인)
+    from chromadb.api.shared_system_client import SharedSystemClient
+    assert isinstance(SharedSystemClient._identifier_to_system, dict)
+    assert hasattr(SharedSystemClient, "_get_identifier_from_settings")
+
+
+def test_detach_reopens_from_disk(tmp_path, monkeypatch):
+    monkeypatch.delenv("CHROMA_HOST", raising=False)
+    db_path = str(tmp_path / "db")
+    embeddings = HashedNgramEmbeddings(dim=32)
+    old = make_vectorstore(db_path, embeddings)
+    old.add_texts(["서울대학교 컴퓨터공학부"], ids=["a"])
+
+    retired = detach_local_vectorstore(db_path)
+    assert len(retired) == 1
+    # 같은 경로를 다시 열면 떼어 낸 System이 아닌 새 System을 사용
+    writer = make_vectorstore(db_path, embeddings)
+    writer.add_texts(["연세대학교 경영학과"], ids=["b"])
+    assert len(writer.get()["ids"]) == 2
+    # 이미 연 클라이언트는 떼어 낸 System으로 계속 동작
+    assert old.get(ids=["a"])["ids"] == ["a"]
+    for system in retired:
+        system.stop()
+    assert detach_local_vectorstore(str(tmp_path / "missing")) == []
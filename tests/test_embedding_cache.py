@@ -0,0 +1,144 @@
+import time
+import asyncio
+import sqlite3
+import threading
+import numpy as np
+import embedding_cache
+from embedding_cache import CachedEmbeddings, normalize_query
+from fake_backends import HashedNgramEmbeddings
+
+
+class CountingEmbeddings(HashedNgramEmbeddings):
+    """호출 수를 세는 임베딩 (delay초 걸림)"""
+
+    def __init__(self, delay=0.0):
+        super().__init__(dim=8)
+        self.delay = delay
+        self.calls = 0
+
+    def embed_query(self, text, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self._vector(text)
+
+    async def aembed_query(self, text, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self._vector(text)
+
+
+def disk_keys(path):
+    with sqlite3.connect(path) as db:
+        return [row[0] for row in db.execute("SELECT key FROM query_embeddings ORDER BY created")]
+
+
+def test_normalized_queries_share_an_entry():
+    base = CountingEmbeddings()
+    cache = CachedEmbeddings(base)
+    assert normalize_query("  서울대　 컴공 ABC ") == "서울대 컴공 abc"
+    assert cache.embed_query("서울대 컴공") == cache.embed_query(" 서울대  컴공")
+    assert base.calls == 1 and cache.stats()["hits"] == 1
+
+
+def test_memory_lru_and_ttl_eviction():
+    base = CountingEmbeddings()
+    cache = CachedEmbeddings(base, max_size=2, ttl=0.05)
+    cache.embed_query("a")
+    cache.embed_query("b")
+    cache.embed_query("a")  # a를 최근 사용으로
+    cache.embed_query("c")  # 가장 오래 쓰지 않은 b를 밀어냄
+    assert cache.stats()["size"] == 2
+    cache.embed_query("a")
+    assert base.calls == 3
+    cache.embed_query("b")
+    assert base.calls == 4
+    time.sleep(0.06)
+    cache.embed_query("b")
+    assert base.calls == 5
+
+
+def test_disk_tier_survives_restart_and_is_pruned(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    monkeypatch.setattr(embedding_cache, "DISK_PRUNE_EVERY", 2)
+    base = CountingEmbeddings()
+    cache = CachedEmbeddings(base, persist_path=path, disk_max_size=3)
+    for text in ["q1", "q2", "q3", "q4"]:
+        cache.embed_query(text)
+    # 저장 2건마다 정리: 가장 오래된 q1이 최대 항목 수(3)를 넘어 삭제
+    assert disk_keys(path) == ["default:q2", "default:q3", "default:q4"]
+
+    restarted = CachedEmbeddings(CountingEmbeddings(), persist_path=path)
+    assert np.allclose(restarted.embed_query("q4"), cache.embed_query("q4"))
+    assert restarted.stats()["disk_hits"] == 1 and restarted.base.calls == 0
+
+
+def test_expired_disk_rows_are_removed_on_open(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    CachedEmbeddings(CountingEmbeddings(), persist_path=path).embed_query("old")
+    time.sleep(0.05)
+    cache = CachedEmbeddings(CountingEmbeddings(), persist_path=path, ttl=0.01)
+    assert disk_keys(path) == []
+    cache.embed_query("old")
+    assert cache.base.calls == 1
+
+
+def test_namespace_separates_models():
+    base = CountingEmbeddings()
+    CachedEmbeddings(base, namespace="m1").embed_query("q")
+    shared = CachedEmbeddings(base, namespace="m2")
+    shared.embed_query("q")
+    assert base.calls == 2
+
+
+def test_concurrent_misses_call_the_api_once():
+    base = CountingEmbeddings(delay=0.05)
+    cache = CachedEmbeddings(base)
+
+    async def run():
+        sync_result = asyncio.to_thread(cache.embed_query, "같은 질문")
+        return await asyncio.gather(sync_result, *[cache.aembed_query("같은 질문") for _ in range(10)])
+
+    results = asyncio.run(run())
+    assert base.calls == 1
+    assert all(r == results[0] for r in results)
+    assert cache.stats()["coalesced"] == 10
+
+
+def test_cancelled_first_caller_does_not_fail_waiters():
+    base = CountingEmbeddings(delay=0.05)
+    cache = CachedEmbeddings(base)
+
+    async def run():
+        first = asyncio.create_task(cache.aembed_query("q"))
+        second = asyncio.create_task(cache.aembed_query("q"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert len(asyncio.run(run())) == 8
+    assert base.calls == 1
+
+
+def test_failed_miss_is_shared_and_not_cached():
+    class Failing(CountingEmbeddings):
+        def embed_query(self, text, **kwargs):
+            super().embed_query(text)
+            raise RuntimeError("boom")
+
+    base = Failing(delay=0.05)
+    cache = CachedEmbeddings(base)
+    errors = []
+
+    def call():
+        try:
+            cache.embed_query("q")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 4 and base.calls == 1
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,33 @@
+from langchain_core.documents import Document
+from fake_backends import HashedNgramEmbeddings
+from ingest_pipeline import EmbeddingPipeline, AdaptiveRateLimiter
+
+
+def make_docs(n):
+    return [(f"id{i}", Document(page_content=f"문서 {i}")) for i in range(n)]
+
+
+def test_failed_batches_are_not_counted_as_stored():
+    stored = []
+
+    def write(ids, vectors, docs):
+        if "id0" in ids:
+            raise RuntimeError("write failed")
+        stored.extend(ids)
+
+    pipeline = EmbeddingPipeline(HashedNgramEmbeddings(dim=8), write, concurrency=2, batch_size=2,
+                                 limiter=AdaptiveRateLimiter(rate=1000))
+    dead_letters = pipeline.run(make_docs(5))
+    assert (pipeline.succeeded, pipeline.failed, pipeline.processed) == (3, 2, 5)
+    assert sorted(stored) == ["id2", "id3", "id4"]
+    assert dead_letters == [{"ids": ["id0", "id1"], "error": "write failed"}]
+
+
+def test_all_batches_failing_stores_nothing():
+    def write(ids, vectors, docs):
+        raise RuntimeError("down")
+
+    pipeline = EmbeddingPipeline(HashedNgramEmbeddings(dim=8), write, batch_size=2,
+                                 limiter=AdaptiveRateLimiter(rate=1000))
+    pipeline.run(make_docs(3))
+    assert pipeline.succeeded == 0 and pipeline.failed == 3
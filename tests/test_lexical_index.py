@@ -0,0 +1,75 @@
+import numpy as np
+from langchain_core.documents import Document
+from program_table import ProgramTable
+from lexical_index import LexicalIndex, char_ngrams
+from retrieval import DirectRetriever, reciprocal_rank_fusion
+
+ROWS = [
+    ("p0", "가천대학교", "컴퓨터공학과", "공학", "경기"),
+    ("p1", "가천대학교", "컴퓨터교육과", "사범", "경기"),
+    ("p2", "성결대학교", "국제학과", "인문", "경기"),
+    ("p3", "서울대학교", "컴퓨터공학부", "공학", "서울"),
+    ("p4", "서울대학교", "경영학과", "상경", "서울"),
+]
+
+
+def make_table():
+    ids = [row[0] for row in ROWS]
+    metadatas = [{"univ": u, "major": m, "category": c, "region": r, "sheet": "수시"} for _, u, m, c, r in ROWS]
+    return ProgramTable.from_metadatas(ids, metadatas)
+
+
+class FakeStore:
+    """get_by_ids만 흉내 내는 벡터 DB"""
+
+    def get_by_ids(self, ids):
+        return [Document(id=i, page_content=i) for i in reversed(ids)]
+
+
+def test_char_ngrams_stay_within_words():
+    assert char_ngrams("국제 학과") == ["국제", "학과"]
+    assert char_ngrams("경영학과") == ["경영", "영학", "학과", "경영학", "영학과"]
+
+
+def test_bm25_ranks_closer_major_first():
+    table = make_table()
+    index = LexicalIndex.build(table)
+    rows, scores = index.search("컴퓨터공학과", k=10)
+    assert table.ids[rows].tolist()[:2] == ["p0", "p3"]
+    assert "p1" in table.ids[rows].tolist()
+    assert np.all(np.diff(scores) <= 0)
+    # 겹치는 n-gram이 없으면 빈 결과
+    assert len(index.search("의예과")[0]) == 0
+
+
+def test_saved_index_round_trips(tmp_path):
+    table = make_table()
+    index = LexicalIndex.build(table)
+    index.save(str(tmp_path))
+    loaded = LexicalIndex.load(str(tmp_path), table)
+    for a, b in zip(index.search("서울 경영"), loaded.search("서울 경영")):
+        np.testing.assert_array_equal(a, b)
+    # 행 순서가 다른 테이블이면 사용하지 않음
+    other = ProgramTable.from_metadatas(["x"], [{"univ": "가천대학교", "major": "간호학과"}])
+    assert LexicalIndex.load(str(tmp_path), other) is None
+
+
+def test_reciprocal_rank_fusion_order():
+    # a: 1/61 + 1/62, c: 1/63 + 1/61, b: 1/62
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]]) == ["a", "c", "b"]
+    # 같은 점수는 먼저 나온 순
+    assert reciprocal_rank_fusion([["a"], ["b"]]) == ["a", "b"]
+
+
+def test_lexical_search_confidence_and_fuse():
+    table = make_table()
+    retriever = DirectRetriever(FakeStore(), table, lexical_index=LexicalIndex.build(table))
+    ids, confident = retriever.lexical_search("컴퓨터공학과", k=2)
+    assert ids == ["p0", "p3"] and confident
+    ids, confident = retriever.lexical_search("컴퓨터", k=5)
+    assert not confident
+
+    vector_docs = [Document(id="p4", page_content="p4"), Document(id="p0", page_content="p0")]
+    fused = retriever.fuse(vector_docs, ["p0", "p3"], k=3)
+    # 어휘 검색에만 있는 p3은 ID로 읽어 오고, 결과는 RRF 순서
+    assert [d.id for d in fused] == ["p0", "p4", "p3"]
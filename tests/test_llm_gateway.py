@@ -0,0 +1,110 @@
+import time
+import threading
+import pytest
+from llm_gateway import LLMGateway, CircuitBreaker, CircuitOpenError, LoadShedError
+
+RATE_LIMIT = RuntimeError("429 RESOURCE_EXHAUSTED")
+
+
+def fail(error):
+    raise error
+
+
+def trip(gateway, times):
+    for _ in range(times):
+        with pytest.raises(RuntimeError):
+            gateway.call(fail, RATE_LIMIT)
+
+
+def test_opens_after_consecutive_rate_limits_only():
+    gateway = LLMGateway(breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+    trip(gateway, 2)
+    # 429가 아닌 오류는 실패로 세지 않고, 성공하면 연속 횟수가 초기화됨
+    with pytest.raises(ValueError):
+        gateway.call(fail, ValueError("bad request"))
+    assert gateway.call(lambda: "ok") == "ok"
+    assert gateway.breaker.state == "closed" and gateway.breaker.failures == 0
+
+    trip(gateway, 3)
+    assert gateway.breaker.state == "open" and gateway.breaker.trips == 1
+    with pytest.raises(CircuitOpenError) as rejected:
+        gateway.call(lambda: "ok")
+    assert rejected.value.status_code == 429 and rejected.value.retry_after >= 59
+    assert gateway.events[("answer", "rejected_open")] == 1
+
+
+def test_half_open_allows_a_single_probe_then_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    gateway = LLMGateway(breaker=breaker)
+    trip(gateway, 1)
+    time.sleep(0.06)
+
+    probing, release = threading.Event(), threading.Event()
+
+    def probe():
+        probing.set()
+        release.wait(5)
+        return "probe"
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(gateway.call(probe)))
+    thread.start()
+    assert probing.wait(5)
+    assert breaker.state == "half_open"
+    # 시험 호출 중에는 다른 호출을 보내지 않음
+    with pytest.raises(CircuitOpenError):
+        gateway.call(lambda: "ok")
+    release.set()
+    thread.join(5)
+    assert result == ["probe"]
+    assert breaker.state == "closed"
+    assert gateway.call(lambda: "ok") == "ok"
+
+
+def test_failed_probe_reopens_with_doubled_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05, max_reset_timeout=0.08)
+    gateway = LLMGateway(breaker=breaker)
+    trip(gateway, 1)
+    time.sleep(0.06)
+    trip(gateway, 1)
+    assert breaker.state == "open" and breaker.trips == 2
+    assert breaker._timeout == pytest.approx(0.08)  # 두 배(0.1)지만 최대값으로 제한
+    time.sleep(0.09)
+    assert gateway.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed" and breaker._timeout == pytest.approx(0.05)
+
+
+def test_freed_slot_goes_to_answer_before_title():
+    gateway = LLMGateway(max_concurrency=1, deadlines={"title": 5.0, "answer": 5.0})
+    order = []
+    with gateway.slot("answer"):
+        threads = [threading.Thread(target=gateway.call, args=(order.append, lane), kwargs={"lane": lane})
+                   for lane in ("title", "answer")]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)  # title이 먼저 대기열에 들어가도록
+        assert gateway.stats()["queued"] == 2
+    for thread in threads:
+        thread.join(5)
+    assert order == ["answer", "title"]
+
+
+def test_sheds_lowest_priority_when_queue_is_full():
+    gateway = LLMGateway(max_concurrency=1, max_queue=1, deadlines={"title": 5.0, "answer": 5.0})
+    errors = []
+
+    def queued_title():
+        try:
+            gateway.call(lambda: None, lane="title")
+        except LoadShedError as e:
+            errors.append(e)
+
+    with gateway.slot("answer"):
+        thread = threading.Thread(target=queued_title)
+        thread.start()
+        time.sleep(0.05)
+        answer = threading.Thread(target=gateway.call, args=(lambda: None,))
+        answer.start()
+        thread.join(5)
+        assert len(errors) == 1 and gateway.events[("title", "shed_full")] == 1
+    answer.join(5)
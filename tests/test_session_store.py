@@ -0,0 +1,111 @@
+import time
+import threading
+import pytest
+from session_store import SessionStore, MemorySessionBackend, SqliteSessionBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteSessionBackend(str(tmp_path / "sessions.sqlite3"))
+    return MemorySessionBackend()
+
+
+def turn(role, content):
+    return {"role": role, "content": content}
+
+
+def test_token_is_bound_to_owner(backend):
+    store = SessionStore(backend)
+    token = store.open(None, 7)
+    assert len(token) >= 32
+    assert store.open(token, 7) == token
+    # 다른 sessionId나 발급하지 않은 토큰은 새 세션
+    assert store.open(token, 8) != token
+    assert store.open("made-up", 7) != "made-up"
+
+
+def test_window_overflow_goes_to_pending_then_summary(backend):
+    store = SessionStore(backend, window=4)
+    token = store.open(None, 1)
+    assert store.load(token) is None
+    seed = [turn("user", "q0"), turn("assistant", "a0"), turn("system", "ignored")]
+    assert store.record(token, "q1", "a1", seed_history=seed) is False
+    assert store.record(token, "q2", "a2") is True
+
+    summary, turns = store.load(token)
+    assert summary == "" and [t["content"] for t in turns] == ["q1", "a1", "q2", "a2"]
+    summary, pending = store.pending(token)
+    assert [t["content"] for t in pending] == ["q0", "a0"]
+
+    store.apply_summary(token, "요약", pending)
+    assert store.pending(token) == ("요약", [])
+    assert store.load(token)[0] == "요약"
+    assert store.stats()["summaries"] == 1
+
+
+def test_diverged_client_history_resyncs(backend):
+    store = SessionStore(backend)
+    token = store.open(None, 1)
+    store.record(token, "q1", "a1")
+    assert store.load(token, [turn("user", "q1"), turn("assistant", "a1")]) is not None
+    # 답변을 다시 생성하는 등 클라이언트 기록이 달라지면 저장된 대화를 버림
+    assert store.load(token, [turn("user", "q1"), turn("assistant", "다른 답변")]) is None
+    assert store.load(token) is None
+    assert store.open(token, 1) == token
+    stats = store.stats()
+    assert (stats["hits"], stats["resyncs"]) == (1, 1)
+
+
+def test_placeholder_title_does_not_replace_final(backend):
+    store = SessionStore(backend)
+    token = store.open(None, 3)
+    assert store.title(token, 3) is None
+    store.set_title(token, "임시", final=False)
+    assert store.title(token, 3) == ("임시", False)
+    store.set_title(token, "최종")
+    store.set_title(token, "늦은 임시", final=False)
+    assert store.title(token, 3) == ("최종", True)
+    assert store.title(token, 4) is None
+
+
+def test_memory_backend_evicts_least_recent_and_expired():
+    backend = MemorySessionBackend(max_sessions=2, ttl=0.05)
+    store = SessionStore(backend)
+    a, b = store.open(None, 1), store.open(None, 2)
+    store.load(a)  # a를 최근 사용으로
+    c = store.open(None, 3)
+    assert len(backend) == 2 and backend.get(b) is None and backend.get(a) is not None
+    time.sleep(0.06)
+    assert backend.get(c) is None
+
+
+def test_sqlite_backend_is_shared_and_expires(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    first = SessionStore(SqliteSessionBackend(path, ttl=0.2))
+    token = first.open(None, 1)
+    first.record(token, "q", "a")
+    # 다른 워커(같은 파일)에서도 보임
+    second = SessionStore(SqliteSessionBackend(path, ttl=0.2))
+    assert second.open(token, 1) == token
+    assert second.load(token)[1][0]["content"] == "q"
+    time.sleep(0.25)
+    assert second.load(token) is None
+
+
+def test_concurrent_records_and_stats(tmp_path):
+    store = SessionStore(SqliteSessionBackend(str(tmp_path / "sessions.sqlite3")), window=1000)
+    token = store.open(None, 1)
+
+    def work(n):
+        for i in range(20):
+            store.record(token, f"q{n}-{i}", "a")
+            store.load(token)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.load(token)[1]) == 4 * 20 * 2
+    assert store.stats()["hits"] == 4 * 20 + 1
@@ -0,0 +1,66 @@
+import asyncio
+from title_generator import (TitleBatcher, TITLE_MAX_CHARS, parse_batch_titles, clean_title, heuristic_title,
+                             fallback_title)
+
+
+def test_parse_numbered_titles():
+    text = "1. 서울대 경영학과 입시 문의\n3) '성적 진단'\n  2 . 연세대 컴공\n7. 범위 밖\n잡담"
+    assert parse_batch_titles(text, 3) == ["서울대 경영학과 입시 문의", "연세대 컴공", "성적 진단"]
+
+
+def test_parse_missing_and_empty_titles():
+    assert parse_batch_titles("2. 두 번째\n1. \"\"", 3) == [None, "두 번째", None]
+    assert parse_batch_titles("", 2) == [None, None]
+
+
+def test_clean_title_first_line_without_quotes():
+    assert clean_title('  "입시 문의"\n설명') == "입시 문의"
+    assert len(clean_title("가" * 100)) == TITLE_MAX_CHARS
+    assert clean_title("   ") == ""
+
+
+def test_heuristic_and_fallback_titles():
+    assert heuristic_title("질문", ["서울대학교"], ["경영학과"]) == "서울대학교 경영학과 입시 문의"
+    assert heuristic_title("질문", ["서울대학교"], has_scores=True) == "서울대학교 합격 가능성 진단"
+    assert heuristic_title("내 성적으로 어디 가?", has_scores=True) == "사용자 맞춤 성적 진단"
+    assert fallback_title("가" * 20) == "가" * 15 + "..."
+
+
+def test_batcher_sends_single_requests_then_batches_when_busy():
+    prompts = []
+    release = asyncio.Event()
+
+    async def complete(prompt):
+        prompts.append(prompt)
+        if "번호가 붙은" in prompt:
+            return "2. 둘째 제목\n1. 첫째 제목"
+        await release.wait()
+        return "단일 제목"
+
+    async def run():
+        batcher = TitleBatcher(complete, max_batch=4, max_in_flight=1)
+        first = asyncio.create_task(batcher.generate("질문0"))
+        await asyncio.sleep(0)
+        rest = [asyncio.create_task(batcher.generate(f"질문{i}")) for i in (1, 2)]
+        await asyncio.sleep(0)
+        # 호출 자리가 없으므로 대기
+        assert len(prompts) == 1
+        release.set()
+        return await first, await asyncio.gather(*rest), batcher.stats
+
+    first, rest, stats = asyncio.run(run())
+    assert first == "단일 제목"
+    assert rest == ["첫째 제목", "둘째 제목"]
+    assert stats == {"requests": 3, "calls": 2, "batched": 2}
+
+
+def test_batcher_propagates_errors_to_every_request():
+    async def complete(prompt):
+        raise RuntimeError("LLM 오류")
+
+    async def run():
+        batcher = TitleBatcher(complete, max_in_flight=1)
+        return await asyncio.gather(*[batcher.generate(f"q{i}") for i in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
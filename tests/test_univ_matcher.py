@@ -0,0 +1,55 @@
+from univ_matcher import UnivMatcher
+
+UNIVS = ["가천대학교", "성결대학교", "국제대학교", "서울대학교", "서울시립대학교", "한국외국어대학교"]
+ALIASES = {
+    "univ": {"한국외국어대학교": ["외대"], "서울시립대학교": ["시립대"], "없는대학교": ["없대"]},
+    "major": {"의예과": ["의대"], "컴퓨터공학과": ["컴공"]},
+}
+
+
+def make_matcher():
+    return UnivMatcher(UNIVS, aliases=ALIASES)
+
+
+def names(matches):
+    return [(m.kind, m.name, m.surface) for m in matches]
+
+
+def test_full_name_short_form_and_alias():
+    matcher = make_matcher()
+    assert matcher.find_univs("가천대학교랑 성결대, 외대 비교") == ["가천대학교", "성결대학교", "한국외국어대학교"]
+    # 목록에 없는 대학의 별칭은 무시
+    assert matcher.find_univs("없대 입결") == []
+
+
+def test_longest_match_wins_over_contained_patterns():
+    matcher = make_matcher()
+    # '서울시립대학교' 안의 '서울', '시립대'가 따로 잡히지 않음
+    assert names(matcher.match("서울시립대학교 경영")) == [("univ", "서울시립대학교", "서울시립대학교")]
+    # '가천대 의대' -> 대학 약칭 + 학과 별칭
+    assert names(matcher.match("가천대 의대")) == [("univ", "가천대학교", "가천대"), ("major", "의예과", "의대")]
+
+
+def test_stem_requires_word_boundary():
+    matcher = make_matcher()
+    # '국제학과'의 '국제'는 국제대학교 어간이지만 뒤에 글자가 이어지므로 매칭하지 않음
+    assert matcher.find_univs("성결대학교 국제학과") == ["성결대학교"]
+    assert matcher.find_univs("국제학과 정보") == []
+    # 조사가 붙은 어간은 허용, 앞에 글자가 붙으면 불허
+    assert matcher.find_univs("가천이랑 성결은 어때") == ["가천대학교", "성결대학교"]
+    assert matcher.find_univs("신가천 지역") == []
+
+
+def test_results_are_unique_and_in_order():
+    matcher = make_matcher()
+    assert matcher.find_univs("외대, 서울대, 한국외국어대학교") == ["한국외국어대학교", "서울대학교"]
+    assert matcher.find_majors("컴공이랑 의대, 컴공") == ["컴퓨터공학과", "의예과"]
+    spans = [(m.start, m.end) for m in matcher.match("서울대 컴공")]
+    assert spans == [(0, 3), (4, 6)]
+
+
+def test_same_pattern_keeps_higher_priority_owner():
+    # '서울대'는 서울대학교의 약칭(우선순위 1)이므로 다른 대학의 별칭(우선순위 2)보다 우선
+    aliases = {"univ": {"서울시립대학교": ["서울대", "시립대"]}, "major": {}}
+    matcher = UnivMatcher(UNIVS, aliases=aliases)
+    assert matcher.find_univs("서울대 시립대") == ["서울대학교", "서울시립대학교"]
@@ -0,0 +1,117 @@
+import re
+import asyncio
+import contextvars
+
+# 제목 최대 길이 (LLM이 길게 답해도 잘라서 사용)
+TITLE_MAX_CHARS = 30
+
+TITLE_EXAMPLES = (
+    "예: '서울대 경영학과 합격선 알려줘' -> '서울대 경영학과 입시 문의'\n"
+    "예: '내 성적으로 어디 갈 수 있어?' -> '사용자 맞춤 성적 진단'\n\n"
+)
+
+
+def fallback_title(user_input):
+    return user_input[:15] + "..." if len(user_input) > 15 else user_input
+
+
+def heuristic_title(user_input, univs=(), majors=(), has_scores=False):
+    """LLM 없이 바로 만드는 임시 제목 (질문에서 찾은 대학/학과 + 성적 포함 여부)"""
+    subject = " ".join(list(univs[:1]) + list(majors[:1]))
+    if subject:
+        return f"{subject} {'합격 가능성 진단' if has_scores else '입시 문의'}"
+    if has_scores:
+        return "사용자 맞춤 성적 진단"
+    return fallback_title(user_input)
+
+
+def clean_title(text):
+    title = str(text).strip().splitlines()[0] if str(text).strip() else ""
+    return title.replace('"', '').replace("'", "").strip()[:TITLE_MAX_CHARS]
+
+
+def build_title_prompt(user_input):
+    return (
+        "당신은 대화 제목 요약 전문가입니다. 아래 사용자의 질문을 분석하여 15자 내외의 명사형 제목으로 요약하세요.\n"
+        + TITLE_EXAMPLES
+        + f"질문: {user_input}\n"
+        "제목:"
+    )
+
+
+def build_batch_title_prompt(queries):
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(queries, 1))
+    return (
+        "당신은 대화 제목 요약 전문가입니다. 아래 번호가 붙은 질문 각각을 15자 내외의 명사형 제목으로 요약하세요.\n"
+        + TITLE_EXAMPLES
+        + "질문마다 한 줄씩 '번호. 제목' 형식으로만 답하세요.\n\n"
+        f"{numbered}\n\n"
+        "제목:"
+    )
+
+
+def parse_batch_titles(text, count):
+    """'번호. 제목' 줄 목록 -> 질문 순서대로의 제목 목록 (빠진 번호는 None)"""
+    titles = [None] * count
+    for line in str(text).splitlines():
+        m = re.match(r"\s*(\d+)\s*[.)]\s*(.+)", line)
+        if m and 1 <= int(m.group(1)) <= count:
+            titles[int(m.group(1)) - 1] = clean_title(m.group(2)) or None
+    return titles
+
+
+class TitleBatcher:
+    """
+    대화 제목 생성 요청 묶음 처리
+    진행 중인 제목 호출이 max_in_flight개 미만이면 바로 보내고, 그 이상이면 요청을 모아 두었다가
+    앞선 호출이 끝나는 대로 최대 max_batch개를 한 번의 LLM 호출로 처리합니다.
+    (한가할 때는 지연 없이 1건씩, 요청이 몰릴 때만 묶음으로)
+    complete: 프롬프트 -> 응답 문자열을 돌려주는 비동기 함수
+    """
+
+    def __init__(self, complete, max_batch=16, max_in_flight=2):
+        self.complete = complete
+        self.max_batch = max(1, max_batch)
+        self.max_in_flight = max(1, max_in_flight)
+        self._pending = []
+        self._in_flight = 0
+        self._tasks = set()
+        self.stats = {"requests": 0, "calls": 0, "batched": 0}
+
+    async def generate(self, user_input):
+        """제목 1건 (생성 실패 시 예외, 응답에서 제목을 찾지 못하면 None)"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((user_input, future))
+        self.stats["requests"] += 1
+        self._flush()
+        return await future
+
+    def _flush(self):
+        while self._pending and self._in_flight < self.max_in_flight:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            self._in_flight += 1
+            # 여러 요청의 제목을 함께 처리하므로 특정 요청의 contextvars(trace)를 물려받지 않음
+            task = asyncio.create_task(self._run(batch), context=contextvars.Context())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        queries = [q for q, _ in batch]
+        try:
+            self.stats["calls"] += 1
+            if len(batch) == 1:
+                titles = [clean_title(await self.complete(build_title_prompt(queries[0]))) or None]
+            else:
+                self.stats["batched"] += len(batch)
+                titles = parse_batch_titles(await self.complete(build_batch_title_prompt(queries)), len(batch))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), title in zip(batch, titles):
+                if not future.done():
+                    future.set_result(title)
+        finally:
+            self._in_flight -= 1
+            self._flush()
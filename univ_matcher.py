@@ -0,0 +1,146 @@
+import os
+import json
+from collections import deque, namedtuple
+
+# 별칭 테이블 기본 경로 (환경변수 UNIV_ALIAS_PATH로 변경 가능)
+DEFAULT_ALIAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "univ_aliases.json")
+
+# 줄임말(어간) 매칭 뒤에 붙어도 되는 조사 목록 (예: '가천이랑', '성결은')
+PARTICLES = set("은는이가을를의에와과도랑만로")
+
+# kind: "univ" 또는 "major", name: 정식 명칭, surface: 질문에 실제로 등장한 문자열
+Match = namedtuple("Match", ["kind", "name", "start", "end", "surface"])
+
+
+def load_aliases(path=None):
+    """별칭 테이블(JSON) 로드. 파일이 없으면 빈 테이블 반환"""
+    path = path or os.environ.get("UNIV_ALIAS_PATH", DEFAULT_ALIAS_PATH)
+    if not os.path.exists(path):
+        return {"univ": {}, "major": {}}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {"univ": data.get("univ", {}), "major": data.get("major", {})}
+
+
+def _is_word_char(ch):
+    return ch.isalnum()
+
+
+class UnivMatcher:
+    """
+    대학교/학과 이름 매칭기 (Aho-Corasick 오토마톤)
+    서버 시작 시 한 번만 구축하고, 질문 1회 스캔으로 겹치지 않는 최장 매칭을 모두 찾습니다.
+    """
+
+    def __init__(self, univ_list, aliases=None):
+        aliases = aliases if aliases is not None else load_aliases()
+        self.univ_list = list(univ_list)
+        # 패턴 -> (kind, 정식 명칭, 경계 검사 여부, 우선순위)
+        self._patterns = {}
+
+        known_univs = set(self.univ_list)
+        for u in self.univ_list:
+            # 정식 명칭이 가장 우선
+            self._add(u, "univ", u, needs_boundary=False, priority=0)
+            if u.endswith("대학교"):
+                stem = u[:-len("대학교")]
+                if len(stem) >= 2:
+                    # '가천대' 형태의 약칭
+                    self._add(stem + "대", "univ", u, needs_boundary=False, priority=1)
+                    # '가천' 같은 어간은 다른 단어의 일부('국제학과')일 수 있으므로 경계 검사
+                    self._add(stem, "univ", u, needs_boundary=True, priority=3)
+
+        for name, alias_list in aliases.get("univ", {}).items():
+            if name not in known_univs:
+                continue
+            for alias in alias_list:
+                self._add(alias, "univ", name, needs_boundary=False, priority=2)
+
+        for name, alias_list in aliases.get("major", {}).items():
+            for alias in alias_list:
+                self._add(alias, "major", name, needs_boundary=False, priority=2)
+
+        self._build()
+
+    def _add(self, pattern, kind, name, needs_boundary, priority):
+        pattern = pattern.strip()
+        if not pattern:
+            return
+        current = self._patterns.get(pattern)
+        # 같은 패턴이 여러 대학에 해당하면 우선순위가 높은(숫자가 작은) 쪽을 유지
+        if current is None or priority < current[3]:
+            self._patterns[pattern] = (kind, name, needs_boundary, priority)
+
+    def _build(self):
+        """트라이 + 실패 링크 구성"""
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern in self._patterns:
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(pattern)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _boundary_ok(self, text, start, end):
+        if start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if end < len(text) and _is_word_char(text[end]) and text[end] not in PARTICLES:
+            return False
+        return True
+
+    def match(self, text):
+        """질문에서 겹치지 않는 최장 매칭 목록을 등장 순서대로 반환"""
+        candidates = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for pattern in self._out[node]:
+                start, end = i + 1 - len(pattern), i + 1
+                kind, name, needs_boundary, priority = self._patterns[pattern]
+                if needs_boundary and not self._boundary_ok(text, start, end):
+                    continue
+                candidates.append((start, end, kind, name, priority))
+
+        # 긴 매칭 우선, 길이가 같으면 우선순위 -> 앞쪽 등장 순으로 선택
+        candidates.sort(key=lambda c: (-(c[1] - c[0]), c[4], c[0]))
+        taken = []
+        for start, end, kind, name, _ in candidates:
+            if any(start < t.end and t.start < end for t in taken):
+                continue
+            taken.append(Match(kind, name, start, end, text[start:end]))
+        taken.sort(key=lambda m: m.start)
+        return taken
+
+    def find_univs(self, text):
+        """질문에 등장한 대학교 정식 명칭 목록 (중복 제거, 등장 순)"""
+        return _unique([m.name for m in self.match(text) if m.kind == "univ"])
+
+    def find_majors(self, text):
+        """별칭으로 인식된 학과 정식 명칭 목록 (중복 제거, 등장 순)"""
+        return _unique([m.name for m in self.match(text) if m.kind == "major"])
+
+
+def _unique(items):
+    seen = set()
+    return [x for x in items if not (x in seen or seen.add(x))]
@@ -0,0 +1,131 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+# 파싱된 시트를 저장하는 폴더 이름 (엑셀 파일과 같은 폴더 아래에 생성)
+CACHE_DIR_NAME = ".cache"
+SHEETS_FILE = "sheets.json"
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """파일 내용 해시 (캐시 키)"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def normalize_sheet(df):
+    """
+    시트 정규화: 컬럼 이름과 모든 값을 문자열로 통일하고 NaN은 빈 문자열로 처리
+    (Parquet는 컬럼별 타입이 하나여야 하므로 '숫자 + 빈 문자열'이 섞인 컬럼을 그대로 저장할 수 없음)
+    """
+    df = df.fillna("").astype(str)
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _cache_name(excel_file_path):
+    return os.path.splitext(os.path.basename(excel_file_path))[0]
+
+
+def _cache_dir(excel_file_path, digest, header):
+    base = os.path.dirname(os.path.abspath(excel_file_path))
+    return os.path.join(base, CACHE_DIR_NAME, f"{_cache_name(excel_file_path)}-{digest[:16]}-h{header}")
+
+
+def _parse_sheet_to_parquet(excel_file_path, sheet_name, header, out_path):
+    """(작업 프로세스) 시트 하나를 파싱해 Parquet로 저장"""
+    df = normalize_sheet(pd.read_excel(excel_file_path, sheet_name=sheet_name, header=header))
+    df.to_parquet(out_path, index=False)
+    return sheet_name
+
+
+def build_cache(excel_file_path, header=4, max_workers=None):
+    """엑셀을 시트별 Parquet 스냅샷으로 변환 (시트는 여러 프로세스에서 병렬 파싱). 캐시 폴더 경로 반환"""
+    digest = file_sha256(excel_file_path)
+    cache_dir = _cache_dir(excel_file_path, digest, header)
+    if os.path.exists(os.path.join(cache_dir, SHEETS_FILE)):
+        return cache_dir
+
+    sheet_names = pd.ExcelFile(excel_file_path).sheet_names
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    max_workers = max_workers or min(len(sheet_names), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [
+            pool.submit(_parse_sheet_to_parquet, excel_file_path, sheet, header,
+                        os.path.join(tmp_dir, f"{i}.parquet"))
+            for i, sheet in enumerate(sheet_names)
+        ]
+        for future in futures:
+            future.result()
+
+    with open(os.path.join(tmp_dir, SHEETS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"source": os.path.basename(excel_file_path), "sha256": digest,
+                   "header": header, "sheets": sheet_names}, f, ensure_ascii=False, indent=2)
+
+    # 완성된 스냅샷만 보이도록 폴더 이름을 한 번에 교체
+    try:
+        os.rename(tmp_dir, cache_dir)
+    except OSError:
+        # 다른 프로세스가 먼저 만든 경우
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # 같은 엑셀의 이전 버전 스냅샷 정리
+    pattern = re.compile(rf"^{re.escape(_cache_name(excel_file_path))}-[0-9a-f]{{16}}-h\d+$")
+    parent = os.path.dirname(cache_dir)
+    for entry in os.listdir(parent):
+        path = os.path.join(parent, entry)
+        if pattern.match(entry) and path != cache_dir:
+            shutil.rmtree(path, ignore_errors=True)
+    return cache_dir
+
+
+def _open_cache(excel_file_path, header):
+    cache_dir = build_cache(excel_file_path, header=header)
+    with open(os.path.join(cache_dir, SHEETS_FILE), encoding="utf-8") as f:
+        return cache_dir, json.load(f)["sheets"]
+
+
+def iter_sheets(excel_file_path, header=4):
+    """
+    (시트 이름, 정규화된 DataFrame)을 차례로 반환
+    캐시가 있으면 Parquet를 메모리 매핑으로 읽고, 없으면 먼저 병렬로 스냅샷을 만듭니다.
+    pyarrow가 없으면 캐시 없이 엑셀을 직접 파싱합니다.
+    """
+    if not _parquet_available():
+        print("⚠️ pyarrow가 없어 엑셀을 직접 파싱합니다. (pip install pyarrow 시 캐시 사용)")
+        xls = pd.ExcelFile(excel_file_path)
+        for sheet_name in xls.sheet_names:
+            yield sheet_name, normalize_sheet(pd.read_excel(xls, sheet_name=sheet_name, header=header))
+        return
+
+    cache_dir, sheet_names = _open_cache(excel_file_path, header)
+    for i, sheet_name in enumerate(sheet_names):
+        yield sheet_name, pd.read_parquet(os.path.join(cache_dir, f"{i}.parquet"), memory_map=True)
+
+
+def read_sheet(excel_file_path, sheet_name, header=4):
+    """시트 하나만 읽기 (캐시 사용)"""
+    if not _parquet_available():
+        return normalize_sheet(pd.read_excel(excel_file_path, sheet_name=sheet_name, header=header))
+
+    cache_dir, sheet_names = _open_cache(excel_file_path, header)
+    if sheet_name not in sheet_names:
+        raise ValueError(f"'{sheet_name}' 시트가 없습니다: {excel_file_path}")
+    return pd.read_parquet(os.path.join(cache_dir, f"{sheet_names.index(sheet_name)}.parquet"), memory_map=True)